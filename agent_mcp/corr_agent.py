@@ -2,36 +2,31 @@ from agents import Agent
 from model_provider.model_provider import MODEL_PROVIDER
 from agents.agent import StopAtTools
 
-column_mapping_agent = Agent(
-    name="列名映射agent",
+column_resolution_agent = Agent(
+    name="列名与派生字段解析agent",
     instructions="""
-    你是一个专门负责列名映射的助手。请根据已有列名，判断哪些列名最接近用户提供的变量意图。
+    你是一个专门负责列名映射和派生字段依赖解析的助手。一次性完成以下两项工作：
+    1. 把每个用户意图映射到已有列名；已有列名中没有对应列时，映射到最合适的派生字段名；都不合适则为null。
+    2. 对映射结果中用到的每个派生字段，以及"待解析依赖"中列出的派生字段，把它的每个依赖映射到已有列名，无法匹配则为null。
 
-    示例1：
-    【已有列名】: ["风速(m/s)", "风向", "PM2.5浓度"]
-    【用户意图】: ["风速", "风向", "PM2.5", "季节"]
-    
-    正确输出：
-    {"风速": "风速(m/s)", "风向": "风向", "PM2.5": "PM2.5浓度", "季节": null}
+    示例：
+    【已有列名】: ["time", "风速(m/s)", "风向(°)", "PM2.5浓度"]
+    【派生字段】: {"季节": {"依赖": ["时间"], "说明": "根据时间生成季节字段"}, "风向方位": {"依赖": ["风向"], "说明": "将风向角度转换为中文方位"}}
+    【用户意图】: ["风速", "季节", "风向方位", "PM2.5"]
+    【待解析依赖】: {}
 
-    示例2：
-    【已有列名】: ["temperature", "humidity", "pressure"]
-    【用户意图】: ["温度", "湿度"]
-    
     正确输出：
-    {"温度": "temperature", "湿度": "humidity"}
+    {"mapping": {"风速": "风速(m/s)", "季节": "季节", "风向方位": "风向方位", "PM2.5": "PM2.5浓度"}, "dependencies": {"季节": {"时间": "time"}, "风向方位": {"风向": "风向(°)"}}}
 
     **严格要求**：
-    1. 输出必须是一个完整的JSON对象，以{开头，以}结尾
-    2. 不要输出任何解释、说明或其他文字
-    3. 不要使用代码块标记（如```json）
-    4. 所有字符串必须用双引号包围
-    5. 无法匹配的列名设置为null（不是None）
-    6. JSON必须在一行内，不要换行
-    7. 确保JSON语法完全正确
-    
+    1. 输出必须是一个完整的JSON对象，只包含 mapping 和 dependencies 两个键
+    2. 不要输出任何解释、说明或其他文字，不要使用代码块标记（如```json）
+    3. 所有字符串必须用双引号包围，无法匹配的设置为null（不是None）
+    4. JSON必须在一行内，不要换行
+    5. 已有列名能表达用户意图时优先映射到已有列名
+
     着重注意的列名区分**重要**：
-    1. 风向角度(°)和风向方位要区分，不要混淆
+    1. 风向角度(°)和风向方位要区分，不要混淆：风向角度是已有数值列，风向方位是派生字段
     """,
     model=MODEL_PROVIDER.get_model('qwen3:8b')
 )
@@ -0,0 +1,147 @@
+"""
+相关性分析内存基准
+生成合成数据集，在独立子进程中逐个运行分析场景，测量单次 correlation_analysis 在数据已缓存后的峰值内存增量（RSS），
+用于对比分析流水线各阶段之间的数据复制。峰值测量依赖 Linux 的 /proc/self/clear_refs 与 VmHWM。
+
+仅用于开发时手动运行，不属于服务代码。
+
+用法: python benchmarks/memory_benchmark.py [--rows 500000]
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目路径
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+sys.path.append(str(PROJECT_ROOT / "server"))
+
+VARIABLES = ["PM2.5", "PM10", "NO2", "SO2", "CO", "O3"]
+
+SCENARIOS = {
+    "两变量+派生字段过滤+分组": dict(
+        correlation_vars=["PM2.5", "NO2"], filters={"季节": "夏"}, group_by=["站点名称"]
+    ),
+    "矩阵+源列过滤+成对删除": dict(
+        correlation_vars=VARIABLES, filters={"站点名称": "站点3"}, group_by=["季节"], missing_strategy="pairwise"
+    ),
+    "Spearman两变量": dict(
+        correlation_vars=["PM2.5", "CO"], correlation_method="spearman"
+    ),
+    "全变量对筛选": dict(
+        correlation_vars=VARIABLES, group_by=["风向方位"], top_k=5
+    ),
+}
+
+
+def create_dataset(path: Path, rows: int) -> None:
+    """生成带缺失值的空气质量合成数据"""
+    rng = np.random.default_rng(42)
+    base = rng.normal(50, 15, rows)
+    df = pd.DataFrame({
+        "时间": pd.date_range("2020-01-01", periods=rows, freq="min"),
+        "站点名称": [f"站点{i}" for i in rng.integers(0, 20, rows)],
+        "风向": rng.uniform(0, 360, rows).round(1),
+    })
+    for i, var in enumerate(VARIABLES):
+        values = base * (1 - 0.1 * i) + rng.normal(0, 10, rows)
+        values[rng.random(rows) < 0.02] = np.nan
+        df[var] = values.round(2)
+    df.to_csv(path, index=False)
+
+
+def _read_status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise RuntimeError(f"无法读取 {field}")
+
+
+def _reset_peak_rss() -> None:
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+async def _run_scenario(data_path: str, name: str, repeat: int = 3) -> dict:
+    """子进程中执行：先预热（读取并缓存数据），再多次测量分析的峰值内存增量取中位数"""
+    from correlation_server import (
+        CorrelationConfig, CorrelationManager, CorrelationMethod, MissingValueStrategy, get_dataset_cache
+    )
+    from custom_types.types import ReadDataParam
+
+    params = dict(SCENARIOS[name])
+    params["correlation_method"] = CorrelationMethod(params.get("correlation_method", "pearson"))
+    params["missing_strategy"] = MissingValueStrategy(params.get("missing_strategy", "listwise"))
+    read_data_param = ReadDataParam(read_data_method="PANDAS", read_data_query=data_path)
+    manager = CorrelationManager(CorrelationConfig(max_file_size_mb=4096, incremental_enabled=False))
+
+    await manager.analyze_correlation(read_data_param, **params)
+    increases = []
+    for _ in range(repeat):
+        gc.collect()
+        baseline_kb = _read_status_kb("VmRSS")
+        _reset_peak_rss()
+        await manager.analyze_correlation(read_data_param, **params)
+        increases.append((_read_status_kb("VmHWM") - baseline_kb) / 1024)
+
+    cached_mb = get_dataset_cache().get_stats().get("memory_mb")
+    return {"scenario": name, "peak_increase_mb": round(float(np.median(increases)), 1), "cached_mb": cached_mb}
+
+
+def run_child(data_path: str, name: str) -> dict:
+    """在独立子进程中运行场景，避免各场景之间相互影响峰值"""
+    # 固定glibc的mmap阈值，大数组释放后立即归还系统，使各次测量的基线一致
+    env = dict(os.environ,
+               MALLOC_MMAP_THRESHOLD_="131072",
+               RESULT_CACHE_MAX_ENTRIES="0",
+               DERIVED_CACHE_MAX_MB="0",
+               DATASET_SIDECAR_DIR=str(Path(data_path).parent / "sidecars"))
+    completed = subprocess.run(
+        [sys.executable, __file__, "--child", name, "--data", data_path],
+        env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="相关性分析内存基准")
+    parser.add_argument("--rows", type=int, default=500_000, help="合成数据行数（CSV超过64MB时过滤条件会下推到读取器，不再走缓存）")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_run_scenario(args.data, args.child)), ensure_ascii=False))
+        return
+
+    if not Path("/proc/self/clear_refs").exists():
+        print("⚠️ 需要 Linux /proc 支持才能测量峰值内存")
+        return
+
+    print("🧪 相关性分析内存基准")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = Path(tmp) / "benchmark.csv"
+        print(f"📁 生成合成数据: {args.rows}行 x {len(VARIABLES) + 3}列")
+        create_dataset(data_path, args.rows)
+
+        for name in SCENARIOS:
+            result = run_child(str(data_path), name)
+            ratio = result["peak_increase_mb"] / result["cached_mb"] if result["cached_mb"] else float("nan")
+            print(f"{name:<20} 峰值内存增量 {result['peak_increase_mb']:>8.1f} MB"
+                  f"  （缓存数据 {result['cached_mb']:.1f} MB，约 {ratio:.2f} 倍）")
+
+
+if __name__ == "__main__":
+    main()
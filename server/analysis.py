@@ -14,6 +14,7 @@ import json
 import asyncio
 import pandas as pd
 from utils.utils import remove_think
+from dataset_cache import get_dataset_cache
 import pandas as pd
 import numpy as np
 
@@ -66,25 +67,8 @@ class Manager:
             if not file_path.exists():
                 raise FileNotFoundError(f"文件不存在: {file_path}")
                 
-            # 获取文件扩展名（自动推断文件类型）
-            file_ext = file_path.suffix.lower()
-            
-            # 根据扩展名选择读取方法
-            match file_ext:
-                case ".csv":
-                    return pd.read_csv(file_path)
-                case ".xlsx" | ".xls":
-                    return pd.read_excel(file_path)
-                case ".parquet":
-                    return pd.read_parquet(file_path)
-                case ".json":
-                    return pd.read_json(file_path)
-                case ".feather":
-                    return pd.read_feather(file_path)
-                case ".h5" | ".hdf":
-                    return pd.read_hdf(file_path)
-                case _:
-                    raise ValueError(f"不支持的文件类型: {file_ext}")
+            # 经由进程级数据集缓存读取（按扩展名自动推断文件类型）
+            return get_dataset_cache().get_or_load(file_path)
                     
         except Exception as e:
             raise ValueError(f"从pandas加载数据失败: {str(e)}")
@@ -0,0 +1,185 @@
+"""
+分析任务执行层
+将数据加载、派生字段、过滤和相关性计算等CPU密集型步骤移出MCP事件循环，
+在有界线程池中执行，并按服务器限制同时进行的分析请求数，记录排队指标
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+
+@dataclass
+class StageMetrics:
+    """单个执行阶段的统计"""
+    calls: int = 0
+    failures: int = 0
+    total_wait_seconds: float = 0.0
+    total_run_seconds: float = 0.0
+    max_run_seconds: float = 0.0
+
+
+@dataclass
+class ExecutorMetrics:
+    """执行层排队指标"""
+    submitted_requests: int = 0
+    completed_requests: int = 0
+    rejected_requests: int = 0
+    active_requests: int = 0
+    queued_requests: int = 0
+    max_queued_requests: int = 0
+    total_queue_wait_seconds: float = 0.0
+    max_queue_wait_seconds: float = 0.0
+    stages: Dict[str, StageMetrics] = field(default_factory=dict)
+
+
+class AnalysisExecutor:
+    """分析任务执行器"""
+
+    def __init__(self, max_workers: int, max_concurrent_requests: int,
+                 max_queued_requests: int, logger: logging.Logger):
+        self.max_workers = max_workers
+        self.max_concurrent_requests = max_concurrent_requests
+        self.max_queued_requests = max_queued_requests
+        self.logger = logger
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        # 信号量绑定创建它的事件循环，按正在运行的循环惰性创建
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._metrics = ExecutorMetrics()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        """当前事件循环的请求名额信号量"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent_requests)
+            return semaphore
+
+    @asynccontextmanager
+    async def request_slot(self) -> AsyncIterator[None]:
+        """占用一个分析请求名额，名额用尽时排队等待"""
+        with self._lock:
+            if self._metrics.queued_requests >= self.max_queued_requests:
+                self._metrics.rejected_requests += 1
+                raise RuntimeError(f"分析请求排队已满 ({self.max_queued_requests})，请稍后重试")
+            self._metrics.submitted_requests += 1
+            self._metrics.queued_requests += 1
+            self._metrics.max_queued_requests = max(self._metrics.max_queued_requests,
+                                                    self._metrics.queued_requests)
+
+        semaphore = self._semaphore()
+        enqueued_at = time.perf_counter()
+        try:
+            await semaphore.acquire()
+        finally:
+            wait = time.perf_counter() - enqueued_at
+            with self._lock:
+                self._metrics.queued_requests -= 1
+                self._metrics.total_queue_wait_seconds += wait
+
+        with self._lock:
+            self._metrics.active_requests += 1
+            self._metrics.max_queue_wait_seconds = max(self._metrics.max_queue_wait_seconds, wait)
+        if wait > 0.1:
+            self.logger.info(f"分析请求排队 {wait:.2f}s 后开始执行")
+
+        try:
+            yield
+        finally:
+            semaphore.release()
+            with self._lock:
+                self._metrics.active_requests -= 1
+                self._metrics.completed_requests += 1
+
+    async def run(self, stage: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在线程池中执行一个同步步骤，事件循环在此期间可继续处理其他请求"""
+        loop = asyncio.get_running_loop()
+        submitted_at = time.perf_counter()
+        started_at = submitted_at
+
+        def timed_call() -> Any:
+            nonlocal started_at
+            started_at = time.perf_counter()
+            return func(*args, **kwargs)
+
+        failed = False
+        try:
+            return await loop.run_in_executor(self._pool, timed_call)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            finished_at = time.perf_counter()
+            self._record_stage(stage, started_at - submitted_at, finished_at - started_at, failed)
+
+    def _record_stage(self, stage: str, wait: float, run: float, failed: bool) -> None:
+        with self._lock:
+            stats = self._metrics.stages.setdefault(stage, StageMetrics())
+            stats.calls += 1
+            stats.failures += int(failed)
+            stats.total_wait_seconds += wait
+            stats.total_run_seconds += run
+            stats.max_run_seconds = max(stats.max_run_seconds, run)
+        self.logger.debug(f"阶段 {stage} 完成: 排队 {wait * 1000:.1f}ms, 执行 {run * 1000:.1f}ms")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回当前排队与执行指标快照"""
+        with self._lock:
+            m = self._metrics
+            dequeued = max(m.submitted_requests - m.queued_requests, 1)
+            return {
+                "max_workers": self.max_workers,
+                "max_concurrent_requests": self.max_concurrent_requests,
+                "submitted_requests": m.submitted_requests,
+                "completed_requests": m.completed_requests,
+                "rejected_requests": m.rejected_requests,
+                "active_requests": m.active_requests,
+                "queued_requests": m.queued_requests,
+                "max_queued_requests": m.max_queued_requests,
+                "avg_queue_wait_seconds": round(m.total_queue_wait_seconds / dequeued, 4),
+                "max_queue_wait_seconds": round(m.max_queue_wait_seconds, 4),
+                "stages": {
+                    name: {
+                        "calls": s.calls,
+                        "failures": s.failures,
+                        "avg_wait_seconds": round(s.total_wait_seconds / max(s.calls, 1), 4),
+                        "avg_run_seconds": round(s.total_run_seconds / max(s.calls, 1), 4),
+                        "max_run_seconds": round(s.max_run_seconds, 4),
+                    }
+                    for name, s in m.stages.items()
+                },
+            }
+
+
+_executor: Optional[AnalysisExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_analysis_executor(config, logger: logging.Logger) -> AnalysisExecutor:
+    """获取进程内共享的执行器，首次调用时按配置创建；之后传入不同的配置不会生效，记录警告"""
+    global _executor
+    limits = {
+        "max_workers": config.analysis_workers,
+        "max_concurrent_requests": config.max_concurrent_analyses,
+        "max_queued_requests": config.max_queued_analyses,
+    }
+    with _executor_lock:
+        if _executor is None:
+            _executor = AnalysisExecutor(logger=logger, **limits)
+        else:
+            conflicts = {name: (getattr(_executor, name), value)
+                         for name, value in limits.items() if getattr(_executor, name) != value}
+            if conflicts:
+                details = ", ".join(f"{name}={current} (忽略 {value})" for name, (current, value) in conflicts.items())
+                logger.warning(f"分析执行器已按先前的配置创建，本次配置不生效: {details}")
+        return _executor
@@ -0,0 +1,20 @@
+"""
+本地缓存目录
+数据集旁路文件、增量累加器与列名映射数据库统一放在同一个根目录下：环境变量 ANALYSIS_CACHE_DIR，
+未设置时为项目根目录下的 cache（与启动时的工作目录无关）。各缓存仍可用各自的环境变量单独指定位置。
+"""
+
+import os
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def cache_root() -> Path:
+    """缓存根目录"""
+    return Path(os.environ.get("ANALYSIS_CACHE_DIR") or PROJECT_ROOT / "cache")
+
+
+def cache_path(env_var: str, name: str) -> str:
+    """单个缓存的位置：环境变量 env_var 优先，否则为缓存根目录下的 name"""
+    return os.environ.get(env_var) or str(cache_root() / name)
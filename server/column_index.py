@@ -0,0 +1,82 @@
+"""
+列索引
+为缓存数据集中反复用于分组和过滤的列（如 站点名称、季节）保存分类编码，以及按编码排序的行位置（CSR形式的
+分组→行号映射）。索引挂在数据集缓存条目上，随数据集版本失效；之后按该列分组无需再哈希原始值，
+按该列过滤只需访问被选中的行。
+"""
+
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class ColumnIndex:
+    """单列的分类编码与分组行号映射"""
+    categories: pd.Index
+    """去重后的取值，按 groupby(sort=True) 的顺序排列"""
+
+    codes: np.ndarray
+    """每行的取值编号，-1表示缺失值"""
+
+    order: np.ndarray
+    """按编号排列的行位置，缺失值的行排在最后"""
+
+    offsets: np.ndarray
+    """编号k（缺失值为最后一个编号）的行位置为 order[offsets[k]:offsets[k+1]]"""
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.order.nbytes + self.offsets.nbytes
+                    + self.categories.memory_usage(deep=True))
+
+    def categorical(self, index: Optional[pd.Index] = None) -> pd.Series:
+        """以缓存的编码构造分类列，分组时不再对原始值哈希"""
+        return pd.Series(pd.Categorical.from_codes(self.codes, categories=self.categories),
+                         index=index, copy=False)
+
+    def rows(self, table: np.ndarray) -> np.ndarray:
+        """table 为按编号（末尾为缺失值）的布尔表，返回所选编号的全部行位置"""
+        selected = np.flatnonzero(table)
+        if len(selected) == 0:
+            return self.order[:0]
+        return np.concatenate([self.order[self.offsets[k]:self.offsets[k + 1]] for k in selected])
+
+    def count(self, table: np.ndarray) -> int:
+        """所选编号的行数"""
+        sizes = np.diff(self.offsets)
+        return int(sizes[table].sum())
+
+
+def build_column_index(values: pd.Series, max_cardinality: int) -> Optional[ColumnIndex]:
+    """构建列索引；取值过多或无法排序的列不建索引，返回None"""
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return None  # 时间列取值过多，范围条件由二分查找处理
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        try:
+            codes, categories = pd.factorize(values, sort=True)
+        except TypeError:  # 混合类型无法排序
+            return None
+    if len(categories) > max_cardinality:
+        return None
+
+    n_categories = len(categories)
+    position_dtype = np.int32 if len(codes) < np.iinfo(np.int32).max else np.int64
+    codes = codes.astype(np.int32, copy=False)
+    slots = np.where(codes < 0, n_categories, codes)
+    order = np.argsort(slots, kind="stable").astype(position_dtype, copy=False)
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(slots, minlength=n_categories + 1))))
+    return ColumnIndex(categories=pd.Index(categories), codes=codes, order=order, offsets=offsets)
+
+
+def index_key(column: str, source_columns: Optional[Any] = None) -> Any:
+    """索引在数据集上的键：源列为列名，派生列为 (派生字段, 源列)"""
+    return column if source_columns is None else (column, tuple(source_columns))
@@ -0,0 +1,100 @@
+"""
+本地列名匹配
+在调用大模型之前依次尝试：完全匹配 → 去除单位并规范化后匹配 → 字符n-gram相似度匹配（需超过置信度阈值），
+只有本地无法确定的意图列才交给大模型。
+"""
+
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+# 括号内的单位或说明，如 "气温(℃)"、"风速（m/s）"、"PM2.5[μg/m³]"
+_UNIT_PATTERN = re.compile(r"[\(\[【（][^\)\]】）]*[\)\]】）]")
+_SEPARATOR_PATTERN = re.compile(r"[\s_\-·/]+")
+
+
+def normalize_column_name(name: str) -> str:
+    """全角转半角、去除单位与分隔符并转为小写"""
+    text = unicodedata.normalize("NFKC", str(name))
+    text = _UNIT_PATTERN.sub("", text)
+    return _SEPARATOR_PATTERN.sub("", text).lower()
+
+
+def char_ngrams(text: str, n: int = 2) -> Set[str]:
+    """首尾补位后的字符n-gram集合"""
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def ngram_similarity(left: str, right: str) -> float:
+    """两个字符串n-gram集合的Dice系数"""
+    a, b = char_ngrams(left), char_ngrams(right)
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+@dataclass
+class MatchResult:
+    """本地匹配结果"""
+    resolved: Dict[str, str]
+    """已确定的 {意图列: 数据列}"""
+
+    unresolved: List[str]
+    """需要交给大模型的意图列"""
+
+
+class ColumnMatcher:
+    """确定性的列名匹配器"""
+
+    def __init__(self, config, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+
+    def match(self, exist_cols: Sequence[str], intent_cols: Sequence[str]) -> MatchResult:
+        """逐个意图列在本地匹配，无法唯一确定的留给大模型"""
+        normalized: Dict[str, List[str]] = {}
+        for col in exist_cols:
+            normalized.setdefault(normalize_column_name(col), []).append(col)
+
+        resolved, unresolved = {}, []
+        for intent in intent_cols:
+            matched, stage = self._match_one(intent, exist_cols, normalized)
+            if matched is None:
+                unresolved.append(intent)
+            else:
+                resolved[intent] = matched
+                self.logger.debug(f"本地列名匹配({stage}): {intent} -> {matched}")
+        return MatchResult(resolved=resolved, unresolved=unresolved)
+
+    def _match_one(self,
+                   intent: str,
+                   exist_cols: Sequence[str],
+                   normalized: Dict[str, List[str]]) -> Tuple[Optional[str], str]:
+        if intent in exist_cols:
+            return intent, "完全匹配"
+
+        key = normalize_column_name(intent)
+        if not key:
+            return None, ""
+        candidates = normalized.get(key, [])
+        if len(candidates) == 1:
+            return candidates[0], "规范化匹配"
+        if len(candidates) > 1:
+            return None, ""
+
+        scores = sorted(
+            ((ngram_similarity(key, norm), cols[0]) for norm, cols in normalized.items() if len(cols) == 1),
+            reverse=True
+        )
+        if not scores:
+            return None, ""
+        best_score, best_col = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        # 需要超过阈值且与次优候选拉开差距，避免在相似列之间随意选择
+        if (best_score >= self.config.column_match_threshold
+                and best_score - runner_up >= self.config.column_match_margin):
+            return best_col, f"相似度{best_score:.2f}"
+        return None, ""
@@ -0,0 +1,177 @@
+"""
+相关性立方体（OLAP）
+数据集注册时按最细的分类维度组合（如 站点名称 × 季节 × 风向方位 × 月份）把数据划分为单元，
+对全部数值变量对物化每个单元的成对二阶统计量。之后分组列与过滤条件均落在这些维度上的
+Pearson分析直接由单元统计量汇总得到，无需再读取原始数据。
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from correlation_engine import PairMoments, pair_moments, rollup_pair_moments
+from dataset_cache import DatasetCache, DatasetKey
+from filters import filter_frame
+
+
+@dataclass
+class CubeSlice:
+    """立方体按分组汇总后的结果"""
+    keys: List[Any]
+    """分组键（单列分组为标量，多列为元组，不分组为None），按分组列排序"""
+
+    moments: PairMoments
+    """各分组在所选变量上的成对统计量"""
+
+    complete: np.ndarray
+    """(g,) 各分组所选变量是否均无缺失值"""
+
+
+@dataclass
+class CorrelationCube:
+    """单个数据集的相关性立方体"""
+    dataset_key: DatasetKey
+    dimensions: List[str]
+    variables: List[str]
+    cells: pd.DataFrame
+    """每个单元的维度取值（保留原始类型，缺失值也作为单元）"""
+
+    moments: PairMoments
+    missing: np.ndarray
+    """(c, k) 各单元中每个变量的缺失行数"""
+
+    n_rows: int
+
+    def covers(self, variables: List[str], group_by: List[str], filters: Dict[str, Any]) -> bool:
+        """分析的变量、分组列与过滤列是否都能由立方体回答"""
+        return (set(variables) <= set(self.variables)
+                and set(group_by) <= set(self.dimensions)
+                and set(filters) <= set(self.dimensions))
+
+    def rollup(self, variables: List[str], group_by: List[str], filters: Dict[str, Any]) -> CubeSlice:
+        """选出满足过滤条件的单元并按分组列汇总"""
+        idx = [self.variables.index(v) for v in variables]
+        cells = filter_frame(self.cells, filters)
+        selected = cells.index.to_numpy()
+
+        if group_by:
+            grouped = cells.groupby(group_by, sort=True, observed=True)
+            targets = np.full(len(self.cells), -1, dtype=np.int64)
+            targets[selected] = grouped.ngroup().to_numpy(dtype=np.int64)
+            keys = list(grouped.size().index)
+        else:
+            targets = np.full(len(self.cells), -1, dtype=np.int64)
+            targets[selected] = 0
+            keys = [None]
+
+        moments = PairMoments(
+            n=self.moments.n[:, idx][:, :, idx],
+            mean=self.moments.mean[:, idx][:, :, idx],
+            m2=self.moments.m2[:, idx][:, :, idx],
+            cross=self.moments.cross[:, idx][:, :, idx],
+        )
+        rolled = rollup_pair_moments(moments, targets, len(keys))
+
+        keep = targets >= 0
+        missing = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(missing, targets[keep], self.missing[keep][:, idx].sum(axis=1))
+        return CubeSlice(keys=keys, moments=rolled, complete=missing == 0)
+
+
+def build_correlation_cube(df: pd.DataFrame,
+                           dimensions: List[str],
+                           variables: List[str],
+                           dataset_key: DatasetKey) -> CorrelationCube:
+    """按维度组合划分单元并物化全部变量对的成对统计量"""
+    grouped = df.groupby(dimensions, sort=False, observed=True, dropna=False)
+    codes = grouped.ngroup().to_numpy(dtype=np.int64)
+    cells = grouped.size().index.to_frame(index=False)
+
+    values = np.column_stack([
+        pd.to_numeric(df[var], errors='coerce').to_numpy(dtype=np.float64) for var in variables
+    ])
+    missing = np.stack([
+        np.bincount(codes, weights=np.isnan(values[:, j]), minlength=len(cells)) for j in range(len(variables))
+    ], axis=1).astype(np.int64)
+
+    return CorrelationCube(
+        dataset_key=dataset_key,
+        dimensions=list(dimensions),
+        variables=list(variables),
+        cells=cells,
+        moments=pair_moments(values, codes, len(cells)),
+        missing=missing,
+        n_rows=len(df),
+    )
+
+
+class CubeStore:
+    """进程内的立方体注册表，数据文件变化后对应立方体自动失效"""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self._cubes: Dict[str, CorrelationCube] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, cube: CorrelationCube) -> None:
+        with self._lock:
+            self._cubes[cube.dataset_key[0]] = cube
+        self.logger.info(f"已注册相关性立方体: {Path(cube.dataset_key[0]).name}, "
+                         f"{len(cube.cells)}个单元, {len(cube.variables)}个变量")
+
+    def get(self, file_path: str) -> Optional[CorrelationCube]:
+        """获取与当前文件内容一致的立方体"""
+        try:
+            key = DatasetCache.make_key(Path(file_path))
+        except OSError:
+            return None
+        with self._lock:
+            cube = self._cubes.get(key[0])
+            if cube is not None and cube.dataset_key != key:
+                self.logger.info(f"数据文件已变化，立方体失效: {Path(key[0]).name}")
+                del self._cubes[key[0]]
+                cube = None
+            return cube
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "datasets": {
+                    path: {
+                        "dimensions": cube.dimensions,
+                        "variables": len(cube.variables),
+                        "cells": len(cube.cells),
+                        "rows": cube.n_rows,
+                    }
+                    for path, cube in self._cubes.items()
+                },
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_store: Optional[CubeStore] = None
+_store_lock = threading.Lock()
+
+
+def get_cube_store(logger: Optional[logging.Logger] = None) -> CubeStore:
+    """获取进程内共享的立方体注册表"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CubeStore(logger or logging.getLogger(__name__))
+        return _store
@@ -0,0 +1,721 @@
+"""
+向量化相关性计算引擎
+基于分组充分统计量一次性计算所有分组的相关系数，避免逐组的Python循环
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def format_group_key(keys: Any) -> str:
+    """分组键格式化，与逐组迭代时的键格式保持一致"""
+    return " - ".join(str(k) for k in keys) if isinstance(keys, tuple) else str(keys)
+
+
+def _is_number_text(value: Any) -> bool:
+    if not isinstance(value, str):
+        return False
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def group_sort_order(keys: List[Any]) -> List[int]:
+    """
+    分组键的排列顺序，与 groupby(sort=True) 一致；流式读取时源分组列固定按文本读取，
+    某一层级的键全部是数字文本时按数值排序（与按数值列分组的顺序相同）
+    """
+    levels = [key if isinstance(key, tuple) else (key,) for key in keys]
+    numeric = [all(_is_number_text(level[i]) for level in levels) for i in range(len(levels[0]))] if levels else []
+
+    def sort_key(i: int) -> Tuple[Any, ...]:
+        return tuple(float(value) if is_numeric else value for value, is_numeric in zip(levels[i], numeric))
+
+    try:
+        return sorted(range(len(keys)), key=sort_key)
+    except TypeError:
+        return sorted(range(len(keys)), key=lambda i: format_group_key(keys[i]))
+
+
+@dataclass
+class GroupIndex:
+    """分组编码结果"""
+    codes: np.ndarray
+    """每一行所属分组编号，-1表示分组键缺失"""
+
+    keys: List[str]
+    """按分组编号排列的分组键字符串"""
+
+    @property
+    def n_groups(self) -> int:
+        return len(self.keys)
+
+
+def build_group_index(df: pd.DataFrame, group_by: List[str]) -> GroupIndex:
+    """对分组列进行一次性编码，分组顺序与 df.groupby(group_by) 的迭代顺序一致"""
+    if all(isinstance(df[col].dtype, pd.CategoricalDtype) for col in group_by):
+        group_index = _categorical_group_index(df, group_by)
+        if group_index is not None:
+            return group_index
+
+    grouped = df.groupby(group_by, sort=True, observed=True)
+    # 分组键缺失的行 ngroup 为 NaN，统一编码为 -1
+    codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    keys = [format_group_key(k) for k in grouped.size().index]
+    return GroupIndex(codes=codes, keys=keys)
+
+
+def _categorical_group_index(df: pd.DataFrame,
+                             group_by: List[str],
+                             max_combinations: int = 10_000_000) -> Optional[GroupIndex]:
+    """
+    分类分组列直接按编码组合（混合进制），不再哈希原始值；分组按编码的字典序排列，
+    与 groupby(sort=True, observed=True) 一致。组合数过多时返回None
+    """
+    categories = [df[col].cat.categories for col in group_by]
+    sizes = [len(c) for c in categories]
+    if int(np.prod(sizes, dtype=np.float64)) > max_combinations:
+        return None
+
+    combined = np.zeros(len(df), dtype=np.int64)
+    missing = np.zeros(len(df), dtype=bool)
+    for col, size in zip(group_by, sizes):
+        codes = df[col].cat.codes.to_numpy()
+        missing |= codes < 0
+        combined = combined * size + codes
+    combined[missing] = -1
+
+    counts = np.bincount(combined[~missing], minlength=1)
+    observed = np.flatnonzero(counts)
+    remap = np.full(len(counts), -1, dtype=np.int64)
+    remap[observed] = np.arange(len(observed))
+    codes = np.where(missing, -1, remap[np.where(missing, 0, combined)])
+
+    keys = []
+    for value in observed:
+        parts = []
+        for cats, size in zip(reversed(categories), reversed(sizes)):
+            value, code = divmod(value, size)
+            parts.append(cats[code])
+        keys.append(format_group_key(tuple(reversed(parts)) if len(parts) > 1 else parts[0]))
+    return GroupIndex(codes=codes, keys=keys)
+
+
+@dataclass
+class GroupedPearsonResult:
+    """分组Pearson计算结果"""
+    r: np.ndarray
+    """各分组相关系数，样本不足或无法计算的分组为NaN"""
+
+    n: np.ndarray
+    """各分组有效样本数"""
+
+    eligible: np.ndarray
+    """各分组是否满足最小样本数"""
+
+
+def grouped_pearson(x: np.ndarray,
+                    y: np.ndarray,
+                    codes: np.ndarray,
+                    n_groups: int,
+                    min_sample_size: int) -> GroupedPearsonResult:
+    """
+    一次向量化计算所有分组的Pearson相关系数
+
+    基于分组充分统计量 (n, Σx, Σy, Σxy, Σx², Σy²)，二阶矩在组内均值平移后累加以避免数值抵消。
+    样本数不足 min_sample_size 的分组在任何逐组计算之前即被剔除。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+
+    valid = (codes >= 0) & ~np.isnan(x) & ~np.isnan(y)
+    if not valid.all():
+        x, y, codes = x[valid], y[valid], codes[valid]
+
+    n = np.bincount(codes, minlength=n_groups).astype(np.int64)
+    eligible = n >= min_sample_size
+    r = np.full(n_groups, np.nan)
+    if not eligible.any():
+        return GroupedPearsonResult(r=r, n=n, eligible=eligible)
+
+    # 先剔除样本不足的分组，再做后续累加
+    keep = eligible[codes]
+    if not keep.all():
+        x, y, codes = x[keep], y[keep], codes[keep]
+
+    n_safe = np.where(eligible, n, 1).astype(np.float64)
+    mean_x = np.bincount(codes, weights=x, minlength=n_groups) / n_safe
+    mean_y = np.bincount(codes, weights=y, minlength=n_groups) / n_safe
+
+    dx = x - mean_x[codes]
+    dy = y - mean_y[codes]
+    sxy = np.bincount(codes, weights=dx * dy, minlength=n_groups)
+    sxx = np.bincount(codes, weights=dx * dx, minlength=n_groups)
+    syy = np.bincount(codes, weights=dy * dy, minlength=n_groups)
+
+    denom = np.sqrt(sxx * syy)
+    computable = eligible & (denom > 0)
+    r[computable] = np.clip(sxy[computable] / denom[computable], -1.0, 1.0)
+    return GroupedPearsonResult(r=r, n=n, eligible=eligible)
+
+
+def grouped_spearman(x: np.ndarray,
+                     y: np.ndarray,
+                     codes: np.ndarray,
+                     n_groups: int,
+                     min_sample_size: int) -> GroupedPearsonResult:
+    """
+    一次分组秩变换后复用分组Pearson引擎计算所有分组的Spearman相关系数
+
+    组内秩采用平均秩处理并列值，缺失值所在行先行剔除，与 scipy.stats.spearmanr 的结果一致。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+
+    valid = (codes >= 0) & ~np.isnan(x) & ~np.isnan(y)
+    n = np.bincount(codes[valid], minlength=n_groups)
+    keep = valid.copy()
+    keep[valid] = (n >= min_sample_size)[codes[valid]]
+    x, y, codes = x[keep], y[keep], codes[keep]
+
+    ranks = pd.DataFrame({"x": x, "y": y}).groupby(codes, sort=False).rank(method="average")
+    result = grouped_pearson(
+        ranks["x"].to_numpy(), ranks["y"].to_numpy(), codes, n_groups, min_sample_size
+    )
+    result.n = n.astype(np.int64)
+    return result
+
+
+def _count_tie_pairs(sorted_values: np.ndarray) -> int:
+    """统计已排序数组中取值相同的样本对数量 Σ t(t-1)/2"""
+    if sorted_values.size < 2:
+        return 0
+    boundaries = np.flatnonzero(np.diff(sorted_values)) + 1
+    run_lengths = np.diff(np.concatenate(([0], boundaries, [sorted_values.size])))
+    return int((run_lengths * (run_lengths - 1) // 2).sum())
+
+
+def _count_inversions(ranks: np.ndarray) -> int:
+    """
+    统计非负整数秩序列中的严格逆序对数量 (i < j 且 a[i] > a[j])
+
+    对稠密秩自高位向低位逐位做稳定划分（MSD基数归并）：同一高位前缀的分组内，
+    每个当前位为0的元素与其前方当前位为1的元素构成逆序对。每一位只需若干次 O(n) 的
+    向量化累加，总体为 O(n log n)。
+    """
+    n = ranks.size
+    if n < 2:
+        return 0
+
+    seq = ranks.astype(np.int64)
+    n_bits = int(seq.max()).bit_length()
+    idx = np.arange(n, dtype=np.int64)
+    bounds = np.array([0, n], dtype=np.int64)
+    ones_cum = np.zeros(n + 1, dtype=np.int64)
+    reordered = np.empty_like(seq)
+    inversions = 0
+
+    for bit_pos in range(n_bits - 1, -1, -1):
+        starts = bounds[:-1]
+        sizes = np.diff(bounds)
+
+        bit = (seq >> bit_pos) & 1
+        np.cumsum(bit, out=ones_cum[1:])
+        ones_before = ones_cum[:-1] - np.repeat(ones_cum[starts], sizes)
+        inversions += int(np.dot(ones_before, 1 - bit))
+
+        # 组内稳定划分：0在前，1在后
+        zeros_total = sizes - (ones_cum[bounds[1:]] - ones_cum[starts])
+        ones_start = starts + zeros_total
+        new_pos = np.where(bit == 1, np.repeat(ones_start, sizes) + ones_before, idx - ones_before)
+        reordered[new_pos] = seq
+        seq, reordered = reordered, seq
+
+        bounds = np.concatenate((np.column_stack((starts, ones_start)).ravel(), [n]))
+        bounds = bounds[np.concatenate(([True], np.diff(bounds) > 0))]
+        if bounds.size == n + 1:
+            break
+
+    return inversions
+
+
+@dataclass
+class SortedColumn:
+    """单列排序结果，在矩阵计算中跨变量对复用"""
+    order: np.ndarray
+    """升序排列的行索引"""
+
+    ranks: np.ndarray
+    """稠密秩（相同值同秩）"""
+
+    run_ids: np.ndarray
+    """按 order 排列后每个位置所属的并列组编号"""
+
+    tie_pairs: int
+    """该列内部并列样本对数量"""
+
+
+def sort_column(values: np.ndarray) -> SortedColumn:
+    """对单列排序一次，得到后续Kendall计算所需的全部信息"""
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    run_ids = np.concatenate(([0], np.cumsum(np.diff(sorted_values) != 0))).astype(np.int64)
+    ranks = np.empty(values.size, dtype=np.int64)
+    ranks[order] = run_ids
+    return SortedColumn(order=order, ranks=ranks, run_ids=run_ids,
+                        tie_pairs=_count_tie_pairs(sorted_values))
+
+
+def _kendall_from_sorted(col_x: SortedColumn, col_y: SortedColumn) -> float:
+    """基于已排序列计算 Kendall tau-b（Knight算法）"""
+    n = col_x.order.size
+    if n < 2:
+        return np.nan
+
+    n0 = n * (n - 1) // 2
+    n1 = col_x.tie_pairs
+    n2 = col_y.tie_pairs
+    if n0 == n1 or n0 == n2:
+        return np.nan
+
+    # 复用x的排序结果；x并列段内再按y升序排列，使段内不产生逆序对
+    y_seq = col_y.ranks[col_x.order]
+    n3 = 0
+    if n1 > 0:
+        y_span = int(y_seq.max()) + 1
+        joint_keys = np.sort(col_x.run_ids * y_span + y_seq)
+        n3 = _count_tie_pairs(joint_keys)
+        y_seq = joint_keys - col_x.run_ids * y_span
+    discordant = _count_inversions(y_seq)
+
+    con_minus_dis = n0 - n1 - n2 + n3 - 2 * discordant
+    tau = con_minus_dis / np.sqrt(float(n0 - n1) * float(n0 - n2))
+    return float(np.clip(tau, -1.0, 1.0))
+
+
+def kendall_tau_b(x: np.ndarray, y: np.ndarray) -> float:
+    """O(n log n) 级别的 Kendall tau-b，成对剔除缺失值，常数列返回NaN"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    if not valid.all():
+        x, y = x[valid], y[valid]
+    return _kendall_from_sorted(sort_column(x), sort_column(y))
+
+
+def kendall_matrix(values: np.ndarray) -> np.ndarray:
+    """
+    计算Kendall tau-b相关矩阵
+
+    输入为无缺失值的二维数组（行=样本，列=变量）；每列只排序一次，排序结果在所有变量对之间复用。
+    含缺失值时逐对剔除后单独计算。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_vars = values.shape[1]
+    matrix = np.eye(n_vars)
+
+    if np.isnan(values).any():
+        for i in range(n_vars):
+            for j in range(i + 1, n_vars):
+                matrix[i, j] = matrix[j, i] = kendall_tau_b(values[:, i], values[:, j])
+        return matrix
+
+    columns = [sort_column(values[:, i]) for i in range(n_vars)]
+    for i in range(n_vars):
+        for j in range(i + 1, n_vars):
+            matrix[i, j] = matrix[j, i] = _kendall_from_sorted(columns[i], columns[j])
+    return matrix
+
+
+@dataclass
+class CorrelationPairs:
+    """变量对相关性结果（按 |r| 降序排列）"""
+    rows: np.ndarray
+    """变量1的列序号"""
+
+    cols: np.ndarray
+    """变量2的列序号"""
+
+    r: np.ndarray
+    """相关系数"""
+
+
+def _rank_pairs(rows: np.ndarray,
+                cols: np.ndarray,
+                r: np.ndarray,
+                top_k: Optional[int]) -> CorrelationPairs:
+    """按 |r| 降序保留前 top_k 个变量对"""
+    strength = np.abs(r)
+    if top_k is not None and r.size > top_k:
+        keep = np.argpartition(-strength, top_k - 1)[:top_k]
+        rows, cols, r, strength = rows[keep], cols[keep], r[keep], strength[keep]
+    order = np.lexsort((cols, rows, -strength))
+    return CorrelationPairs(rows=rows[order], cols=cols[order], r=r[order])
+
+
+def select_top_pairs(matrix: np.ndarray,
+                     top_k: Optional[int] = None,
+                     min_abs_correlation: Optional[float] = None) -> CorrelationPairs:
+    """从完整相关矩阵的上三角中筛选最强的变量对"""
+    rows, cols = np.triu_indices(matrix.shape[0], k=1)
+    r = matrix[rows, cols]
+    keep = ~np.isnan(r)
+    if min_abs_correlation is not None:
+        keep &= np.abs(r) >= min_abs_correlation
+    return _rank_pairs(rows[keep], cols[keep], r[keep], top_k)
+
+
+def standardize_columns(values: np.ndarray) -> np.ndarray:
+    """列中心化并按L2范数归一化，使 Zᵀ·Z 即为Pearson相关矩阵；常数列为NaN"""
+    centered = values - values.mean(axis=0)
+    norms = np.sqrt(np.einsum("ij,ij->j", centered, centered))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return centered / norms
+
+
+def blocked_top_pairs(values: np.ndarray,
+                      top_k: Optional[int] = None,
+                      min_abs_correlation: Optional[float] = None,
+                      block_size: int = 256,
+                      rank_transform: bool = False) -> CorrelationPairs:
+    """
+    分块标准化矩阵乘法计算全部变量对的相关性，只保留最强的 top_k 个或超过阈值的变量对
+
+    输入为无缺失值的二维数组（行=样本，列=变量）。每次只计算一个 block_size×block_size 的子矩阵，
+    候选变量对在块之间滚动裁剪，内存占用与变量数的平方无关。rank_transform=True 时先做列内平均秩变换（Spearman）。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if rank_transform:
+        values = pd.DataFrame(values).rank(method="average").to_numpy()
+    z = standardize_columns(values)
+    n_vars = z.shape[1]
+
+    kept_rows: List[np.ndarray] = []
+    kept_cols: List[np.ndarray] = []
+    kept_r: List[np.ndarray] = []
+
+    for row_start in range(0, n_vars, block_size):
+        row_end = min(row_start + block_size, n_vars)
+        z_rows = z[:, row_start:row_end]
+
+        for col_start in range(row_start, n_vars, block_size):
+            col_end = min(col_start + block_size, n_vars)
+            block = np.clip(z_rows.T @ z[:, col_start:col_end], -1.0, 1.0)
+
+            rows = np.arange(row_start, row_end)[:, None]
+            cols = np.arange(col_start, col_end)[None, :]
+            mask = (rows < cols) & ~np.isnan(block)
+            if min_abs_correlation is not None:
+                mask &= np.abs(block) >= min_abs_correlation
+
+            block_rows, block_cols = np.nonzero(mask)
+            kept_rows.append(block_rows + row_start)
+            kept_cols.append(block_cols + col_start)
+            kept_r.append(block[block_rows, block_cols])
+
+            if top_k is not None:
+                pruned = _rank_pairs(np.concatenate(kept_rows), np.concatenate(kept_cols),
+                                     np.concatenate(kept_r), top_k)
+                kept_rows, kept_cols, kept_r = [pruned.rows], [pruned.cols], [pruned.r]
+
+    if not kept_r:
+        empty = np.array([], dtype=np.int64)
+        return CorrelationPairs(rows=empty, cols=empty, r=np.array([], dtype=np.float64))
+
+    return _rank_pairs(np.concatenate(kept_rows), np.concatenate(kept_cols),
+                       np.concatenate(kept_r), top_k)
+
+
+def pairwise_valid_counts(values: np.ndarray) -> np.ndarray:
+    """各变量对同时非缺失的行数矩阵 MᵀM"""
+    valid = (~np.isnan(np.asarray(values, dtype=np.float64))).astype(np.float64)
+    return np.rint(valid.T @ valid).astype(np.int64)
+
+
+def pairwise_complete_pearson(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    成对完整（pairwise-complete）Pearson相关矩阵
+
+    每个变量对只使用两者均非缺失的行。缺失位置以0填充后，通过掩码矩阵乘法一次得到
+    全部变量对的 n、Σx、Σx²、Σxy，整体代价为常数次矩阵乘法。
+    返回 (相关矩阵, 有效样本数矩阵)。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    mask = valid.astype(np.float64)
+
+    col_n = mask.sum(axis=0)
+    col_mean = np.divide(np.where(valid, values, 0.0).sum(axis=0), col_n,
+                         out=np.zeros(values.shape[1]), where=col_n > 0)
+    # 先按列均值平移，降低 Σx² - (Σx)²/n 的数值抵消
+    x = np.where(valid, values - col_mean, 0.0)
+
+    n = mask.T @ mask
+    sx = x.T @ mask
+    sxx = (x * x).T @ mask
+    sxy = x.T @ x
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sx.T / n
+        var = sxx - sx * sx / n
+        var[var <= 1e-12 * sxx] = 0.0
+        r = cov / np.sqrt(var * var.T)
+
+    r[(n < 2) | ~np.isfinite(r)] = np.nan
+    return np.clip(r, -1.0, 1.0), np.rint(n).astype(np.int64)
+
+
+@dataclass
+class CoMoments:
+    """各分组的可合并二阶统计量（样本数、均值向量、离差积矩阵）"""
+    n: np.ndarray
+    """(g,) 各分组样本数"""
+
+    mean: np.ndarray
+    """(g, k) 各分组均值"""
+
+    comoment: np.ndarray
+    """(g, k, k) 各分组离差积和 Σ(x-x̄)(y-ȳ)"""
+
+    @classmethod
+    def empty(cls, n_groups: int, n_vars: int) -> "CoMoments":
+        return cls(n=np.zeros(n_groups, dtype=np.int64),
+                   mean=np.zeros((n_groups, n_vars)),
+                   comoment=np.zeros((n_groups, n_vars, n_vars)))
+
+    def resize(self, n_groups: int) -> "CoMoments":
+        """扩展到更多分组，新增分组为空统计量"""
+        extra = n_groups - len(self.n)
+        if extra <= 0:
+            return self
+        k = self.mean.shape[1]
+        return CoMoments(n=np.concatenate([self.n, np.zeros(extra, dtype=np.int64)]),
+                         mean=np.vstack([self.mean, np.zeros((extra, k))]),
+                         comoment=np.concatenate([self.comoment, np.zeros((extra, k, k))]))
+
+
+def chunk_comoments(values: np.ndarray, codes: np.ndarray, n_groups: int) -> CoMoments:
+    """计算一个数据块内各分组的二阶统计量（values 中不应含缺失值），离差在块内组均值处计算"""
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    k = values.shape[1]
+
+    n = np.bincount(codes, minlength=n_groups).astype(np.int64)
+    n_safe = np.maximum(n, 1).astype(np.float64)
+    mean = np.column_stack([
+        np.bincount(codes, weights=values[:, j], minlength=n_groups) for j in range(k)
+    ]) / n_safe[:, None] if k else np.zeros((n_groups, 0))
+
+    centered = values - mean[codes]
+    comoment = np.zeros((n_groups, k, k))
+    for a in range(k):
+        for b in range(a, k):
+            comoment[:, a, b] = np.bincount(codes, weights=centered[:, a] * centered[:, b], minlength=n_groups)
+            comoment[:, b, a] = comoment[:, a, b]
+    return CoMoments(n=n, mean=mean, comoment=comoment)
+
+
+def merge_comoments(left: CoMoments, right: CoMoments) -> CoMoments:
+    """按 Chan 等人的并行公式合并两组统计量（分组编号需一致）"""
+    n = left.n + right.n
+    n_safe = np.maximum(n, 1).astype(np.float64)
+    delta = right.mean - left.mean
+    mean = left.mean + delta * (right.n / n_safe)[:, None]
+    weight = (left.n.astype(np.float64) * right.n / n_safe)[:, None, None]
+    comoment = left.comoment + right.comoment + delta[:, :, None] * delta[:, None, :] * weight
+    return CoMoments(n=n, mean=mean, comoment=comoment)
+
+
+def comoment_correlation(moments: CoMoments) -> np.ndarray:
+    """由二阶统计量得到各分组的Pearson相关矩阵 (g, k, k)，方差为0或样本不足2时为NaN"""
+    diag = np.sqrt(np.einsum("gii->gi", moments.comoment))
+    denom = diag[:, :, None] * diag[:, None, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = moments.comoment / denom
+    r[~(denom > 0)] = np.nan
+    r[moments.n < 2] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+class CoMomentAccumulator:
+    """
+    流式分组相关性累加器
+
+    逐块接收数据，按分组键维护可合并的二阶统计量，内存占用只与分组数和变量数有关。
+    两个累加器（例如不同进程或不同时间段的数据）也可直接合并。
+    """
+
+    def __init__(self, n_vars: int):
+        self.n_vars = n_vars
+        self.keys: List[str] = []
+        self._key_index: Dict[str, int] = {}
+        self.moments = CoMoments.empty(0, n_vars)
+
+    @property
+    def n_groups(self) -> int:
+        return len(self.keys)
+
+    def _global_codes(self, keys: List[str]) -> np.ndarray:
+        """把块内分组键映射为全局分组编号，必要时新增分组"""
+        mapping = []
+        for key in keys:
+            if key not in self._key_index:
+                self._key_index[key] = len(self.keys)
+                self.keys.append(key)
+            mapping.append(self._key_index[key])
+        self.moments = self.moments.resize(len(self.keys))
+        return np.asarray(mapping, dtype=np.int64)
+
+    def update(self, values: np.ndarray, codes: np.ndarray, keys: List[str]) -> None:
+        """
+        累加一个数据块
+
+        :param values: (m, k) 数值，含缺失值的行会被整行剔除
+        :param codes: (m,) 块内分组编号，-1表示分组键缺失
+        :param keys: 块内分组编号对应的分组键
+        """
+        values = np.asarray(values, dtype=np.float64)
+        codes = np.asarray(codes, dtype=np.int64)
+        valid = (codes >= 0) & ~np.isnan(values).any(axis=1)
+        if not valid.any():
+            return
+
+        # 只登记含有效行的分组，与先删除缺失值再分组的结果一致
+        local_codes = codes[valid]
+        present = np.unique(local_codes)
+        mapping = np.full(len(keys), -1, dtype=np.int64)
+        mapping[present] = self._global_codes([keys[i] for i in present])
+        chunk = chunk_comoments(values[valid], mapping[local_codes], self.n_groups)
+        self.moments = merge_comoments(self.moments, chunk)
+
+    @classmethod
+    def from_moments(cls, keys: List[Any], moments: CoMoments) -> "CoMomentAccumulator":
+        """由已计算好的各分组统计量构造累加器"""
+        accumulator = cls(moments.mean.shape[1])
+        accumulator.keys = list(keys)
+        accumulator._key_index = {key: i for i, key in enumerate(accumulator.keys)}
+        accumulator.moments = moments
+        return accumulator
+
+    def merge(self, other: "CoMomentAccumulator") -> None:
+        """合并另一个累加器"""
+        if other.n_groups == 0:
+            return
+        order = self._global_codes(other.keys)
+        aligned = CoMoments.empty(self.n_groups, self.n_vars)
+        aligned.n[order] = other.moments.n
+        aligned.mean[order] = other.moments.mean
+        aligned.comoment[order] = other.moments.comoment
+        self.moments = merge_comoments(self.moments, aligned)
+
+    def correlations(self) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (各分组相关矩阵 (g, k, k), 各分组样本数 (g,))"""
+        return comoment_correlation(self.moments), self.moments.n.copy()
+
+
+
+@dataclass
+class PairMoments:
+    """
+    各单元的成对二阶统计量，每个变量对只使用两者均非缺失的行
+
+    数组形状均为 (c, k, k)，[i, j] 位置描述变量对 (i, j) 的有效行；对角线即单变量统计量。
+    """
+    n: np.ndarray
+    """变量对的有效样本数"""
+
+    mean: np.ndarray
+    """变量i在变量对(i, j)有效行上的均值"""
+
+    m2: np.ndarray
+    """变量i在变量对(i, j)有效行上的离差平方和"""
+
+    cross: np.ndarray
+    """变量对(i, j)的离差积和"""
+
+
+def pair_moments(values: np.ndarray, codes: np.ndarray, n_cells: int) -> PairMoments:
+    """按单元编号计算全部变量对的成对统计量，codes 为 -1 的行不计入"""
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    k = values.shape[1]
+    valid = ~np.isnan(values) & (codes >= 0)[:, None]
+
+    shape = (n_cells, k, k)
+    n, mean, m2, cross = np.zeros(shape, dtype=np.int64), np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    for a in range(k):
+        for b in range(a, k):
+            mask = valid[:, a] & valid[:, b]
+            cell = codes[mask]
+            x, y = values[mask, a], values[mask, b]
+            count = np.bincount(cell, minlength=n_cells)
+            count_safe = np.maximum(count, 1)
+            mean_x = np.bincount(cell, weights=x, minlength=n_cells) / count_safe
+            mean_y = np.bincount(cell, weights=y, minlength=n_cells) / count_safe
+            dx, dy = x - mean_x[cell], y - mean_y[cell]
+
+            n[:, a, b] = n[:, b, a] = count
+            mean[:, a, b], mean[:, b, a] = mean_x, mean_y
+            m2[:, a, b] = np.bincount(cell, weights=dx * dx, minlength=n_cells)
+            m2[:, b, a] = np.bincount(cell, weights=dy * dy, minlength=n_cells)
+            cross[:, a, b] = cross[:, b, a] = np.bincount(cell, weights=dx * dy, minlength=n_cells)
+    return PairMoments(n=n, mean=mean, m2=m2, cross=cross)
+
+
+def rollup_pair_moments(moments: PairMoments, targets: np.ndarray, n_groups: int) -> PairMoments:
+    """把单元统计量汇总到更粗的分组，targets 为各单元所属分组编号（-1表示不参与）"""
+    targets = np.asarray(targets, dtype=np.int64)
+    keep = targets >= 0
+    t = targets[keep]
+    n_cell = moments.n[keep].astype(np.float64)
+    k = moments.n.shape[1]
+
+    n = np.zeros((n_groups, k, k))
+    np.add.at(n, t, n_cell)
+    n_safe = np.maximum(n, 1.0)
+    total = np.zeros((n_groups, k, k))
+    np.add.at(total, t, n_cell * moments.mean[keep])
+    mean = total / n_safe
+
+    # 组间离差项：Σ n_c (x̄_c - x̄)(ȳ_c - ȳ)
+    dx = moments.mean[keep] - mean[t]
+    dy = dx.transpose(0, 2, 1)
+    m2 = np.zeros((n_groups, k, k))
+    np.add.at(m2, t, moments.m2[keep] + n_cell * dx * dx)
+    cross = np.zeros((n_groups, k, k))
+    np.add.at(cross, t, moments.cross[keep] + n_cell * dx * dy)
+    return PairMoments(n=np.rint(n).astype(np.int64), mean=mean, m2=m2, cross=cross)
+
+
+def pair_correlation(moments: PairMoments) -> np.ndarray:
+    """成对统计量对应的Pearson相关矩阵 (g, k, k)，方差为0或样本不足2时为NaN"""
+    denom = np.sqrt(moments.m2 * moments.m2.transpose(0, 2, 1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = moments.cross / denom
+    r[~(denom > 0) | (moments.n < 2)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def pair_to_comoments(moments: PairMoments) -> CoMoments:
+    """
+    转换为整行删除的二阶统计量
+
+    两变量时直接取该变量对的统计量；多变量时仅在各变量均无缺失（所有变量对的有效行相同）时成立。
+    """
+    k = moments.n.shape[1]
+    if k == 2:
+        mean = np.stack([moments.mean[:, 0, 1], moments.mean[:, 1, 0]], axis=1)
+        comoment = np.empty((len(moments.n), 2, 2))
+        comoment[:, 0, 0], comoment[:, 1, 1] = moments.m2[:, 0, 1], moments.m2[:, 1, 0]
+        comoment[:, 0, 1] = comoment[:, 1, 0] = moments.cross[:, 0, 1]
+        return CoMoments(n=moments.n[:, 0, 1].copy(), mean=mean, comoment=comoment)
+    return CoMoments(n=moments.n[:, 0, 0].copy(),
+                     mean=np.einsum("gii->gi", moments.mean).copy(),
+                     comoment=moments.cross.copy())
@@ -0,0 +1,170 @@
+"""
+紧凑相关矩阵
+k 个变量的相关矩阵是对称的，只保存含对角线的上三角（k(k+1)/2 个值）；分组结果增加一个分组维度，全部分组共用
+一块 (分组数, k(k+1)/2) 的连续数组，可选附带同样形状的有效样本数与p值数组。构造、舍入与格式化都按整块数组
+向量化完成；转换为长表 DataFrame 或 Arrow 表时直接引用这些数组，不复制数据。
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # 未安装pyarrow时不支持转换为Arrow表
+    pa = None
+
+
+@lru_cache(maxsize=64)
+def triangle_indices(k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """含对角线的上三角按行展开后，每个位置对应的 (行, 列)"""
+    rows, cols = np.triu_indices(k)
+    rows.flags.writeable = cols.flags.writeable = False
+    return rows, cols
+
+
+@lru_cache(maxsize=64)
+def square_positions(k: int) -> np.ndarray:
+    """k×k 方阵每个单元格在上三角数组中的位置（对称单元格指向同一位置）"""
+    rows, cols = triangle_indices(k)
+    positions = np.empty((k, k), dtype=np.intp)
+    positions[rows, cols] = positions[cols, rows] = np.arange(len(rows))
+    positions.flags.writeable = False
+    return positions
+
+
+@dataclass
+class CorrelationMatrix:
+    """以上三角保存的（分组）相关矩阵"""
+    variables: List[str]
+
+    values: np.ndarray
+    """(分组数, k(k+1)/2) 的相关系数，NaN表示数据不足或无法计算；无分组时只有一行"""
+
+    n: Optional[np.ndarray] = None
+    """每个单元格的有效样本数（成对删除时给出），形状与 values 相同"""
+
+    p_values: Optional[np.ndarray] = None
+    """每个单元格的p值（可选），形状与 values 相同"""
+
+    groups: Optional[List[str]] = None
+    """分组键，与 values 的行一一对应；None表示无分组"""
+
+    @classmethod
+    def from_square(cls,
+                    matrices: np.ndarray,
+                    variables: List[str],
+                    groups: Optional[List[str]] = None,
+                    n: Optional[np.ndarray] = None,
+                    p_values: Optional[np.ndarray] = None,
+                    precision: Optional[int] = None) -> "CorrelationMatrix":
+        """由方阵 (k, k) 或分组方阵 (分组数, k, k) 取上三角构造，给出 precision 时相关系数统一舍入"""
+        k = len(variables)
+        rows, cols = triangle_indices(k)
+
+        def triangle(squares: Optional[np.ndarray], dtype: type) -> Optional[np.ndarray]:
+            if squares is None:
+                return None
+            # 高级索引的结果按列存放，转为行连续，长表与Arrow表才能直接引用
+            return np.ascontiguousarray(np.asarray(squares, dtype=dtype).reshape(-1, k, k)[:, rows, cols])
+
+        values = triangle(matrices, np.float64)
+        if precision is not None:
+            values = np.round(values, precision)
+        return cls(variables=list(variables), values=values, n=triangle(n, np.int64),
+                   p_values=triangle(p_values, np.float64), groups=None if groups is None else list(groups))
+
+    @property
+    def k(self) -> int:
+        return len(self.variables)
+
+    @property
+    def n_groups(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def grouped(self) -> bool:
+        return self.groups is not None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.values, self.n, self.p_values) if a is not None)
+
+    def group_position(self, group: Optional[str] = None) -> int:
+        """分组键对应的行；未指定时取第一个分组"""
+        if self.n_groups == 0:
+            raise ValueError("结果中没有任何分组")
+        if group is None or not self.grouped:
+            return 0
+        return self.groups.index(group)
+
+    def cell(self, var1: str, var2: str) -> np.ndarray:
+        """各分组中一个单元格的相关系数"""
+        position = square_positions(self.k)[self.variables.index(var1), self.variables.index(var2)]
+        return self.values[:, position]
+
+    def squares(self, data: Optional[np.ndarray] = None) -> np.ndarray:
+        """展开为 (分组数, k, k) 的完整方阵，data 可选 n 或 p_values，默认相关系数"""
+        data = self.values if data is None else data
+        return data[:, square_positions(self.k)]
+
+    def square(self, group: Optional[str] = None, data: Optional[np.ndarray] = None) -> np.ndarray:
+        """单个分组展开为 (k, k) 的完整方阵"""
+        data = self.values if data is None else data
+        return data[self.group_position(group)][square_positions(self.k)]
+
+    def to_frame(self, group: Optional[str] = None) -> pd.DataFrame:
+        """单个分组以变量名为行列标签的相关矩阵（需要展开为方阵，会生成新数组）"""
+        return pd.DataFrame(self.square(group), index=self.variables, columns=self.variables, copy=False)
+
+    def _long_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """长表每行的分组编号与两个变量编号"""
+        rows, cols = triangle_indices(self.k)
+        group_codes = np.repeat(np.arange(self.n_groups, dtype=np.int32), len(rows))
+        return group_codes, np.tile(rows.astype(np.int32), self.n_groups), np.tile(cols.astype(np.int32), self.n_groups)
+
+    def to_long_frame(self) -> pd.DataFrame:
+        """长表：每个分组的每个变量对（含对角线）一行，r/n/p_value 列直接引用结果数组"""
+        group_codes, var1_codes, var2_codes = self._long_columns()
+        columns = {}
+        if self.grouped:
+            columns["group"] = pd.Categorical.from_codes(group_codes, categories=self.groups)
+        columns["var1"] = pd.Categorical.from_codes(var1_codes, categories=self.variables)
+        columns["var2"] = pd.Categorical.from_codes(var2_codes, categories=self.variables)
+        columns["r"] = self.values.reshape(-1)
+        if self.n is not None:
+            columns["n"] = self.n.reshape(-1)
+        if self.p_values is not None:
+            columns["p_value"] = self.p_values.reshape(-1)
+        return pd.DataFrame(columns, copy=False)
+
+    def to_arrow(self) -> "pa.Table":
+        """与 to_long_frame 相同结构的Arrow表，数值列与结果数组共享内存"""
+        if pa is None:
+            raise ValueError("转换为Arrow表需要安装pyarrow")
+        group_codes, var1_codes, var2_codes = self._long_columns()
+        variables = pa.array(self.variables, type=pa.string())
+        columns = {}
+        if self.grouped:
+            columns["group"] = pa.DictionaryArray.from_arrays(group_codes, pa.array(self.groups, type=pa.string()))
+        columns["var1"] = pa.DictionaryArray.from_arrays(var1_codes, variables)
+        columns["var2"] = pa.DictionaryArray.from_arrays(var2_codes, variables)
+        columns["r"] = pa.array(self.values.reshape(-1))
+        if self.n is not None:
+            columns["n"] = pa.array(self.n.reshape(-1))
+        if self.p_values is not None:
+            columns["p_value"] = pa.array(self.p_values.reshape(-1))
+        return pa.table(columns)
+
+    def formatted(self, spec: str, missing: str, data: Optional[np.ndarray] = None) -> np.ndarray:
+        """按 % 格式逐单元格格式化为字符串数组（NaN为 missing）；相同的值只格式化一次"""
+        data = np.ascontiguousarray(self.values if data is None else data)
+        # 浮点数按位去重，0.0 与 -0.0 分别格式化
+        keys = data.view(np.int64) if data.dtype == np.float64 else data
+        unique, inverse = np.unique(keys, return_inverse=True)
+        unique = unique.view(data.dtype)
+        texts = np.array([missing if value != value else spec % value for value in unique.tolist()], dtype=object)
+        return texts[inverse].reshape(data.shape)
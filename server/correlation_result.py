@@ -0,0 +1,138 @@
+"""
+结构化相关性结果
+两变量与多变量分析的结果统一保存为 CorrelationMatrix（两变量为 2×2 矩阵），数据不足的单元格为NaN；
+全变量对筛选保存各分组的变量对排名。进程内调用方（如可视化服务）直接使用数组，
+Markdown表格只在需要展示给用户时由 TableGenerator 渲染，to_dict 给出可JSON序列化的形式。
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from correlation_matrix import CorrelationMatrix
+
+
+PAIR = "pair"
+MATRIX = "matrix"
+TOP_PAIRS = "top_pairs"
+
+RankedPairs = Optional[List[Tuple[str, str, float]]]
+
+
+@dataclass
+class CorrelationResult:
+    """相关性分析的结构化结果"""
+    kind: str
+    """pair（两变量）/ matrix（多变量矩阵）/ top_pairs（全变量对筛选）"""
+
+    variables: List[str]
+    method: str
+    missing_strategy: str
+    group_by: List[str]
+
+    groups: List[str]
+    """分组键（多列以" - "连接），顺序与 groupby(sort=True) 一致；无分组时为空"""
+
+    matrix: Optional[CorrelationMatrix] = None
+    """相关矩阵（成对删除时附带每个单元格的有效样本数）；筛选模式为None"""
+
+    pairs: Optional[List[RankedPairs]] = None
+    """筛选模式下每个分组（无分组时只有一项）的变量对排名，None表示数据不足"""
+
+    top_k: Optional[int] = None
+    min_abs_correlation: Optional[float] = None
+
+    def to_frame(self, group: Optional[str] = None) -> pd.DataFrame:
+        """以变量名为行列标签的相关矩阵；分组结果按分组键选取，未指定时取第一个分组"""
+        if self.matrix is None:
+            raise ValueError("全变量对筛选结果不包含相关矩阵")
+        return self.matrix.to_frame(group)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可JSON序列化的形式，相关矩阵展开为完整方阵（无分组时为 [k][k]，分组时为 [分组数][k][k]），NaN转换为None"""
+        data = {
+            "kind": self.kind,
+            "variables": self.variables,
+            "method": self.method,
+            "missing_strategy": self.missing_strategy,
+            "group_by": self.group_by,
+            "groups": self.groups,
+        }
+        if self.kind == TOP_PAIRS:
+            data.update(pairs=[None if p is None else [list(pair) for pair in p] for p in self.pairs],
+                        top_k=self.top_k, min_abs_correlation=self.min_abs_correlation)
+            return data
+        values = self.matrix.squares()
+        values = np.where(np.isnan(values), None, values)
+        sample_sizes = None if self.matrix.n is None else self.matrix.squares(self.matrix.n)
+        if not self.group_by:
+            values = values[0]
+            sample_sizes = None if sample_sizes is None else sample_sizes[0]
+        data["values"] = values.tolist()
+        if sample_sizes is not None:
+            data["sample_sizes"] = sample_sizes.tolist()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CorrelationResult":
+        """由 to_dict 的结果还原"""
+        result = cls(kind=data["kind"], variables=data["variables"], method=data["method"],
+                     missing_strategy=data["missing_strategy"], group_by=data["group_by"], groups=data["groups"])
+        if result.kind == TOP_PAIRS:
+            result.pairs = [None if p is None else [tuple(pair) for pair in p] for p in data["pairs"]]
+            result.top_k, result.min_abs_correlation = data["top_k"], data["min_abs_correlation"]
+            return result
+        result.matrix = CorrelationMatrix.from_square(
+            np.array(data["values"], dtype=np.float64), result.variables,
+            groups=result.groups if result.group_by else None, n=data.get("sample_sizes")
+        )
+        return result
+
+
+def _cell(value: Union[float, int, None], insufficient_flag: int) -> float:
+    """计算器结果中的 None 与数据不足标记均记为NaN"""
+    if value is None or value == insufficient_flag:
+        return np.nan
+    return float(value)
+
+
+def from_pair_result(result: Dict[str, Union[float, None, int]],
+                     var1: str,
+                     var2: str,
+                     group_by: List[str],
+                     method: str,
+                     insufficient_flag: int) -> CorrelationResult:
+    """由两变量计算结果（{分组键: 相关性}，无分组时只有一项）构造 2×2 相关矩阵"""
+    groups = list(result.keys()) if group_by else []
+    r = np.array([_cell(value, insufficient_flag) for value in result.values()], dtype=np.float64)
+    squares = np.ones((len(r), 2, 2))
+    squares[:, 0, 1] = squares[:, 1, 0] = r
+    return CorrelationResult(
+        kind=PAIR, variables=[var1, var2], method=method, missing_strategy="listwise",
+        group_by=list(group_by), groups=groups,
+        matrix=CorrelationMatrix.from_square(squares, [var1, var2], groups=groups if group_by else None)
+    )
+
+
+def from_matrix_result(result: Dict[str, Any], group_by: List[str]) -> CorrelationResult:
+    """由多变量矩阵计算结果构造"""
+    matrix: CorrelationMatrix = result["matrix"]
+    return CorrelationResult(
+        kind=MATRIX, variables=list(result["variables"]), method=result["method"],
+        missing_strategy=result["missing_strategy"], group_by=list(group_by),
+        groups=list(matrix.groups or []), matrix=matrix
+    )
+
+
+def from_top_pairs_result(result: Dict[str, Any], group_by: List[str]) -> CorrelationResult:
+    """由全变量对筛选结果构造"""
+    grouped = "groups" in result
+    return CorrelationResult(
+        kind=TOP_PAIRS, variables=list(result["variables"]), method=result["method"],
+        missing_strategy=result["missing_strategy"], group_by=list(group_by),
+        groups=list(result["groups"].keys()) if grouped else [],
+        pairs=list(result["groups"].values()) if grouped else [result["pairs"]],
+        top_k=result["top_k"], min_abs_correlation=result["min_abs_correlation"]
+    )
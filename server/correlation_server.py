@@ -2,23 +2,19 @@
 相关性分析服务器
 支持两变量和多变量相关性分析，包括分组分析和多种计算方法
 """
-# TODO: 1. 数据缓存
-# TODO: 2. 派生功能外置
-
 
 import sys
 import os
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Union, Tuple
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Union, Tuple, Iterable, Iterator
+from dataclasses import dataclass, field
 from enum import Enum
 import asyncio
 import json
 import logging
-from functools import lru_cache
 import pandas as pd
 import numpy as np
-from scipy.stats import pearsonr, spearmanr, kendalltau
+from scipy.stats import pearsonr, spearmanr
 
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.append(str(PROJECT_ROOT))
@@ -29,8 +25,30 @@ from agents import Runner
 from utils.utils import remove_think
 from mcp.server.fastmcp import FastMCP
 from custom_types.types import ReadDataParam
-from agent_mcp.corr_agent import column_mapping_agent
+from agent_mcp.corr_agent import column_resolution_agent
 from config import get_sort_order, custom_sort_key
+from correlation_engine import (
+    GroupIndex, build_group_index, format_group_key, group_sort_order, grouped_pearson, grouped_spearman,
+    kendall_tau_b, kendall_matrix, blocked_top_pairs, select_top_pairs,
+    pairwise_complete_pearson, pairwise_valid_counts, CoMomentAccumulator, CoMoments,
+    pair_correlation, pair_to_comoments
+)
+from parallel_executor import ParallelGroupExecutor
+from analysis_executor import get_analysis_executor
+from dataset_cache import (DatasetKey, get_dataset_cache, iter_dataset_chunks, read_dataset_columns,
+                           csv_filter_dtypes, csv_read_dtypes, with_fixed_dtypes, STREAMABLE_FILE_TYPES)
+from filters import CompiledFilter, compile_filters
+from column_index import ColumnIndex, index_key
+from incremental_store import get_incremental_store, AccumulatorState, AppendReader
+from correlation_cube import CorrelationCube, build_correlation_cube, get_cube_store
+from result_cache import get_result_cache
+from correlation_matrix import CorrelationMatrix
+from correlation_result import (
+    CorrelationResult, PAIR, TOP_PAIRS, from_pair_result, from_matrix_result, from_top_pairs_result
+)
+from mapping_cache import get_mapping_cache
+from column_matcher import ColumnMatcher
+from derived_fields import get_derived_field_registry, get_derived_column_cache
 
 @dataclass
 class CorrelationConfig:
@@ -40,11 +58,31 @@ class CorrelationConfig:
     max_retries: int = 3
     correlation_precision: int = 3
     max_file_size_mb: int = 100
+    max_correlation_vars: int = 10
+    screening_block_size: int = 256
+    parallel_workers: int = None
+    parallel_min_groups: int = 32
+    parallel_min_rows: int = 100000
+    analysis_workers: int = 4
+    max_concurrent_analyses: int = 4
+    max_queued_analyses: int = 64
+    streaming_chunk_rows: int = 200000
+    # 增量统计需显式开启（环境变量 CORRELATION_INCREMENTAL=1），且只用于较大的文件；
+    # 其余请求走数据集缓存与内存计算流程
+    incremental_enabled: bool = field(default_factory=lambda: os.environ.get("CORRELATION_INCREMENTAL") == "1")
+    incremental_min_file_mb: int = 64
+    cube_dimensions: List[str] = None
+    column_match_threshold: float = 0.8
+    column_match_margin: float = 0.1
     supported_file_types: List[str] = None
     
     def __post_init__(self):
         if self.supported_file_types is None:
             self.supported_file_types = ['.csv', '.xlsx', '.xls', '.parquet', '.json', '.feather', '.h5', '.hdf']
+        if self.parallel_workers is None:
+            self.parallel_workers = os.cpu_count() or 1
+        if self.cube_dimensions is None:
+            self.cube_dimensions = ['站点名称', '季节', '风向方位', '月份']
 
 class CorrelationMethod(Enum):
     """相关性计算方法枚举"""
@@ -52,6 +90,13 @@ class CorrelationMethod(Enum):
     SPEARMAN = "spearman"
     KENDALL = "kendall"
 
+class MissingValueStrategy(Enum):
+    """矩阵计算的缺失值处理策略枚举"""
+    LISTWISE = "listwise"
+    """整行删除：任一变量缺失即删除该行"""
+    PAIRWISE = "pairwise"
+    """成对删除：每个变量对只使用两者均非缺失的行"""
+
 class CorrelationAnalysisError(Exception):
     """相关性分析基础异常"""
     pass
@@ -74,9 +119,16 @@ class DataLoader:
     def __init__(self, config: CorrelationConfig, logger: logging.Logger):
         self.config = config
         self.logger = logger
+        self.executor = get_analysis_executor(config, logger)
+        self.dataset_cache = get_dataset_cache(logger)
+        self.incremental_store = get_incremental_store(logger)
     
-    async def load_data(self, read_data_method: str, read_data_query: str) -> pd.DataFrame:
-        """统一数据加载入口"""
+    async def load_data(self,
+                        read_data_method: str,
+                        read_data_query: str,
+                        columns: Optional[List[str]] = None,
+                        filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """统一数据加载入口，指定columns时只加载这些列，指定filters时读取时即按源列过滤"""
         method_map = {
             "SQL": self._load_from_sql,
             "PANDAS": self._load_from_pandas
@@ -86,17 +138,83 @@ class DataLoader:
             raise DataLoadError(f"不支持的数据加载方法: {read_data_method}. 支持的方法: {list(method_map.keys())}")
         
         try:
-            return await method_map[read_data_method](read_data_query)
+            return await method_map[read_data_method](read_data_query, columns, filters)
         except Exception as e:
             self.logger.error(f"数据加载失败: {e}")
             raise DataLoadError(f"数据加载失败: {str(e)}") from e
     
-    async def _load_from_sql(self, query: str) -> pd.DataFrame:
+    async def load_columns(self, read_data_method: str, read_data_query: str) -> List[str]:
+        """只读取数据的列名（表头/schema），用于在加载数据前完成列名映射"""
+        if read_data_method == "SQL":
+            raise DataLoadError("SQL数据加载功能待实现")
+        if read_data_method != "PANDAS":
+            raise DataLoadError(f"不支持的数据加载方法: {read_data_method}. 支持的方法: ['SQL', 'PANDAS']")
+        
+        try:
+            return await self.executor.run("load", self._read_file_columns, read_data_query)
+        except Exception as e:
+            self.logger.error(f"读取数据表头失败: {e}")
+            raise DataLoadError(f"读取数据表头失败: {str(e)}") from e
+    
+    async def _load_from_sql(self,
+                             query: str,
+                             columns: Optional[List[str]] = None,
+                             filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
         """SQL数据加载"""
         raise NotImplementedError("SQL数据加载功能待实现")
     
-    async def _load_from_pandas(self, file_path: str) -> pd.DataFrame:
-        """从文件加载数据"""
+    async def _load_from_pandas(self,
+                                file_path: str,
+                                columns: Optional[List[str]] = None,
+                                filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """从文件加载数据（在工作线程中执行，不阻塞事件循环）"""
+        return await self.executor.run("load", self._load_file, file_path, columns, filters)
+    
+    def exceeds_size_limit(self, read_data_method: str, read_data_query: str) -> bool:
+        """文件是否超过 max_file_size_mb，超过时需使用流式计算"""
+        if read_data_method != "PANDAS":
+            return False
+        file_path_obj = Path(read_data_query).resolve()
+        return file_path_obj.is_file() and file_path_obj.stat().st_size > self.config.max_file_size_mb * 1024 * 1024
+    
+    def iter_chunks(self,
+                    file_path: str,
+                    columns: Optional[List[str]] = None,
+                    dtype: Optional[Dict[str, str]] = None) -> Iterator[pd.DataFrame]:
+        """按块读取大文件（同步迭代器，应在工作线程中消费），dtype 固定CSV列的读取类型"""
+        file_path_obj = Path(file_path).resolve()
+        self._validate_file_path(file_path_obj)
+        if file_path_obj.suffix.lower() not in STREAMABLE_FILE_TYPES:
+            file_size_mb = file_path_obj.stat().st_size / (1024 * 1024)
+            raise DataLoadError(f"文件过大: {file_size_mb:.1f}MB，超过限制 {self.config.max_file_size_mb}MB，"
+                                f"且该类型不支持流式读取 (支持: {STREAMABLE_FILE_TYPES})")
+        
+        self.logger.info(f"流式读取数据: 每块 {self.config.streaming_chunk_rows} 行")
+        return iter_dataset_chunks(file_path_obj, columns, self.config.streaming_chunk_rows, self.logger, dtype)
+    
+    def open_appended(self,
+                      file_path: str,
+                      columns: Optional[List[str]],
+                      state: Optional[AccumulatorState],
+                      dtype: Optional[Dict[str, str]] = None) -> AppendReader:
+        """从上次已消费的位置开始按块读取追加的数据（同步迭代器，应在工作线程中消费）"""
+        file_path_obj = Path(file_path).resolve()
+        self._validate_file_path(file_path_obj)
+        return self.incremental_store.open(str(file_path_obj), columns, state, self.config.streaming_chunk_rows, dtype)
+    
+    def _read_file_columns(self, file_path: str) -> List[str]:
+        """读取文件列名"""
+        file_path_obj = Path(file_path).resolve()
+        self._validate_file_path(file_path_obj)
+        columns = self.dataset_cache.get_columns(file_path_obj)
+        self.logger.info(f"数据共 {len(columns)} 列")
+        return columns
+    
+    def _load_file(self,
+                   file_path: str,
+                   columns: Optional[List[str]] = None,
+                   filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """读取并预处理文件"""
         try:
             file_path_obj = Path(file_path).resolve()
             self._validate_file_path(file_path_obj)
@@ -105,8 +223,7 @@ class DataLoader:
             if file_size_mb > self.config.max_file_size_mb:
                 raise DataLoadError(f"文件过大: {file_size_mb:.1f}MB，超过限制 {self.config.max_file_size_mb}MB")
             
-            df = self._load_by_file_type(file_path_obj)
-            df = self._auto_parse_datetime(df)
+            df = self.dataset_cache.get_or_load(file_path_obj, columns, filters=filters)
             self._validate_dataframe(df)
             
             self.logger.info(f"成功加载数据: {df.shape[0]}行 x {df.shape[1]}列")
@@ -126,40 +243,6 @@ class DataLoader:
         if file_path.suffix.lower() not in self.config.supported_file_types:
             raise ValueError(f"不支持的文件类型: {file_path.suffix}. 支持的类型: {self.config.supported_file_types}")
     
-    def _load_by_file_type(self, file_path: Path) -> pd.DataFrame:
-        """根据文件类型加载数据"""
-        file_ext = file_path.suffix.lower()
-        
-        loader_map = {
-            '.csv': lambda: pd.read_csv(file_path),
-            '.xlsx': lambda: pd.read_excel(file_path),
-            '.xls': lambda: pd.read_excel(file_path),
-            '.parquet': lambda: pd.read_parquet(file_path),
-            '.json': lambda: pd.read_json(file_path),
-            '.feather': lambda: pd.read_feather(file_path),
-            '.h5': lambda: pd.read_hdf(file_path),
-            '.hdf': lambda: pd.read_hdf(file_path)
-        }
-        
-        if file_ext not in loader_map:
-            raise ValueError(f"不支持的文件类型: {file_ext}")
-        
-        return loader_map[file_ext]()
-    
-    def _auto_parse_datetime(self, df: pd.DataFrame) -> pd.DataFrame:
-        """自动解析时间列"""
-        time_patterns = ['时间', '日期', 'datetime', 'time', 'timestamp', 'date', '创建时间', '更新时间']
-        
-        for col in df.columns:
-            if any(pattern in col.lower() for pattern in time_patterns):
-                try:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-                    self.logger.debug(f"成功解析时间列: {col}")
-                except Exception as e:
-                    self.logger.warning(f"时间列解析失败 {col}: {e}")
-        
-        return df
-    
     def _validate_dataframe(self, df: pd.DataFrame) -> None:
         """数据质量验证"""
         if df.empty:
@@ -174,31 +257,130 @@ class ColumnMapper:
     def __init__(self, config: CorrelationConfig, logger: logging.Logger):
         self.config = config
         self.logger = logger
-        self._mapping_cache = {}
+        self.mapping_cache = get_mapping_cache(logger)
+        self.column_matcher = ColumnMatcher(config, logger)
     
-    @lru_cache(maxsize=128)
-    async def get_column_mapping(self, 
-                                exist_cols: Tuple[str, ...], 
-                                intent_cols: Tuple[str, ...]) -> Dict[str, Optional[str]]:
-        """获取列名映射"""
-        cache_key = (exist_cols, intent_cols)
-        if cache_key in self._mapping_cache:
-            self.logger.debug("使用缓存的列名映射结果")
-            return self._mapping_cache[cache_key]
-        
-        input_text = f'已有列名：{list(exist_cols)}\n用户意图：{list(intent_cols)}'
+    async def resolve(self,
+                      exist_cols: List[str],
+                      intent_cols: List[str],
+                      derived_catalogue: Dict[str, Dict[str, Any]],
+                      strict: bool = True) -> Tuple[Dict[str, Optional[str]], Dict[str, List[str]]]:
+        """
+        一次性解析意图列映射与所需派生字段的依赖列，本地无法确定的部分合并为一次大模型调用
+        
+        :param derived_catalogue: 派生字段定义 {派生字段: {"depends_on": [...], "description": ...}}
+        :param strict: 为False时跳过依赖无法解析的派生字段（对应意图列映射为None），否则抛出异常
+        :return: (列名映射 {意图列: 数据列或派生字段}, 派生字段依赖 {派生字段: [源列]})
+        """
+        column_match = self.column_matcher.match(exist_cols, intent_cols)
+        derived_match = self.column_matcher.match(list(derived_catalogue), column_match.unresolved)
+        column_map = {**column_match.resolved, **derived_match.resolved}
+        if column_map:
+            self.logger.info(f"本地列名匹配: {column_map}")
+        
+        dependencies = self._match_dependencies(exist_cols, column_map, derived_catalogue)
+        pending = {name: [dep for dep, col in deps.items() if col is None] for name, deps in dependencies.items()}
+        pending = {name: deps for name, deps in pending.items() if deps}
+        
+        if derived_match.unresolved or pending:
+            response = await self._get_llm_resolution(exist_cols, derived_match.unresolved, derived_catalogue, pending)
+            llm_mapping = response.get("mapping") or {}
+            for intent in derived_match.unresolved:
+                mapped = llm_mapping.get(intent)
+                column_map[intent] = mapped if mapped in exist_cols or mapped in derived_catalogue else None
+            
+            # 大模型新选中的派生字段同样先在本地解析依赖，其余采用大模型给出的依赖映射
+            llm_dependencies = response.get("dependencies") or {}
+            dependencies = self._match_dependencies(exist_cols, column_map, derived_catalogue)
+            for name, deps in dependencies.items():
+                for dep, col in deps.items():
+                    if col is None:
+                        deps[dep] = (llm_dependencies.get(name) or {}).get(dep)
+        
+        column_map = {intent: column_map.get(intent) for intent in intent_cols}
+        derived_fields = {}
+        for name, deps in dependencies.items():
+            try:
+                derived_fields[name] = self._validate_dependencies(exist_cols, deps)
+            except ColumnMappingError as e:
+                if strict:
+                    self.logger.error(f"解析派生字段依赖失败 {name}: {e}")
+                    raise
+                self.logger.warning(f"派生字段 {name} 的依赖无法解析，已跳过: {e}")
+                column_map = {k: (None if v == name else v) for k, v in column_map.items()}
+        
+        self.logger.info(f"最终列名映射: {column_map}，派生字段依赖: {derived_fields}")
+        return column_map, derived_fields
+    
+    def _match_dependencies(self,
+                            exist_cols: List[str],
+                            column_map: Dict[str, Optional[str]],
+                            derived_catalogue: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Optional[str]]]:
+        """在本地解析映射中用到的派生字段的依赖列，无法确定的为None"""
+        dependencies = {}
+        for mapped in column_map.values():
+            if mapped not in derived_catalogue or mapped in dependencies:
+                continue
+            deps = {}
+            for dep in derived_catalogue[mapped]["depends_on"]:
+                # 依次使用：用户意图中的同名映射、同名数据列、本地匹配
+                col = column_map.get(dep)
+                if not col or col not in exist_cols:
+                    col = dep if dep in exist_cols else self.column_matcher.match(exist_cols, [dep]).resolved.get(dep)
+                deps[dep] = col
+            dependencies[mapped] = deps
+        return dependencies
+    
+    def _validate_dependencies(self, exist_cols: List[str], deps: Dict[str, Optional[str]]) -> List[str]:
+        resolved = []
+        for dep, col in deps.items():
+            if not col:
+                raise ColumnMappingError(f"无法找到依赖字段: {dep}")
+            if col not in exist_cols:
+                raise ColumnMappingError(f"依赖字段不存在于数据中: {dep} -> {col}")
+            resolved.append(col)
+        return resolved
+    
+    async def _get_llm_resolution(self,
+                                  exist_cols: List[str],
+                                  intent_cols: List[str],
+                                  derived_catalogue: Dict[str, Dict[str, Any]],
+                                  pending: Dict[str, List[str]]) -> Dict[str, Any]:
+        """一次大模型调用同时得到意图列映射和派生字段依赖映射"""
+        catalogue = {
+            name: {"依赖": info["depends_on"], "说明": info.get("description", "")}
+            for name, info in derived_catalogue.items()
+        }
+        input_text = (f'已有列名：{list(exist_cols)}\n'
+                      f'派生字段：{json.dumps(catalogue, ensure_ascii=False)}\n'
+                      f'用户意图：{list(intent_cols)}\n'
+                      f'待解析依赖：{json.dumps(pending, ensure_ascii=False)}')
+        cache_cols = tuple(exist_cols) + tuple(f"派生:{name}" for name in derived_catalogue)
+        cache_intents = tuple(intent_cols) + tuple(f"依赖:{name}.{dep}" for name, deps in pending.items() for dep in deps)
+        return await self._run_agent(column_resolution_agent, input_text, cache_cols, cache_intents)
+    
+    async def _run_agent(self,
+                         agent: Any,
+                         input_text: str,
+                         cache_cols: Tuple[str, ...],
+                         cache_intents: Tuple[str, ...]) -> Dict[str, Any]:
+        """调用大模型并解析JSON输出，同一表结构与意图的结果持久缓存，只调用一次大模型"""
+        cached = self.mapping_cache.get(cache_cols, cache_intents)
+        if cached is not None:
+            self.logger.info(f"使用缓存的列名映射结果: {cached}")
+            return cached
         
         for attempt in range(self.config.max_retries):
             try:
                 self.logger.info(f"尝试第 {attempt + 1} 次列名映射...")
                 
                 result = await Runner.run(
-                    starting_agent=column_mapping_agent,
+                    starting_agent=agent,
                     input=input_text
                 )
                 
                 column_map = self._parse_mapping_result(result.final_output)
-                self._mapping_cache[cache_key] = column_map
+                self.mapping_cache.put(cache_cols, cache_intents, column_map)
                 
                 self.logger.info(f"列名映射成功: {column_map}")
                 return column_map
@@ -236,154 +418,81 @@ class ColumnMapper:
         raise json.JSONDecodeError(f"无法解析JSON: {cleaned_output}", cleaned_output, 0)
 
 class DerivedFieldGenerator:
-    """派生字段生成器类"""
+    """派生字段生成器类：按注册表中的依赖图只计算请求需要的字段"""
     
     def __init__(self, config: CorrelationConfig, logger: logging.Logger):
         self.config = config
         self.logger = logger
-        self.derived_fields = self._initialize_derived_fields()
+        self.executor = get_analysis_executor(config, logger)
+        self.registry = get_derived_field_registry(logger)
+        self.column_cache = get_derived_column_cache(logger)
     
-    def _initialize_derived_fields(self) -> Dict[str, Dict[str, Any]]:
-        """初始化派生字段定义"""
-        return {
-            "时间": {
-                "depends_on": ["时间"],
-                "generate": self._generate_datetime_field,
-                "description": "时间字段标准化"
-            },
-            "季节": {
-                "depends_on": ["时间"],
-                "generate": self._generate_season_field,
-                "description": "根据时间生成季节字段"
-            },
-            "风向方位": {
-                "depends_on": ["风向"],
-                "generate": self._generate_wind_direction_field,
-                "description": "将风向角度转换为中文方位"
-            }
-        }
+    @property
+    def derived_fields(self) -> Dict[str, Dict[str, Any]]:
+        """派生字段目录 {派生字段: {"depends_on": [数据源意图列], "description": ...}}"""
+        return self.registry.catalogue()
     
     async def generate_required_fields(self, 
                                      df: pd.DataFrame, 
-                                     column_map: Dict[str, Optional[str]],
-                                     column_mapper: ColumnMapper) -> pd.DataFrame:
-        """生成所需的派生字段"""
-        df_copy = df.copy()
-        generated_fields = set()
-        
-        # 检查哪些派生字段需要生成
-        required_derived_fields = []
-        for user_key, mapped_value in column_map.items():
-            if mapped_value in self.derived_fields:
-                required_derived_fields.append(mapped_value)
-        
-        self.logger.info(f"需要生成的派生字段: {required_derived_fields}")
-        
-        for derived_name in required_derived_fields:
-            if derived_name in generated_fields:
-                continue
-                
-            derived_info = self.derived_fields[derived_name]
-            
-            try:
-                resolved_deps = await self._resolve_dependencies(
-                    df_copy, derived_info["depends_on"], column_map, column_mapper
-                )
-                
-                derived_info["generate"](df_copy, resolved_deps)
-                generated_fields.add(derived_name)
-                
-                self.logger.info(f"成功生成派生字段: {derived_name}")
-                
-            except Exception as e:
-                self.logger.error(f"生成派生字段失败 {derived_name}: {e}")
-                raise
+                                     resolved_fields: Dict[str, List[str]],
+                                     dataset_key: Optional[DatasetKey] = None) -> pd.DataFrame:
+        """
+        生成所需的派生字段
+        
+        :param resolved_fields: 列名解析得到的 {派生字段: [源列]}
+        :param dataset_key: df为该数据集版本的完整数据（未过滤）时传入，生成的列按版本缓存
+        """
+        self.logger.info(f"需要生成的派生字段: {list(resolved_fields)}")
+        if not resolved_fields:
+            return df
         
+        # 只新增列，浅拷贝即可隔离调用方的数据
+        df_copy = df.copy(deep=False)
+        try:
+            await self.executor.run("derive", self.apply_fields, df_copy, resolved_fields, dataset_key)
+        except Exception as e:
+            self.logger.error(f"生成派生字段失败: {e}")
+            raise
         return df_copy
     
-    async def _resolve_dependencies(self, 
-                                  df: pd.DataFrame, 
-                                  dependencies: List[str],
-                                  column_map: Dict[str, Optional[str]],
-                                  column_mapper: ColumnMapper) -> List[str]:
-        """解析派生字段依赖"""
-        resolved_deps = []
-        
-        for dep in dependencies:
-            # 首先检查column_map中是否有直接映射
-            mapped_col = None
-            for user_key, mapped_value in column_map.items():
-                if user_key == dep:
-                    mapped_col = mapped_value
-                    break
-            
-            # 如果没有直接映射，尝试在数据框列中查找
-            if not mapped_col:
-                if dep in df.columns:
-                    mapped_col = dep
-                else:
-                    # 尝试自动匹配
-                    self.logger.info(f"字段 {dep} 不存在，尝试自动匹配...")
-                    depend_map = await column_mapper.get_column_mapping(
-                        tuple(df.columns), (dep,)
-                    )
-                    
-                    mapped_col = depend_map.get(dep)
-                    if not mapped_col:
-                        raise ColumnMappingError(f"无法找到依赖字段: {dep}")
-            
-            if mapped_col not in df.columns:
-                raise ColumnMappingError(f"依赖字段不存在于数据中: {dep} -> {mapped_col}")
-            
-            resolved_deps.append(mapped_col)
-            self.logger.info(f"依赖字段解析: {dep} -> {mapped_col}")
-        
-        return resolved_deps
-    
-    def _generate_datetime_field(self, df: pd.DataFrame, cols: List[str]) -> None:
-        """生成标准化时间字段"""
-        if cols:
-            df[cols[0]] = pd.to_datetime(df[cols[0]], errors="coerce")
-    
-    def _generate_season_field(self, df: pd.DataFrame, cols: List[str]) -> None:
-        """生成季节字段"""
-        if cols:
-            df["季节"] = df[cols[0]].dt.month.map(self._get_chinese_season)
-    
-    def _generate_wind_direction_field(self, df: pd.DataFrame, cols: List[str]) -> None:
-        """生成风向方位字段"""
-        if cols:
-            df["风向方位"] = df[cols[0]].apply(self._get_chinese_wind_direction)
-    
-    @staticmethod
-    def _get_chinese_season(month: int) -> Optional[str]:
-        """季节转换函数"""
-        if pd.isna(month) or not isinstance(month, (int, float)):
-            return None
-        
-        month = int(month)
-        season_map = {
-            (3, 4, 5): "春",
-            (6, 7, 8): "夏", 
-            (9, 10, 11): "秋",
-            (12, 1, 2): "冬"
-        }
-        
-        for months, season in season_map.items():
-            if month in months:
-                return season
-        return None
-    
-    @staticmethod
-    def _get_chinese_wind_direction(degree: float) -> Optional[str]:
-        """风向转换函数"""
-        if pd.isna(degree) or not isinstance(degree, (int, float)):
-            return None
-        
-        degree = degree % 360
-        directions = ["北", "东北", "东", "东南", "南", "西南", "西", "西北"]
-        idx = int((degree + 22.5) / 45) % 8
-        return directions[idx] 
+    def apply_fields(self,
+                     df: pd.DataFrame,
+                     resolved_fields: Dict[str, List[str]],
+                     dataset_key: Optional[DatasetKey] = None) -> pd.DataFrame:
+        """
+        在df上原地生成派生字段（同步，流式分块计算时逐块调用）
+        
+        从所需字段出发沿依赖图按需求值：已缓存的字段不再计算其上游字段，上游字段只参与计算、不写入df
+        """
+        sources: Dict[str, str] = {}
+        for name, cols in resolved_fields.items():
+            sources.update(zip(self.registry.source_inputs(name), cols))
+        self.logger.debug(f"派生字段计算顺序: {self.registry.plan(list(resolved_fields))}")
+        
+        computed: Dict[str, pd.Series] = {}
+        
+        def materialize(name: str) -> pd.Series:
+            if name in computed:
+                return computed[name]
+            column_key = (name, tuple(sources[dep] for dep in self.registry.source_inputs(name)))
+            values = self.column_cache.get(dataset_key, column_key, len(df)) if dataset_key is not None else None
+            if values is None:
+                derived = self.registry.get(name)
+                derived_inputs = self.registry.derived_inputs(name)
+                args = [materialize(dep) if dep in derived_inputs else df[sources[dep]] for dep in derived.inputs]
+                values = derived.compute(*args)
+                values = values.set_axis(df.index) if isinstance(values, pd.Series) else pd.Series(values, index=df.index)
+                if derived.dtype is not None and values.dtype != derived.dtype:
+                    values = values.astype(derived.dtype)
+                if dataset_key is not None:
+                    self.column_cache.put(dataset_key, column_key, values.rename(name))
+                self.logger.debug(f"成功生成派生字段: {name}")
+            computed[name] = values.set_axis(df.index)
+            return computed[name]
+        
+        for name in resolved_fields:
+            df[name] = materialize(name)
+        return df
 
 class CorrelationCalculator:
     """相关性计算器类"""
@@ -391,15 +500,17 @@ class CorrelationCalculator:
     def __init__(self, config: CorrelationConfig, logger: logging.Logger):
         self.config = config
         self.logger = logger
+        self.parallel_executor = ParallelGroupExecutor(config, logger)
     
     def calculate_correlation(self, 
                             df: pd.DataFrame,
                             var1: str, 
                             var2: str,
                             group_by: Optional[List[str]] = None,
-                            method: CorrelationMethod = CorrelationMethod.PEARSON) -> Dict[str, Union[float, None, int]]:
-        """计算两变量相关性"""
-        df_clean = self._prepare_data_for_correlation(df, var1, var2, group_by)
+                            method: CorrelationMethod = CorrelationMethod.PEARSON,
+                            row_mask: Optional[np.ndarray] = None) -> Dict[str, Union[float, None, int]]:
+        """计算两变量相关性，row_mask 为过滤条件合并后的行掩码"""
+        df_clean = self._prepare_data_for_correlation(df, var1, var2, group_by, row_mask)
         
         if group_by:
             return self._calculate_grouped_correlation(df_clean, var1, var2, group_by, method)
@@ -410,104 +521,375 @@ class CorrelationCalculator:
                                    df: pd.DataFrame,
                                    variables: List[str],
                                    group_by: Optional[List[str]] = None,
-                                   method: CorrelationMethod = CorrelationMethod.PEARSON) -> Dict[str, Any]:
-        """计算多变量相关性矩阵"""
-        df_clean = self._prepare_data_for_matrix_correlation(df, variables, group_by)
+                                   method: CorrelationMethod = CorrelationMethod.PEARSON,
+                                   missing_strategy: MissingValueStrategy = MissingValueStrategy.LISTWISE,
+                                   row_mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """计算多变量相关性矩阵（结果的 matrix 为 CorrelationMatrix），row_mask 为过滤条件合并后的行掩码"""
+        df_clean = self._prepare_data_for_matrix_correlation(df, variables, group_by, missing_strategy, row_mask)
         
         result = {
             "matrix_type": "correlation_matrix",
             "variables": variables,
-            "method": method.value
+            "method": method.value,
+            "missing_strategy": missing_strategy.value
         }
         
-        if group_by:
-            result["groups"] = self._calculate_grouped_correlation_matrix(df_clean, variables, group_by, method)
+        if missing_strategy == MissingValueStrategy.PAIRWISE:
+            if group_by:
+                result["matrix"] = self._calculate_grouped_pairwise_matrix(df_clean, variables, group_by, method)
+            else:
+                result["matrix"] = self._calculate_pairwise_matrix(df_clean, variables, method)
+        elif group_by:
+            result["matrix"] = self._calculate_grouped_correlation_matrix(df_clean, variables, group_by, method)
         else:
             result["matrix"] = self._calculate_simple_correlation_matrix(df_clean, variables, method)
         
         return result
-    
-    def _prepare_data_for_matrix_correlation(self, df: pd.DataFrame, variables: List[str], group_by: Optional[List[str]] = None) -> pd.DataFrame:
-        """为多变量相关性分析准备数据"""
-        df_copy = df.copy()
+
+    def calculate_streaming_correlation(self,
+                                        chunks: Iterable[pd.DataFrame],
+                                        variables: List[str],
+                                        group_by: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        流式分块计算Pearson相关性（整行删除缺失值）
+        
+        每块只累加各分组可合并的二阶统计量，内存占用与数据行数无关。
+        两变量时返回与 calculate_correlation 相同的结构，多变量时返回与 calculate_correlation_matrix 相同的结构。
+        """
+        accumulator = self.accumulate_chunks(chunks, variables, group_by)
+        return self.comoment_result(accumulator, variables, group_by)
+
+    def accumulate_chunks(self,
+                          chunks: Iterable[pd.DataFrame],
+                          variables: List[str],
+                          group_by: Optional[List[str]] = None,
+                          accumulator: Optional[CoMomentAccumulator] = None) -> CoMomentAccumulator:
+        """把数据块累加进统计量，传入已有累加器时在其基础上继续累加"""
+        if accumulator is None:
+            accumulator = CoMomentAccumulator(len(variables))
+        total_rows = 0
+        
+        for chunk in chunks:
+            missing_cols = [col for col in variables + (group_by or []) if col not in chunk.columns]
+            if missing_cols:
+                raise ValueError(f"以下列在数据中不存在: {missing_cols}")
+            
+            values = np.column_stack([
+                pd.to_numeric(chunk[var], errors='coerce').to_numpy(dtype=np.float64) for var in variables
+            ])
+            if group_by:
+                grouped = chunk.groupby(group_by, sort=False, observed=True)
+                codes = grouped.ngroup().to_numpy(dtype=np.int64)
+                keys = list(grouped.size().index)
+            else:
+                codes = np.zeros(len(chunk), dtype=np.int64)
+                keys = [None]
+            
+            accumulator.update(values, codes, keys)
+            total_rows += len(chunk)
         
-        # 数值化相关性变量
-        for var in variables:
-            if var in df_copy.columns:
-                df_copy[var] = pd.to_numeric(df_copy[var], errors='coerce')
+        self.logger.info(f"累加完成: 共读取{total_rows}行, {accumulator.n_groups}个分组")
+        return accumulator
+
+    def comoment_result(self,
+                        accumulator: CoMomentAccumulator,
+                        variables: List[str],
+                        group_by: Optional[List[str]] = None) -> Dict[str, Any]:
+        """由累加器的统计量生成相关性结果"""
+        corr, n = accumulator.correlations()
+        order = group_sort_order(accumulator.keys)
+        keys = [format_group_key(accumulator.keys[i]) for i in order]
+        corr, n = corr[order], n[order]
+        eligible = n >= self.config.min_sample_size
+        
+        if len(variables) == 2:
+            var1, var2 = variables
+            if group_by:
+                return self._assemble_grouped_result(keys, n, eligible, corr[:, 0, 1])
+            if not keys or not eligible[0]:
+                return {f"corr_{var1}_{var2}": None}
+            corr_value = corr[0, 0, 1]
+            return {f"corr_{var1}_{var2}": round(0.0 if np.isnan(corr_value) else float(corr_value),
+                                                 self.config.correlation_precision)}
         
-        # 确定需要保留的列
-        columns_to_keep = variables.copy()
+        result = {
+            "matrix_type": "correlation_matrix",
+            "variables": variables,
+            "method": CorrelationMethod.PEARSON.value,
+            "missing_strategy": MissingValueStrategy.LISTWISE.value
+        }
         if group_by:
-            columns_to_keep.extend(group_by)
+            result["matrix"] = self._correlation_matrix(corr, eligible, variables, keys)
+        elif keys:
+            result["matrix"] = self._correlation_matrix(corr[:1], eligible[:1], variables)
+        else:
+            result["matrix"] = self._correlation_matrix(
+                np.full((len(variables), len(variables)), np.nan), [False], variables
+            )
+        return result
+    
+    def calculate_cube_correlation(self,
+                                   cube: CorrelationCube,
+                                   variables: List[str],
+                                   group_by: List[str],
+                                   filters: Dict[str, Any],
+                                   missing_strategy: MissingValueStrategy) -> Optional[Dict[str, Any]]:
+        """
+        由立方体单元统计量汇总计算Pearson相关性，结果结构与直接计算一致
+        
+        多变量整行删除只在所选变量均无缺失值时与成对统计量等价，否则返回None，由调用方改为读取数据计算。
+        """
+        cube_slice = cube.rollup(variables, group_by, filters)
+        moments = cube_slice.moments
+        
+        if len(variables) == 2 or missing_strategy == MissingValueStrategy.LISTWISE:
+            if len(variables) > 2 and not cube_slice.complete.all():
+                return None
+            comoments = pair_to_comoments(moments)
+            # 与先删除缺失值再分组一致，只保留有有效行的分组
+            present = comoments.n > 0 if group_by else np.ones(len(cube_slice.keys), dtype=bool)
+            accumulator = CoMomentAccumulator.from_moments(
+                [key for key, keep in zip(cube_slice.keys, present) if keep],
+                CoMoments(n=comoments.n[present], mean=comoments.mean[present], comoment=comoments.comoment[present])
+            )
+            return self.comoment_result(accumulator, variables, group_by)
         
-        # 只保留需要的列并删除缺失值
-        df_clean = df_copy[columns_to_keep].dropna(subset=variables)
+        corr, counts = pair_correlation(moments), moments.n
+        result = {
+            "matrix_type": "correlation_matrix",
+            "variables": variables,
+            "method": CorrelationMethod.PEARSON.value,
+            "missing_strategy": MissingValueStrategy.PAIRWISE.value
+        }
+        if group_by:
+            # 成对删除只剔除全部变量缺失的行
+            present = np.einsum("gii->gi", counts).any(axis=1)
+            keys = [format_group_key(cube_slice.keys[i]) for i in np.flatnonzero(present)]
+            result["matrix"] = self._pairwise_matrix(corr[present], counts[present], variables, keys)
+        else:
+            result["matrix"] = self._pairwise_matrix(corr[0], counts[0], variables)
+        return result
+    
+    def _correlation_matrix(self,
+                            corr: np.ndarray,
+                            sufficient: Union[np.ndarray, List[bool]],
+                            variables: List[str],
+                            groups: Optional[List[str]] = None,
+                            n: Optional[np.ndarray] = None) -> CorrelationMatrix:
+        """
+        把 (分组数, k, k) 的相关矩阵数组转换为 CorrelationMatrix，相关系数按精度统一舍入
+        
+        sufficient 为每个分组或每个单元格是否满足最小样本数，不满足的单元格为NaN（数据不足），对角线仍为1。
+        """
+        k = len(variables)
+        corr = np.asarray(corr, dtype=np.float64).reshape(-1, k, k)
+        sufficient = np.asarray(sufficient, dtype=bool)
+        if sufficient.ndim == 1:
+            sufficient = sufficient[:, None, None]
+        squares = np.where(sufficient, corr, np.where(np.eye(k, dtype=bool), 1.0, np.nan))
+        return CorrelationMatrix.from_square(squares, variables, groups, n=n,
+                                             precision=self.config.correlation_precision)
+
+    def calculate_top_correlations(self,
+                                   df: pd.DataFrame,
+                                   variables: List[str],
+                                   group_by: Optional[List[str]] = None,
+                                   method: CorrelationMethod = CorrelationMethod.PEARSON,
+                                   top_k: Optional[int] = None,
+                                   min_abs_correlation: Optional[float] = None,
+                                   missing_strategy: MissingValueStrategy = MissingValueStrategy.LISTWISE,
+                                   row_mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """全变量对筛选：分块计算完整相关矩阵，只返回最强的 top_k 个或超过阈值的变量对"""
+        df_clean = self._prepare_data_for_matrix_correlation(df, variables, group_by, missing_strategy, row_mask)
+
+        result = {
+            "matrix_type": "top_pairs",
+            "variables": variables,
+            "method": method.value,
+            "missing_strategy": missing_strategy.value,
+            "top_k": top_k,
+            "min_abs_correlation": min_abs_correlation
+        }
+
+        if group_by:
+            groups = {}
+            for keys, group in df_clean.groupby(group_by, observed=True):
+                key_str = format_group_key(keys)
+                if group.shape[0] < self.config.min_sample_size:
+                    self.logger.debug(f"分组 {key_str} 数据不足: {group.shape[0]}行")
+                    groups[key_str] = None
+                else:
+                    groups[key_str] = self._screen_pairs(group, variables, method, top_k,
+                                                         min_abs_correlation, missing_strategy)
+            result["groups"] = groups
+        elif df_clean.shape[0] < self.config.min_sample_size:
+            self.logger.warning(f"数据量不足: {df_clean.shape[0]}行，小于最小样本数 {self.config.min_sample_size}")
+            result["pairs"] = None
+        else:
+            result["pairs"] = self._screen_pairs(df_clean, variables, method, top_k,
+                                                 min_abs_correlation, missing_strategy)
+
+        return result
+
+    def _screen_pairs(self,
+                      df: pd.DataFrame,
+                      variables: List[str],
+                      method: CorrelationMethod,
+                      top_k: Optional[int],
+                      min_abs_correlation: Optional[float],
+                      missing_strategy: MissingValueStrategy = MissingValueStrategy.LISTWISE) -> List[Tuple[str, str, float]]:
+        """计算单个数据块内最强的变量对"""
+        values = df[variables].to_numpy(dtype=np.float64)
+
+        if missing_strategy == MissingValueStrategy.PAIRWISE:
+            corr, counts = self._pairwise_arrays(df, variables, method)
+            corr[counts < self.config.min_sample_size] = np.nan
+            pairs = select_top_pairs(corr, top_k, min_abs_correlation)
+        elif method == CorrelationMethod.KENDALL:
+            pairs = select_top_pairs(kendall_matrix(values), top_k, min_abs_correlation)
+        else:
+            pairs = blocked_top_pairs(
+                values,
+                top_k=top_k,
+                min_abs_correlation=min_abs_correlation,
+                block_size=self.config.screening_block_size,
+                rank_transform=(method == CorrelationMethod.SPEARMAN)
+            )
+
+        rounded = np.round(pairs.r, self.config.correlation_precision)
+        return [
+            (variables[i], variables[j], float(r))
+            for i, j, r in zip(pairs.rows.tolist(), pairs.cols.tolist(), rounded.tolist())
+        ]
+    
+    def _pairwise_arrays(self,
+                         df: pd.DataFrame,
+                         variables: List[str],
+                         method: CorrelationMethod) -> Tuple[np.ndarray, np.ndarray]:
+        """成对删除下的相关矩阵与有效样本数矩阵"""
+        values = df[variables].to_numpy(dtype=np.float64)
+        
+        if method == CorrelationMethod.PEARSON:
+            return pairwise_complete_pearson(values)
         
-        self.logger.debug(f"矩阵数据预处理完成: {df_clean.shape[0]}行有效数据，{len(variables)}个变量，保留列: {columns_to_keep}")
+        counts = pairwise_valid_counts(values)
+        if method == CorrelationMethod.SPEARMAN:
+            # pandas 对每个变量对剔除缺失后重新排秩，与 scipy.stats.spearmanr 一致
+            corr = df[variables].corr(method='spearman').to_numpy()
+        else:
+            corr = kendall_matrix(values)
+        return corr, counts
+    
+    def _calculate_pairwise_matrix(self,
+                                   df: pd.DataFrame,
+                                   variables: List[str],
+                                   method: CorrelationMethod) -> CorrelationMatrix:
+        """成对删除的相关矩阵，每个单元格附带其有效样本数"""
+        corr, counts = self._pairwise_arrays(df, variables, method)
+        return self._pairwise_matrix(corr, counts, variables)
+    
+    def _pairwise_matrix(self,
+                         corr: np.ndarray,
+                         counts: np.ndarray,
+                         variables: List[str],
+                         groups: Optional[List[str]] = None) -> CorrelationMatrix:
+        """由成对相关矩阵与有效样本数数组（可带分组维度）构造，样本数不足的单元格为数据不足"""
+        return self._correlation_matrix(corr, counts >= self.config.min_sample_size, variables, groups, n=counts)
+    
+    def _calculate_grouped_pairwise_matrix(self,
+                                           df: pd.DataFrame,
+                                           variables: List[str],
+                                           group_by: List[str],
+                                           method: CorrelationMethod) -> CorrelationMatrix:
+        """分组的成对删除相关矩阵"""
+        k = len(variables)
+        group_keys, corrs, counts = [], [], []
+        
+        for keys, group in df.groupby(group_by, observed=True):
+            group_keys.append(format_group_key(keys))
+            corr, count = self._pairwise_arrays(group, variables, method)
+            corrs.append(corr)
+            counts.append(count)
+        
+        return self._pairwise_matrix(np.reshape(corrs, (-1, k, k)), np.reshape(counts, (-1, k, k)),
+                                     variables, group_keys)
+    
+    def _prepare_data_for_matrix_correlation(self,
+                                             df: pd.DataFrame,
+                                             variables: List[str],
+                                             group_by: Optional[List[str]] = None,
+                                             missing_strategy: MissingValueStrategy = MissingValueStrategy.LISTWISE,
+                                             row_mask: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """为多变量相关性分析准备数据；成对删除时仅删除全部变量缺失的行"""
+        df_clean = self._select_valid_rows(
+            df, variables, group_by, row_mask, require_all=missing_strategy != MissingValueStrategy.PAIRWISE
+        )
+        self.logger.debug(f"矩阵数据预处理完成: {df_clean.shape[0]}行有效数据，{len(variables)}个变量，保留列: {df_clean.columns.tolist()}")
         return df_clean
     
+    def _select_valid_rows(self,
+                           df: pd.DataFrame,
+                           variables: List[str],
+                           group_by: Optional[List[str]],
+                           row_mask: Optional[np.ndarray],
+                           require_all: bool = True) -> pd.DataFrame:
+        """
+        只取变量列与分组列，把过滤掩码与缺失值条件合并为一个行掩码后一次性取出有效行
+        
+        数值列的转换不会复制原数据，整个预处理只在最后按掩码取行时生成一份所需列的切片。
+        过滤掩码只选中少数行时先按掩码取出所需列，之后的转换与缺失值检查只涉及选中的行。
+        """
+        if row_mask is not None and row_mask.sum() * 2 < len(row_mask):
+            df = df[list(dict.fromkeys([*variables, *(group_by or [])]))][row_mask]
+            row_mask = None
+        
+        columns = {var: pd.to_numeric(df[var], errors='coerce') for var in variables}
+        for col in group_by or []:
+            columns.setdefault(col, df[col])
+        
+        present = np.column_stack([columns[var].notna().to_numpy() for var in variables])
+        keep = present.all(axis=1) if require_all else present.any(axis=1)
+        if row_mask is not None:
+            keep &= row_mask
+        return pd.DataFrame(columns, copy=False)[keep]
+    
     def _calculate_simple_correlation_matrix(self, 
                                            df: pd.DataFrame, 
                                            variables: List[str],
-                                           method: CorrelationMethod) -> Dict[Tuple[str, str], Union[float, None]]:
+                                           method: CorrelationMethod) -> CorrelationMatrix:
         """计算简单相关性矩阵（无分组）"""
+        k = len(variables)
         if df.shape[0] < self.config.min_sample_size:
             self.logger.warning(f"数据量不足: {df.shape[0]}行，小于最小样本数 {self.config.min_sample_size}")
-            matrix = {}
-            for i, var1 in enumerate(variables):
-                for j, var2 in enumerate(variables):
-                    if i == j:
-                        matrix[(var1, var2)] = 1.0
-                    else:
-                        matrix[(var1, var2)] = None
-            return matrix
+            return self._correlation_matrix(np.full((k, k), np.nan), [False], variables)
         
         try:
-            if method == CorrelationMethod.PEARSON:
-                corr_matrix = df.corr(method='pearson')
-            elif method == CorrelationMethod.SPEARMAN:
-                corr_matrix = df.corr(method='spearman')
-            elif method == CorrelationMethod.KENDALL:
-                corr_matrix = df.corr(method='kendall')
-            else:
-                corr_matrix = df.corr(method='pearson')
-            
-            matrix = {}
-            for var1 in variables:
-                for var2 in variables:
-                    if var1 in corr_matrix.index and var2 in corr_matrix.columns:
-                        corr_value = corr_matrix.loc[var1, var2]
-                        if pd.isna(corr_value):
-                            matrix[(var1, var2)] = None
-                        else:
-                            matrix[(var1, var2)] = round(corr_value, self.config.correlation_precision)
-                    else:
-                        matrix[(var1, var2)] = None
-            
-            return matrix
-            
+            corr = self._corr_array(df, variables, method)
         except Exception as e:
             self.logger.error(f"相关性矩阵计算失败: {e}")
-            matrix = {}
-            for var1 in variables:
-                for var2 in variables:
-                    matrix[(var1, var2)] = None
-            return matrix
+            corr = np.full((k, k), np.nan)
+        return self._correlation_matrix(corr, [True], variables)
     
     def _calculate_grouped_correlation_matrix(self, 
                                             df: pd.DataFrame, 
                                             variables: List[str],
                                             group_by: List[str],
-                                            method: CorrelationMethod) -> Dict[str, Dict[Tuple[str, str], Union[float, None]]]:
-        """计算分组相关性矩阵"""
-        result = {}
+                                            method: CorrelationMethod) -> CorrelationMatrix:
+        """计算分组相关性矩阵，各分组的结果写入同一个 (分组数, k, k) 数组"""
+        if method == CorrelationMethod.KENDALL:
+            group_index = build_group_index(df, group_by)
+            if self.parallel_executor.should_parallelize(group_index.n_groups, df.shape[0]):
+                return self._calculate_grouped_matrix_parallel(df, variables, group_index)
+        
+        shape = (len(variables), len(variables))
+        group_keys, corrs, sufficient = [], [], []
         
         try:
-            grouped = df.groupby(group_by)
+            grouped = df.groupby(group_by, observed=True)
             
             for keys, group in grouped:
                 key_str = " - ".join(str(k) for k in keys) if isinstance(keys, tuple) else str(keys)
+                group_keys.append(key_str)
                 
                 original_size = group.shape[0]
                 group_clean = group[variables].dropna()
@@ -517,71 +899,73 @@ class CorrelationCalculator:
                 
                 if clean_size < self.config.min_sample_size:
                     self.logger.warning(f"分组 {key_str} 数据不足: 清洗后{clean_size}行 (原始{original_size}行, 最小要求{self.config.min_sample_size}行)")
-                    matrix = {}
-                    for var1 in variables:
-                        for var2 in variables:
-                            if var1 == var2:
-                                matrix[(var1, var2)] = 1.0
-                            else:
-                                matrix[(var1, var2)] = self.config.data_insufficient_flag
-                    result[key_str] = matrix
-                else:
-                    try:
-                        if method == CorrelationMethod.PEARSON:
-                            corr_matrix = group_clean.corr(method='pearson')
-                        elif method == CorrelationMethod.SPEARMAN:
-                            corr_matrix = group_clean.corr(method='spearman')
-                        elif method == CorrelationMethod.KENDALL:
-                            corr_matrix = group_clean.corr(method='kendall')
-                        else:
-                            corr_matrix = group_clean.corr(method='pearson')
-                        
-                        matrix = {}
-                        for var1 in variables:
-                            for var2 in variables:
-                                if var1 in corr_matrix.index and var2 in corr_matrix.columns:
-                                    corr_value = corr_matrix.loc[var1, var2]
-                                    if pd.isna(corr_value):
-                                        matrix[(var1, var2)] = None
-                                    else:
-                                        matrix[(var1, var2)] = round(corr_value, self.config.correlation_precision)
-                                else:
-                                    matrix[(var1, var2)] = None
-                        
-                        result[key_str] = matrix
-                        
-                    except Exception as e:
-                        self.logger.warning(f"分组 {key_str} 相关性矩阵计算失败: {e}")
-                        matrix = {}
-                        for var1 in variables:
-                            for var2 in variables:
-                                matrix[(var1, var2)] = None
-                        result[key_str] = matrix
+                    corrs.append(np.full(shape, np.nan))
+                    sufficient.append(False)
+                    continue
+                
+                try:
+                    corrs.append(self._corr_array(group_clean, variables, method))
+                except Exception as e:
+                    self.logger.warning(f"分组 {key_str} 相关性矩阵计算失败: {e}")
+                    corrs.append(np.full(shape, np.nan))
+                sufficient.append(True)
                         
         except Exception as e:
             self.logger.error(f"分组相关性矩阵计算失败: {e}")
             raise
         
-        return result
+        return self._correlation_matrix(np.reshape(corrs, (-1, *shape)), sufficient, variables, group_keys)
     
-    def _prepare_data_for_correlation(self, df: pd.DataFrame, var1: str, var2: str, group_by: Optional[List[str]] = None) -> pd.DataFrame:
-        """数据预处理，确保数据适合相关性计算"""
-        df_copy = df.copy()
-        
-        # 数值化相关性变量
-        for var in [var1, var2]:
-            if var in df_copy.columns:
-                df_copy[var] = pd.to_numeric(df_copy[var], errors='coerce')
-        
-        # 确定需要保留的列
-        columns_to_keep = [var1, var2]
-        if group_by:
-            columns_to_keep.extend(group_by)
+    def _corr_array(self, df: pd.DataFrame, variables: List[str], method: CorrelationMethod) -> np.ndarray:
+        """按变量顺序排列的 k×k 相关矩阵数组"""
+        if method == CorrelationMethod.KENDALL:
+            corr_matrix = self._kendall_corr_frame(df, variables)
+        elif method == CorrelationMethod.SPEARMAN:
+            corr_matrix = df[variables].corr(method='spearman')
+        else:
+            corr_matrix = df[variables].corr(method='pearson')
+        return corr_matrix.reindex(index=variables, columns=variables).to_numpy(dtype=np.float64)
+    
+    def _calculate_grouped_matrix_parallel(self,
+                                           df: pd.DataFrame,
+                                           variables: List[str],
+                                           group_index: GroupIndex) -> CorrelationMatrix:
+        """多进程并行计算各分组的Kendall相关矩阵"""
+        codes = group_index.codes
+        in_group = codes >= 0
+        n = np.bincount(codes[in_group], minlength=group_index.n_groups)
+        eligible = n >= self.config.min_sample_size
+        
+        matrices = self.parallel_executor.run(
+            df[variables].to_numpy(dtype=np.float64)[in_group],
+            codes[in_group],
+            np.flatnonzero(eligible),
+            "kendall"
+        )
         
-        # 只保留需要的列并删除缺失值
-        df_clean = df_copy[columns_to_keep].dropna(subset=[var1, var2])
+        k = len(variables)
+        corr = np.full((group_index.n_groups, k, k), np.nan)
+        for i, corr_matrix in matrices.items():
+            corr[i] = corr_matrix
+        for i in np.flatnonzero(~eligible):
+            self.logger.debug(f"分组 {group_index.keys[i]} 数据不足: 清洗后{n[i]}行 (最小要求{self.config.min_sample_size}行)")
         
-        self.logger.debug(f"数据预处理完成: {df_clean.shape[0]}行有效数据，保留列: {columns_to_keep}")
+        return self._correlation_matrix(corr, eligible, variables, group_index.keys)
+    
+    def _kendall_corr_frame(self, df: pd.DataFrame, variables: List[str]) -> pd.DataFrame:
+        """基于归并排序Kendall引擎计算相关矩阵，每列只排序一次"""
+        values = df[variables].to_numpy(dtype=np.float64)
+        return pd.DataFrame(kendall_matrix(values), index=variables, columns=variables)
+    
+    def _prepare_data_for_correlation(self,
+                                      df: pd.DataFrame,
+                                      var1: str,
+                                      var2: str,
+                                      group_by: Optional[List[str]] = None,
+                                      row_mask: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """数据预处理，确保数据适合相关性计算"""
+        df_clean = self._select_valid_rows(df, [var1, var2], group_by, row_mask)
+        self.logger.debug(f"数据预处理完成: {df_clean.shape[0]}行有效数据，保留列: {df_clean.columns.tolist()}")
         return df_clean
     
     def _calculate_simple_correlation(self, 
@@ -622,8 +1006,16 @@ class CorrelationCalculator:
             
             if missing_cols:
                 raise ValueError(f"以下列在数据框中不存在: {missing_cols}")
+
+            if method in (CorrelationMethod.PEARSON, CorrelationMethod.SPEARMAN):
+                return self._calculate_grouped_vectorized(df, var1, var2, group_by, method)
             
-            grouped = df.groupby(group_by)
+            if method == CorrelationMethod.KENDALL:
+                group_index = build_group_index(df, group_by)
+                if self.parallel_executor.should_parallelize(group_index.n_groups, df.shape[0]):
+                    return self._calculate_grouped_parallel(df, var1, var2, group_index)
+
+            grouped = df.groupby(group_by, observed=True)
             self.logger.info(f"分组成功，共有 {len(grouped)} 个分组")
             
             for keys, group in grouped:
@@ -636,12 +1028,12 @@ class CorrelationCalculator:
                 
                 if clean_size < self.config.min_sample_size:
                     result[key_str] = self.config.data_insufficient_flag
-                    self.logger.info(f"分组 {key_str} 数据不足: 清洗后{clean_size}行 (原始{original_size}行, 最小要求{self.config.min_sample_size}行)")
+                    self.logger.debug(f"分组 {key_str} 数据不足: 清洗后{clean_size}行 (原始{original_size}行, 最小要求{self.config.min_sample_size}行)")
                 else:
                     try:
                         corr_value = self._compute_correlation(group_clean[var1], group_clean[var2], method)
                         result[key_str] = round(corr_value, self.config.correlation_precision)
-                        self.logger.info(f"分组 {key_str} 相关性: {result[key_str]} (基于{clean_size}行数据)")
+                        self.logger.debug(f"分组 {key_str} 相关性: {result[key_str]} (基于{clean_size}行数据)")
                     except Exception as e:
                         self.logger.warning(f"分组 {key_str} 相关性计算失败: {e}")
                         result[key_str] = None
@@ -652,8 +1044,78 @@ class CorrelationCalculator:
             raise
         
         return result
-    
-    def _compute_correlation(self, 
+
+    def _calculate_grouped_vectorized(self,
+                                      df: pd.DataFrame,
+                                      var1: str,
+                                      var2: str,
+                                      group_by: List[str],
+                                      method: CorrelationMethod) -> Dict[str, Union[float, None, int]]:
+        """基于分组充分统计量的向量化分组相关性（Pearson，及经分组秩变换的Spearman）"""
+        group_index = build_group_index(df, group_by)
+        engine = grouped_spearman if method == CorrelationMethod.SPEARMAN else grouped_pearson
+        grouped_result = engine(
+            df[var1].to_numpy(dtype=np.float64),
+            df[var2].to_numpy(dtype=np.float64),
+            group_index.codes,
+            group_index.n_groups,
+            self.config.min_sample_size
+        )
+        self.logger.info(f"分组成功，共有 {group_index.n_groups} 个分组，"
+                         f"其中 {int((~grouped_result.eligible).sum())} 个分组数据不足")
+
+        return self._assemble_grouped_result(group_index.keys, grouped_result.n,
+                                             grouped_result.eligible, grouped_result.r)
+
+    def _calculate_grouped_parallel(self,
+                                    df: pd.DataFrame,
+                                    var1: str,
+                                    var2: str,
+                                    group_index: GroupIndex) -> Dict[str, Union[float, None, int]]:
+        """多进程并行计算各分组的Kendall相关性"""
+        codes = group_index.codes
+        in_group = codes >= 0
+        n = np.bincount(codes[in_group], minlength=group_index.n_groups)
+        eligible = n >= self.config.min_sample_size
+        
+        matrices = self.parallel_executor.run(
+            df[[var1, var2]].to_numpy(dtype=np.float64)[in_group],
+            codes[in_group],
+            np.flatnonzero(eligible & (n >= 2)),
+            "kendall"
+        )
+        
+        r = np.full(group_index.n_groups, np.nan)
+        for group_id, corr_matrix in matrices.items():
+            r[group_id] = corr_matrix[0, 1]
+        
+        # 逐组计算时不足2个样本的Kendall系数无定义，同样记为0.0
+        return self._assemble_grouped_result(group_index.keys, n, eligible, r, undefined=0.0)
+
+    def _assemble_grouped_result(self,
+                                 keys: List[str],
+                                 n: np.ndarray,
+                                 eligible: np.ndarray,
+                                 r: np.ndarray,
+                                 undefined: Optional[float] = None) -> Dict[str, Union[float, None, int]]:
+        """将分组数组结果整理为 {分组键: 相关性} 字典，undefined 为不足2个样本的分组的结果"""
+        result = {}
+        for i, key_str in enumerate(keys):
+            clean_size = int(n[i])
+            if not eligible[i]:
+                result[key_str] = self.config.data_insufficient_flag
+                self.logger.debug(f"分组 {key_str} 数据不足: 清洗后{clean_size}行 (最小要求{self.config.min_sample_size}行)")
+            elif clean_size < 2:
+                result[key_str] = undefined
+            else:
+                corr_value = r[i]
+                corr_value = 0.0 if np.isnan(corr_value) else float(corr_value)
+                result[key_str] = round(corr_value, self.config.correlation_precision)
+                self.logger.debug(f"分组 {key_str} 相关性: {result[key_str]} (基于{clean_size}行数据)")
+
+        return result
+
+    def _compute_correlation(self,
                            series1: pd.Series, 
                            series2: pd.Series, 
                            method: CorrelationMethod) -> float:
@@ -663,7 +1125,7 @@ class CorrelationCalculator:
         elif method == CorrelationMethod.SPEARMAN:
             corr, _ = spearmanr(series1, series2)
         elif method == CorrelationMethod.KENDALL:
-            corr, _ = kendalltau(series1, series2)
+            corr = kendall_tau_b(series1.to_numpy(dtype=np.float64), series2.to_numpy(dtype=np.float64))
         else:
             corr = series1.corr(series2)
         
@@ -676,6 +1138,32 @@ class TableGenerator:
         self.config = config
         self.logger = logger
     
+    def render(self, result: CorrelationResult) -> str:
+        """把结构化结果渲染为Markdown表格"""
+        if result.kind == TOP_PAIRS:
+            screening_result = {
+                "variables": result.variables,
+                "method": result.method,
+                "top_k": result.top_k,
+                "min_abs_correlation": result.min_abs_correlation
+            }
+            if result.group_by:
+                screening_result["groups"] = dict(zip(result.groups, result.pairs))
+            else:
+                screening_result["pairs"] = result.pairs[0]
+            return self.generate_top_pairs_table(screening_result)
+
+        if result.kind == PAIR:
+            var1, var2 = result.variables
+            keys = result.groups if result.group_by else [f"corr_{var1}_{var2}"]
+            values = result.matrix.cell(var1, var2)
+            pair_result = dict(zip(keys, np.where(np.isnan(values), None, values).tolist()))
+            return self.generate_correlation_table(pair_result, result.group_by, var1, var2)
+
+        return self.generate_correlation_matrix_table(
+            {"variables": result.variables, "method": result.method, "matrix": result.matrix}
+        )
+
     def generate_correlation_table(self, 
                                  result: Dict[str, Union[float, None, int]], 
                                  group_by: List[str], 
@@ -693,89 +1181,94 @@ class TableGenerator:
     
     def generate_correlation_matrix_table(self, 
                                         matrix_result: Dict[str, Any]) -> str:
-        """生成相关性矩阵表格"""
-        variables = matrix_result["variables"]
+        """生成相关性矩阵表格：全部单元格一次格式化，再按行拼接"""
+        matrix: CorrelationMatrix = matrix_result["matrix"]
         method = matrix_result.get("method", "pearson")
+        cells = matrix.squares(matrix.formatted("%.3f", "数据不足"))
+        counts = None if matrix.n is None else matrix.squares(matrix.formatted("%d", "0", matrix.n))
         
-        if "groups" in matrix_result:
-            return self._generate_grouped_matrix_table(matrix_result["groups"], variables, method)
+        if matrix.grouped:
+            return self._generate_grouped_matrix_table(cells, counts, matrix.groups, matrix.variables, method)
         else:
-            return self._generate_simple_matrix_table(matrix_result["matrix"], variables, method)
+            return self._generate_simple_matrix_table(cells[0], matrix.variables, method,
+                                                      None if counts is None else counts[0])
     
+    def generate_top_pairs_table(self, screening_result: Dict[str, Any]) -> str:
+        """生成全变量对筛选结果表格"""
+        criteria = []
+        if screening_result.get("top_k") is not None:
+            criteria.append(f"前{screening_result['top_k']}对")
+        if screening_result.get("min_abs_correlation") is not None:
+            criteria.append(f"|r| ≥ {screening_result['min_abs_correlation']}")
+        title = (f"相关性筛选 (方法: {screening_result['method']}, "
+                 f"变量数: {len(screening_result['variables'])}, {' / '.join(criteria)})\n\n")
+
+        if "groups" not in screening_result:
+            return title + self._build_pairs_markdown(screening_result["pairs"])
+
+        md = title
+        for group_key in sorted(screening_result["groups"].keys()):
+            md += f"**{group_key}**\n\n"
+            md += self._build_pairs_markdown(screening_result["groups"][group_key])
+            md += "\n"
+        return md
+
+    def _build_pairs_markdown(self, pairs: Optional[List[Tuple[str, str, float]]]) -> str:
+        """构建变量对排名的Markdown"""
+        if pairs is None:
+            return "数据不足\n"
+        if not pairs:
+            return "无满足条件的变量对\n"
+
+        md = "| 排名 | 变量1 | 变量2 | 相关性 |\n|---|---|---|---|\n"
+        for rank, (var1, var2, value) in enumerate(pairs, start=1):
+            md += f"| {rank} | {var1} | {var2} | {value:.3f} |\n"
+        return md
+
     def _generate_simple_matrix_table(self, 
-                                    matrix: Dict[Tuple[str, str], Union[float, None]], 
+                                    cells: np.ndarray, 
                                     variables: List[str],
-                                    method: str) -> str:
-        """生成简单相关性矩阵表格（无分组）"""
+                                    method: str,
+                                    counts: Optional[np.ndarray] = None) -> str:
+        """生成简单相关性矩阵表格（无分组），cells/counts 为格式化后的 k×k 字符串数组"""
         title = f"相关性矩阵 (方法: {method})\n\n"
+        if counts is not None:
+            # 样本数表置于相关性矩阵之前，保持矩阵表格为最后一个表格
+            title += self._generate_sample_size_table(counts, variables)
         
-        md = "| 变量 |"
-        for var in variables:
-            md += f" {var} |"
-        md += "\n|"
-        for _ in range(len(variables) + 1):
-            md += "---|"
-        md += "\n"
-        
-        for row_var in variables:
-            md += f"| {row_var} |"
-            for col_var in variables:
-                value = matrix.get((row_var, col_var), None)
-                formatted_value = self._format_matrix_value(value)
-                md += f" {formatted_value} |"
-            md += "\n"
-        
-        return title + md
+        return title + self._build_matrix_markdown("变量", cells, variables)
     
     def _generate_grouped_matrix_table(self, 
-                                     groups: Dict[str, Dict[Tuple[str, str], Union[float, None]]], 
+                                     cells: np.ndarray, 
+                                     counts: Optional[np.ndarray],
+                                     groups: List[str],
                                      variables: List[str],
                                      method: str) -> str:
         """生成分组相关性矩阵表格"""
-        title = f"分组相关性矩阵 (方法: {method})\n\n"
+        parts = [f"分组相关性矩阵 (方法: {method})\n\n"]
         
-        md = title
-        
-        sorted_group_keys = sorted(groups.keys())
+        for i in sorted(range(len(groups)), key=groups.__getitem__):
+            parts.append(f"**{groups[i]}**\n\n")
+            if counts is not None:
+                parts.append(self._generate_sample_size_table(counts[i], variables))
+            parts.append(self._build_matrix_markdown("变量", cells[i], variables))
+            parts.append("\n")
         
-        for group_key in sorted_group_keys:
-            matrix = groups[group_key]
-            
-            md += f"**{group_key}**\n\n"
-            
-            md += "| 变量 |"
-            for var in variables:
-                md += f" {var} |"
-            md += "\n|"
-            for _ in range(len(variables) + 1):
-                md += "---|"
-            md += "\n"
-            
-            for row_var in variables:
-                md += f"| {row_var} |"
-                for col_var in variables:
-                    value = matrix.get((row_var, col_var), None)
-                    formatted_value = self._format_matrix_value(value)
-                    md += f" {formatted_value} |"
-                md += "\n"
-            
-            md += "\n"
-        
-        return md
+        return "".join(parts)
     
-    def _format_matrix_value(self, value: Union[float, None, int]) -> str:
-        """格式化矩阵中的相关性值"""
-        if value is None:
-            return "数据不足"
-        elif value == self.config.data_insufficient_flag:
-            return "数据不足"
-        elif isinstance(value, float):
-            if value == 1.0:
-                return "1.000"
-            else:
-                return f"{value:.3f}"
-        else:
-            return str(value)
+    def _generate_sample_size_table(self, 
+                                    counts: np.ndarray, 
+                                    variables: List[str]) -> str:
+        """生成成对删除下各变量对的有效样本数表格"""
+        return "有效样本数 (成对删除)\n\n" + self._build_matrix_markdown("样本数", counts, variables) + "\n"
+    
+    def _build_matrix_markdown(self, corner: str, cells: np.ndarray, variables: List[str]) -> str:
+        """由 k×k 字符串数组构建以变量为行列的Markdown表格"""
+        lines = [f"| {corner} |" + "".join(f" {var} |" for var in variables),
+                 "|" + "---|" * (len(variables) + 1)]
+        for var, row in zip(variables, cells.tolist()):
+            lines.append(f"| {var} | " + " | ".join(row) + " |")
+        return "\n".join(lines) + "\n"
     
     def _generate_simple_table(self, result: Dict, var1: str, var2: str) -> str:
         """生成简单表格"""
@@ -917,6 +1410,10 @@ class CorrelationManager:
         self.config = config or CorrelationConfig()
         self.logger = create_logger(app_name="corr", log_dir="./logs").get_logger()
         
+        self.executor = get_analysis_executor(self.config, self.logger)
+        self.incremental_store = get_incremental_store(self.logger)
+        self.cube_store = get_cube_store(self.logger)
+        self.result_cache = get_result_cache(self.logger)
         self.data_loader = DataLoader(self.config, self.logger)
         self.column_mapper = ColumnMapper(self.config, self.logger)
         self.derived_field_generator = DerivedFieldGenerator(self.config, self.logger)
@@ -925,153 +1422,588 @@ class CorrelationManager:
     
     async def analyze_correlation(self,
                                 read_data_param: ReadDataParam,
-                                filters: Optional[Dict[str, str]] = None,
+                                filters: Optional[Dict[str, Any]] = None,
                                 group_by: Optional[List[str]] = None,
                                 correlation_vars: Optional[List[str]] = None,
-                                correlation_method: CorrelationMethod = CorrelationMethod.PEARSON) -> str:
-        """主要分析流程，支持两变量和多变量相关性分析"""
+                                correlation_method: CorrelationMethod = CorrelationMethod.PEARSON,
+                                top_k: Optional[int] = None,
+                                min_abs_correlation: Optional[float] = None,
+                                missing_strategy: MissingValueStrategy = MissingValueStrategy.LISTWISE) -> str:
+        """相关性分析并渲染为Markdown表格，参数同 analyze_correlation_result"""
+        result = await self.analyze_correlation_result(
+            read_data_param, filters, group_by, correlation_vars, correlation_method,
+            top_k, min_abs_correlation, missing_strategy
+        )
+        return await self.executor.run("render", self.table_generator.render, result)
+    
+    async def analyze_correlation_result(self,
+                                         read_data_param: ReadDataParam,
+                                         filters: Optional[Dict[str, Any]] = None,
+                                         group_by: Optional[List[str]] = None,
+                                         correlation_vars: Optional[List[str]] = None,
+                                         correlation_method: CorrelationMethod = CorrelationMethod.PEARSON,
+                                         top_k: Optional[int] = None,
+                                         min_abs_correlation: Optional[float] = None,
+                                         missing_strategy: MissingValueStrategy = MissingValueStrategy.LISTWISE) -> CorrelationResult:
+        """主要分析流程，支持两变量和多变量相关性分析，以及全变量对筛选，返回结构化结果"""
         try:
-            self._validate_inputs(correlation_vars)
+            screening = top_k is not None or min_abs_correlation is not None
+            self._validate_inputs(correlation_vars, top_k, min_abs_correlation)
             
-            self.logger.info("开始加载数据...")
-            df = await self.data_loader.load_data(
-                read_data_param.read_data_method, 
+            self.logger.info("读取数据表头...")
+            columns = await self.data_loader.load_columns(
+                read_data_param.read_data_method,
                 read_data_param.read_data_query
             )
             
             self.logger.info("开始列名映射...")
-            column_map = await self._get_all_column_mappings(df, filters, group_by, correlation_vars)
-            
-            self.logger.info("开始生成派生字段...")
-            df = await self.derived_field_generator.generate_required_fields(
-                df, column_map, self.column_mapper
+            column_map, derived_fields = await self._resolve_columns(columns, filters, group_by, correlation_vars)
+            correlation_vars_mapped, group_by_mapped = self._map_analysis_columns(
+                correlation_vars, group_by, column_map
             )
             
-            self.logger.info("应用过滤条件...")
-            df_filtered = self._apply_filters(df, filters, column_map)
+            cache_key = self._result_cache_key(
+                read_data_param, column_map, filters, correlation_vars_mapped, group_by_mapped,
+                correlation_method, top_k, min_abs_correlation, missing_strategy
+            )
+            if cache_key is not None:
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    self.logger.info("相关性分析完成（命中结果缓存）")
+                    return CorrelationResult.from_dict(cached)
             
-            print(f'当前df为\n{df}')
+            result = await self._run_analysis(
+                read_data_param, columns, column_map, derived_fields, filters, correlation_vars, correlation_vars_mapped,
+                group_by_mapped, correlation_method, screening, top_k, min_abs_correlation, missing_strategy
+            )
+            if cache_key is not None:
+                self.result_cache.put(cache_key, result.to_dict())
+            return result
             
-            # 修复映射逻辑，确保处理None值
-            correlation_vars_mapped = []
-            for v in correlation_vars:
-                mapped_val = column_map.get(v)
+        except Exception as e:
+            self.logger.error(f"相关性分析失败: {e}")
+            raise
+    
+    def _result_cache_key(self,
+                          read_data_param: ReadDataParam,
+                          column_map: Dict[str, Optional[str]],
+                          filters: Optional[Dict[str, Any]],
+                          correlation_vars_mapped: List[str],
+                          group_by_mapped: List[str],
+                          correlation_method: CorrelationMethod,
+                          top_k: Optional[int],
+                          min_abs_correlation: Optional[float],
+                          missing_strategy: MissingValueStrategy) -> Optional[str]:
+        """结果缓存键；只有文件数据源能以指纹识别数据变化，其余数据源不缓存"""
+        if read_data_param.read_data_method != "PANDAS":
+            return None
+        try:
+            dataset_key = self.data_loader.dataset_cache.make_key(Path(read_data_param.read_data_query))
+        except OSError:
+            return None
+        return self.result_cache.make_key(
+            dataset=dataset_key,
+            column_map=column_map,
+            filters=filters or {},
+            variables=correlation_vars_mapped,
+            group_by=group_by_mapped,
+            method=correlation_method.value,
+            top_k=top_k,
+            min_abs_correlation=min_abs_correlation,
+            missing_strategy=missing_strategy.value,
+            min_sample_size=self.config.min_sample_size,
+            precision=self.config.correlation_precision,
+            output="structured",
+        )
+    
+    async def _run_analysis(self,
+                            read_data_param: ReadDataParam,
+                            columns: List[str],
+                            column_map: Dict[str, Optional[str]],
+                            derived_fields: Dict[str, List[str]],
+                            filters: Optional[Dict[str, Any]],
+                            correlation_vars: Optional[List[str]],
+                            correlation_vars_mapped: List[str],
+                            group_by_mapped: List[str],
+                            correlation_method: CorrelationMethod,
+                            screening: bool,
+                            top_k: Optional[int],
+                            min_abs_correlation: Optional[float],
+                            missing_strategy: MissingValueStrategy) -> CorrelationResult:
+        """列名映射之后的分析流程：依次尝试立方体、增量统计、流式计算，最后加载数据计算"""
+        if not screening and correlation_method == CorrelationMethod.PEARSON:
+            result = await self._answer_from_cube(
+                read_data_param, filters, column_map, correlation_vars_mapped, group_by_mapped, missing_strategy
+            )
+            if result is not None:
+                self.logger.info("相关性分析完成（由立方体汇总）")
+                return result
+        
+        # 未指定变量的筛选模式需要全部数值列，其余情况只加载映射到的列及派生字段依赖列
+        required_columns = None
+        if not (screening and not correlation_vars):
+            required_columns = self._required_source_columns(columns, column_map, derived_fields)
+        
+        # 作用在源列上的过滤条件在读取时应用，派生字段上的条件在生成后再过滤
+        source_filters = {
+            column_map[k]: v for k, v in (filters or {}).items() if column_map.get(k) in columns
+        }
+        
+        if self._use_incremental(read_data_param, correlation_method, screening, missing_strategy):
+            self.logger.info("使用增量统计量计算（只读取上次分析后追加的数据）...")
+            result = await self.executor.run(
+                "incremental", self._compute_incremental,
+                read_data_param.read_data_query, required_columns, column_map, derived_fields,
+                filters, correlation_vars_mapped, group_by_mapped
+            )
+            self.logger.info("相关性分析完成")
+            return result
+        
+        if self.data_loader.exceeds_size_limit(read_data_param.read_data_method, read_data_param.read_data_query):
+            self._validate_streaming(correlation_method, screening, missing_strategy)
+            self.logger.info("文件超过大小限制，使用流式分块计算...")
+            result = await self.executor.run(
+                "stream", self._compute_streaming,
+                read_data_param.read_data_query, required_columns, column_map, derived_fields,
+                filters, correlation_vars_mapped, group_by_mapped
+            )
+            self.logger.info("相关性分析完成")
+            return result
+        
+        # 只有大文件未缓存时源列过滤条件才下推到读取器；否则读取完整数据（缓存命中时不复制），
+        # 派生列与列索引可按数据集版本复用，全部过滤条件合并为一个行掩码
+        load_filters = source_filters
+        dataset_key = None
+        if read_data_param.read_data_method == "PANDAS":
+            file_path = Path(read_data_param.read_data_query)
+            if not source_filters or not self.data_loader.dataset_cache.pushes_down(file_path, required_columns):
+                load_filters = {}
+                dataset_key = self.data_loader.dataset_cache.make_key(file_path)
+        
+        self.logger.info("开始加载数据...")
+        df = await self.data_loader.load_data(
+            read_data_param.read_data_method, 
+            read_data_param.read_data_query,
+            columns=required_columns,
+            filters=load_filters or None
+        )
+        
+        self.logger.info("开始生成派生字段...")
+        df = await self.derived_field_generator.generate_required_fields(df, derived_fields, dataset_key)
+        
+        compiled_filters = self._compile_filters(filters, column_map)
+        indexes = await self.executor.run(
+            "index", self._column_indexes,
+            df, dataset_key, [*(compiled_filters.columns if compiled_filters else []), *group_by_mapped],
+            derived_fields
+        )
+        
+        # 过滤条件只合并为行掩码，与缺失值条件一起在计算前一次性取行
+        self.logger.info("应用过滤条件...")
+        row_mask = await self.executor.run("filter", self._filter_mask, df, compiled_filters, indexes)
+        df = self._with_indexed_groups(df, group_by_mapped, correlation_vars_mapped, indexes)
+        
+        print(f'当前df为\n{df}')
+        
+        result = await self.executor.run(
+            "compute", self._compute_result,
+            df, row_mask, correlation_vars_mapped, group_by_mapped, correlation_method,
+            screening, top_k, min_abs_correlation, missing_strategy
+        )
+        
+        self.logger.info("相关性分析完成")
+        return result
+    
+    async def register_dataset(self,
+                               read_data_param: ReadDataParam,
+                               dimensions: Optional[List[str]] = None) -> Dict[str, Any]:
+        """注册数据集：按分类维度物化全部数值变量对的单元统计量（相关性立方体）"""
+        if read_data_param.read_data_method != "PANDAS":
+            raise ValueError("仅支持为文件数据源注册立方体")
+        dimensions = dimensions or self.config.cube_dimensions
+        
+        columns = await self.data_loader.load_columns(
+            read_data_param.read_data_method,
+            read_data_param.read_data_query
+        )
+        # 数据中无法得到的维度（如没有风向列）直接跳过
+        column_map, derived_fields = await self._resolve_columns(columns, None, dimensions, None, strict=False)
+        dimensions_mapped = []
+        for dim in dimensions:
+            if not column_map.get(dim):
+                self.logger.warning(f"立方体维度 {dim} 无法映射到数据列，已跳过")
+                continue
+            dimensions_mapped.append(column_map[dim])
+        if not dimensions_mapped:
+            raise ValueError(f"没有可用的立方体维度: {dimensions}")
+        
+        dataset_key = self.data_loader.dataset_cache.make_key(Path(read_data_param.read_data_query))
+        df = await self.data_loader.load_data(read_data_param.read_data_method, read_data_param.read_data_query)
+        df = await self.derived_field_generator.generate_required_fields(df, derived_fields, dataset_key)
+        variables = self._detect_numeric_columns(df, exclude=dimensions_mapped)
+        
+        self.logger.info(f"开始物化相关性立方体: 维度 {dimensions_mapped}, {len(variables)}个数值变量")
+        cube = await self.executor.run("cube", build_correlation_cube, df, dimensions_mapped, variables, dataset_key)
+        self.cube_store.register(cube)
+        return {
+            "dataset": dataset_key[0],
+            "dimensions": cube.dimensions,
+            "variables": cube.variables,
+            "cells": len(cube.cells),
+            "rows": cube.n_rows,
+        }
+    
+    async def _answer_from_cube(self,
+                                read_data_param: ReadDataParam,
+                                filters: Optional[Dict[str, Any]],
+                                column_map: Dict[str, Optional[str]],
+                                correlation_vars_mapped: List[str],
+                                group_by_mapped: List[str],
+                                missing_strategy: MissingValueStrategy) -> Optional[CorrelationResult]:
+        """分组与过滤均落在已注册立方体的维度上时，由单元统计量汇总得到结果；无法回答时返回None"""
+        if read_data_param.read_data_method != "PANDAS":
+            return None
+        cube = self.cube_store.get(read_data_param.read_data_query)
+        if cube is None:
+            return None
+        
+        mapped_filters = {column_map.get(k): v for k, v in (filters or {}).items()}
+        if None in mapped_filters or not cube.covers(correlation_vars_mapped, group_by_mapped, mapped_filters):
+            self.cube_store.record(hit=False)
+            return None
+        
+        result = await self.executor.run(
+            "cube", self.correlation_calculator.calculate_cube_correlation,
+            cube, correlation_vars_mapped, group_by_mapped, mapped_filters, missing_strategy
+        )
+        self.cube_store.record(hit=result is not None)
+        if result is None:
+            self.logger.info("所选变量存在缺失值，整行删除无法由立方体汇总，改为读取数据计算")
+            return None
+        return self._comoment_result(result, correlation_vars_mapped, group_by_mapped)
+    
+    def _map_analysis_columns(self,
+                              correlation_vars: Optional[List[str]],
+                              group_by: Optional[List[str]],
+                              column_map: Dict[str, Optional[str]]) -> Tuple[List[str], List[str]]:
+        """将相关性变量与分组变量映射为数据列名"""
+        # 修复映射逻辑，确保处理None值
+        correlation_vars_mapped = []
+        for v in correlation_vars or []:
+            mapped_val = column_map.get(v)
+            if mapped_val is None:
+                raise ValueError(f"无法找到相关性变量的映射: {v}")
+            correlation_vars_mapped.append(mapped_val)
+        
+        group_by_mapped = []
+        if group_by:
+            for g in group_by:
+                mapped_val = column_map.get(g)
                 if mapped_val is None:
-                    raise ValueError(f"无法找到相关性变量的映射: {v}")
-                correlation_vars_mapped.append(mapped_val)
+                    raise ValueError(f"无法找到分组变量的映射: {g}")
+                group_by_mapped.append(mapped_val)
+        
+        return correlation_vars_mapped, group_by_mapped
+    
+    def _validate_streaming(self,
+                            correlation_method: CorrelationMethod,
+                            screening: bool,
+                            missing_strategy: MissingValueStrategy) -> None:
+        """流式计算只支持基于可合并统计量的Pearson整行删除分析"""
+        limit = f"文件超过{self.config.max_file_size_mb}MB，只能使用流式计算"
+        if correlation_method != CorrelationMethod.PEARSON:
+            raise ValueError(f"{limit}，仅支持pearson方法")
+        if screening:
+            raise ValueError(f"{limit}，不支持top_k/min_abs_correlation筛选模式")
+        if missing_strategy != MissingValueStrategy.LISTWISE:
+            raise ValueError(f"{limit}，仅支持listwise缺失值处理")
+    
+    def _compute_streaming(self,
+                           file_path: str,
+                           required_columns: Optional[List[str]],
+                           column_map: Dict[str, Optional[str]],
+                           derived_fields: Dict[str, List[str]],
+                           filters: Optional[Dict[str, Any]],
+                           correlation_vars_mapped: List[str],
+                           group_by_mapped: List[str]) -> CorrelationResult:
+        """流式读取、派生、过滤并累加统计量，最后生成结构化结果"""
+        read_dtypes, filter_dtypes = self._stream_dtypes(file_path, column_map, filters, group_by_mapped)
+        chunks = self.data_loader.iter_chunks(file_path, required_columns, read_dtypes)
+        result = self.correlation_calculator.calculate_streaming_correlation(
+            self._prepare_chunks(chunks, column_map, derived_fields, filters, filter_dtypes),
+            correlation_vars_mapped, group_by_mapped
+        )
+        return self._comoment_result(result, correlation_vars_mapped, group_by_mapped)
+    
+    def _use_incremental(self,
+                         read_data_param: ReadDataParam,
+                         correlation_method: CorrelationMethod,
+                         screening: bool,
+                         missing_strategy: MissingValueStrategy) -> bool:
+        """显式开启且文件足够大时使用；可合并统计量只覆盖Pearson整行删除分析，且需要能按位置续读的文件类型"""
+        if not self.config.incremental_enabled or read_data_param.read_data_method != "PANDAS":
+            return False
+        file_path_obj = Path(read_data_param.read_data_query).resolve()
+        return (self.incremental_store.applies_to(read_data_param.read_data_query)
+                and file_path_obj.is_file()
+                and file_path_obj.stat().st_size >= self.config.incremental_min_file_mb * 1024 * 1024
+                and correlation_method == CorrelationMethod.PEARSON
+                and missing_strategy == MissingValueStrategy.LISTWISE
+                and not screening)
+    
+    def _compute_incremental(self,
+                             file_path: str,
+                             required_columns: Optional[List[str]],
+                             column_map: Dict[str, Optional[str]],
+                             derived_fields: Dict[str, List[str]],
+                             filters: Optional[Dict[str, Any]],
+                             correlation_vars_mapped: List[str],
+                             group_by_mapped: List[str]) -> CorrelationResult:
+        """在持久化的统计量上只累加新追加的数据，文件未变化时无需读取数据"""
+        mapped_filters = {column_map.get(k) or k: v for k, v in (filters or {}).items()}
+        key = self.incremental_store.make_key(
+            file_path, required_columns, correlation_vars_mapped, group_by_mapped, mapped_filters, derived_fields
+        )
+        state = self.incremental_store.load(key)
+        read_dtypes, filter_dtypes = self._stream_dtypes(file_path, column_map, filters, group_by_mapped)
+        reader = self.data_loader.open_appended(file_path, required_columns, state, read_dtypes)
+        
+        accumulator = self.correlation_calculator.accumulate_chunks(
+            self._prepare_chunks(reader, column_map, derived_fields, filters, filter_dtypes),
+            correlation_vars_mapped, group_by_mapped,
+            accumulator=state.accumulator if reader.resumed else None
+        )
+        self.incremental_store.commit(key, reader, accumulator)
+        
+        result = self.correlation_calculator.comoment_result(accumulator, correlation_vars_mapped, group_by_mapped)
+        return self._comoment_result(result, correlation_vars_mapped, group_by_mapped)
+    
+    def _prepare_chunks(self,
+                        chunks: Iterable[pd.DataFrame],
+                        column_map: Dict[str, Optional[str]],
+                        derived_fields: Dict[str, List[str]],
+                        filters: Optional[Dict[str, Any]],
+                        filter_dtypes: Optional[Dict[str, str]] = None) -> Iterator[pd.DataFrame]:
+        """对每个数据块生成派生字段并应用过滤条件，filter_dtypes 为整个读取过程中固定的过滤列类型"""
+        compiled = self._compile_filters(filters, column_map)
+        for chunk in chunks:
+            chunk = self.derived_field_generator.apply_fields(chunk, derived_fields)
+            mask = self._filter_mask(with_fixed_dtypes(chunk, filter_dtypes or {}), compiled)
+            yield chunk if mask is None else chunk[mask]
+    
+    def _stream_dtypes(self,
+                       file_path: str,
+                       column_map: Dict[str, Optional[str]],
+                       filters: Optional[Dict[str, Any]],
+                       group_by_mapped: List[str]) -> Tuple[Optional[Dict[str, str]], Dict[str, str]]:
+        """
+        按块读取CSV时固定列类型，避免各块分别推断出不同类型（如分组键 62 与 "62" 成为两个分组）：
+        源分组列按文本读取，过滤列的类型由文件开头一块数据确定（见 csv_filter_dtypes）。
+        返回 (传给 read_csv 的 dtype, 过滤列类型)
+        """
+        file_path_obj = Path(file_path).resolve()
+        if file_path_obj.suffix.lower() != '.csv':
+            return None, {}
+        header = set(read_dataset_columns(file_path_obj))
+        filter_columns = [column_map.get(col) or col for col in (filters or {})]
+        filter_dtypes = csv_filter_dtypes(file_path_obj, filter_columns, self.config.streaming_chunk_rows)
+        read_dtypes = csv_read_dtypes(filter_dtypes) or {}
+        read_dtypes.update({col: "str" for col in group_by_mapped if col in header})
+        return read_dtypes or None, filter_dtypes
+    
+    def _comoment_result(self,
+                         result: Dict[str, Any],
+                         correlation_vars_mapped: List[str],
+                         group_by_mapped: List[str]) -> CorrelationResult:
+        """基于统计量的计算结果生成结构化结果（仅Pearson）"""
+        if len(correlation_vars_mapped) == 2:
+            var1, var2 = correlation_vars_mapped
+            return from_pair_result(result, var1, var2, group_by_mapped, CorrelationMethod.PEARSON.value,
+                                    self.config.data_insufficient_flag)
+        return from_matrix_result(result, group_by_mapped)
+    
+    def _compute_result(self,
+                        df: pd.DataFrame,
+                        row_mask: Optional[np.ndarray],
+                        correlation_vars_mapped: List[str],
+                        group_by_mapped: List[str],
+                        correlation_method: CorrelationMethod,
+                        screening: bool,
+                        top_k: Optional[int],
+                        min_abs_correlation: Optional[float],
+                        missing_strategy: MissingValueStrategy) -> CorrelationResult:
+        """计算相关性并生成结构化结果（同步执行，由执行层调度到工作线程），row_mask 为过滤条件合并后的行掩码"""
+        if screening and not correlation_vars_mapped:
+            correlation_vars_mapped = self._detect_numeric_columns(df, exclude=group_by_mapped, row_mask=row_mask)
+            self.logger.info(f"未指定相关性变量，筛选全部{len(correlation_vars_mapped)}个数值列")
+        
+        # 验证所有映射的列都存在于数据框中
+        all_required_cols = correlation_vars_mapped + group_by_mapped
+        missing_cols = [col for col in all_required_cols if col not in df.columns]
+        if missing_cols:
+            raise ValueError(f"以下列在数据中不存在: {missing_cols}")
+        
+        if screening:
+            self.logger.info(f"开始筛选{len(correlation_vars_mapped)}个变量的全部变量对...")
             
-            group_by_mapped = []
-            if group_by:
-                for g in group_by:
-                    mapped_val = column_map.get(g)
-                    if mapped_val is None:
-                        raise ValueError(f"无法找到分组变量的映射: {g}")
-                    group_by_mapped.append(mapped_val)
+            screening_result = self.correlation_calculator.calculate_top_correlations(
+                df, correlation_vars_mapped, group_by_mapped, correlation_method,
+                top_k=top_k, min_abs_correlation=min_abs_correlation, missing_strategy=missing_strategy,
+                row_mask=row_mask
+            )
             
-            # 验证所有映射的列都存在于数据框中
-            all_required_cols = correlation_vars_mapped + group_by_mapped
-            missing_cols = [col for col in all_required_cols if col not in df_filtered.columns]
-            if missing_cols:
-                raise ValueError(f"以下列在数据中不存在: {missing_cols}")
+            return from_top_pairs_result(screening_result, group_by_mapped)
+        elif len(correlation_vars_mapped) == 2:
+            self.logger.info("开始计算两变量相关性...")
+            var1, var2 = correlation_vars_mapped
             
-            if len(correlation_vars_mapped) == 2:
-                self.logger.info("开始计算两变量相关性...")
-                var1, var2 = correlation_vars_mapped
-                
-                correlation_result = self.correlation_calculator.calculate_correlation(
-                    df_filtered, var1, var2, group_by_mapped, correlation_method
-                )
-                
-                result_table = self.table_generator.generate_correlation_table(
-                    correlation_result, group_by_mapped, var1, var2
-                )
-            else:
-                self.logger.info(f"开始计算{len(correlation_vars_mapped)}变量相关性矩阵...")
-                
-                matrix_result = self.correlation_calculator.calculate_correlation_matrix(
-                    df_filtered, correlation_vars_mapped, group_by_mapped, correlation_method
-                )
-                
-                result_table = self.table_generator.generate_correlation_matrix_table(matrix_result)
+            correlation_result = self.correlation_calculator.calculate_correlation(
+                df, var1, var2, group_by_mapped, correlation_method, row_mask=row_mask
+            )
             
-            self.logger.info("相关性分析完成")
-            return result_table
+            return from_pair_result(correlation_result, var1, var2, group_by_mapped, correlation_method.value,
+                                    self.config.data_insufficient_flag)
+        else:
+            self.logger.info(f"开始计算{len(correlation_vars_mapped)}变量相关性矩阵...")
             
-        except Exception as e:
-            self.logger.error(f"相关性分析失败: {e}")
-            raise
+            matrix_result = self.correlation_calculator.calculate_correlation_matrix(
+                df, correlation_vars_mapped, group_by_mapped, correlation_method, missing_strategy, row_mask=row_mask
+            )
+            
+            return from_matrix_result(matrix_result, group_by_mapped)
     
-    def _validate_inputs(self, correlation_vars: Optional[List[str]]) -> None:
+    def _validate_inputs(self,
+                         correlation_vars: Optional[List[str]],
+                         top_k: Optional[int] = None,
+                         min_abs_correlation: Optional[float] = None) -> None:
         """输入验证"""
-        if not correlation_vars or len(correlation_vars) < 2:
-            raise ValueError("correlation_vars必须包含至少两个变量")
-        if len(correlation_vars) > 10:
-            raise ValueError("相关性变量过多，最多支持10个变量")
+        screening = top_k is not None or min_abs_correlation is not None
+        if top_k is not None and top_k < 1:
+            raise ValueError("top_k必须为正整数")
+        if min_abs_correlation is not None and not 0 <= min_abs_correlation <= 1:
+            raise ValueError("min_abs_correlation必须在0到1之间")
+        
+        if screening:
+            # 筛选模式不限制变量数量，未指定变量时筛选全部数值列
+            if correlation_vars and len(correlation_vars) < 2:
+                raise ValueError("correlation_vars必须包含至少两个变量")
+        else:
+            if not correlation_vars or len(correlation_vars) < 2:
+                raise ValueError("correlation_vars必须包含至少两个变量")
+            if len(correlation_vars) > self.config.max_correlation_vars:
+                raise ValueError(f"相关性变量过多，最多支持{self.config.max_correlation_vars}个变量，"
+                                 f"更多变量请使用 top_k 或 min_abs_correlation 进行全变量对筛选")
         
-        if len(set(correlation_vars)) != len(correlation_vars):
+        if correlation_vars and len(set(correlation_vars)) != len(correlation_vars):
             raise ValueError("correlation_vars中不能包含重复的变量名")
     
-    async def _get_all_column_mappings(self, 
-                                     df: pd.DataFrame,
-                                     filters: Optional[Dict[str, str]],
-                                     group_by: Optional[List[str]],
-                                     correlation_vars: List[str]) -> Dict[str, Optional[str]]:
-        """获取所有需要的列名映射"""
-        all_user_keys = set()
-        if filters:
-            all_user_keys.update(filters.keys())
-        if group_by:
-            all_user_keys.update(group_by)
-        if correlation_vars:
-            all_user_keys.update(correlation_vars)
+    def _detect_numeric_columns(self,
+                                df: pd.DataFrame,
+                                exclude: List[str],
+                                row_mask: Optional[np.ndarray] = None) -> List[str]:
+        """识别可参与相关性计算的数值列（含大部分可转换为数值的文本列），文本列只按掩码内的行判断"""
+        numeric_cols = []
+        for col in df.columns:
+            if col in exclude or pd.api.types.is_datetime64_any_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+                continue
+            if pd.api.types.is_numeric_dtype(df[col]):
+                numeric_cols.append(col)
+                continue
+            values = df[col] if row_mask is None else df[col][row_mask]
+            if pd.to_numeric(values, errors='coerce').notna().mean() >= 0.5:
+                numeric_cols.append(col)
         
-        column_map = await self.column_mapper.get_column_mapping(
-            tuple(df.columns), tuple(all_user_keys)
+        if len(numeric_cols) < 2:
+            raise ValueError(f"可用于相关性筛选的数值列不足两个: {numeric_cols}")
+        return numeric_cols
+    
+    def _required_source_columns(self,
+                                 columns: List[str],
+                                 column_map: Dict[str, Optional[str]],
+                                 derived_fields: Dict[str, List[str]]) -> List[str]:
+        """计算需要从数据源读取的列（保持源文件中的列顺序）"""
+        needed = {v for v in column_map.values() if v}
+        for deps in derived_fields.values():
+            needed.update(deps)
+        
+        required = [col for col in columns if col in needed]
+        self.logger.info(f"列裁剪: 共{len(columns)}列，只加载{len(required)}列 {required}")
+        return required
+    
+    async def _resolve_columns(self,
+                               columns: List[str],
+                               filters: Optional[Dict[str, Any]],
+                               group_by: Optional[List[str]],
+                               correlation_vars: Optional[List[str]],
+                               strict: bool = True) -> Tuple[Dict[str, Optional[str]], Dict[str, List[str]]]:
+        """一次解析全部意图列的映射及所需派生字段的依赖，返回 (列名映射, 派生字段依赖)"""
+        all_user_keys = list(dict.fromkeys([*(filters or {}), *(group_by or []), *(correlation_vars or [])]))
+        return await self.column_mapper.resolve(
+            columns, all_user_keys, self.derived_field_generator.derived_fields, strict=strict
         )
-        
-        # 处理派生字段映射
-        derived_user_keys = [k for k, v in column_map.items() if v is None]
-        if derived_user_keys:
-            self.logger.info(f"需要处理的派生字段: {derived_user_keys}")
-            derived_mapped = await self.column_mapper.get_column_mapping(
-                tuple(self.derived_field_generator.derived_fields.keys()),
-                tuple(derived_user_keys)
-            )
-            
-            # 正确更新column_map
-            for user_key, derived_field in derived_mapped.items():
-                if derived_field:
-                    column_map[user_key] = derived_field
-                    self.logger.info(f"派生字段映射: {user_key} -> {derived_field}")
-        
-        self.logger.info(f"最终列名映射: {column_map}")
-        return column_map
-    
-    def _apply_filters(self, 
-                      df: pd.DataFrame, 
-                      filters: Optional[Dict[str, str]], 
-                      column_map: Dict[str, Optional[str]]) -> pd.DataFrame:
-        """应用过滤条件"""
+    
+    def _compile_filters(self,
+                         filters: Optional[Dict[str, Any]],
+                         column_map: Dict[str, Optional[str]]) -> Optional[CompiledFilter]:
+        """把用户过滤列映射到数据列并解析过滤条件（只解析一次），没有条件时返回None"""
         if not filters:
-            return df
-        
-        df_filtered = df.copy()
+            return None
         
-        for user_col, filter_value in filters.items():
+        mapped_filters = {}
+        for user_col, condition in filters.items():
             mapped_col = column_map.get(user_col)
             if not mapped_col:
                 raise ValueError(f"无法找到过滤列: {user_col}")
-            
-            if mapped_col not in df_filtered.columns:
-                raise ValueError(f"过滤列不存在于数据中: {mapped_col}")
-            
-            try:
-                df_filtered = df_filtered[df_filtered[mapped_col] == filter_value]
-                self.logger.debug(f"应用过滤条件 {mapped_col}={filter_value}，剩余 {len(df_filtered)} 行")
-            except Exception as e:
-                raise ValueError(f"应用过滤条件失败 {mapped_col}={filter_value}: {str(e)}") from e
+            mapped_filters[mapped_col] = condition
+        return compile_filters(mapped_filters)
+    
+    def _filter_mask(self, 
+                     df: pd.DataFrame, 
+                     compiled: Optional[CompiledFilter],
+                     indexes: Optional[Dict[str, ColumnIndex]] = None) -> Optional[np.ndarray]:
+        """对已解析的过滤条件求值得到一个布尔行掩码（不复制数据），没有条件时返回None"""
+        if compiled is None:
+            return None
         
-        return df_filtered
+        try:
+            mask = compiled.mask(df, indexes)
+        except Exception as e:
+            raise ValueError(f"应用过滤条件失败 {compiled.columns}: {str(e)}") from e
+        
+        self.logger.debug(f"应用过滤条件 {compiled.columns}，剩余 {int(mask.sum())} 行")
+        return mask
+    
+    def _column_indexes(self,
+                        df: pd.DataFrame,
+                        dataset_key: Optional[DatasetKey],
+                        columns: List[str],
+                        derived_fields: Dict[str, List[str]]) -> Dict[str, ColumnIndex]:
+        """过滤列与分组列的列索引，挂在缓存的数据集上跨请求复用；只有完整数据集（与缓存行对齐）才使用"""
+        if dataset_key is None:
+            return {}
+        
+        indexes = {}
+        for col in dict.fromkeys(columns):
+            if col not in df.columns:
+                continue
+            index = self.data_loader.dataset_cache.column_index(
+                dataset_key, index_key(col, derived_fields.get(col)), df[col]
+            )
+            if index is not None:
+                indexes[col] = index
+        return indexes
+    
+    def _with_indexed_groups(self,
+                             df: pd.DataFrame,
+                             group_by: List[str],
+                             variables: List[str],
+                             indexes: Dict[str, ColumnIndex]) -> pd.DataFrame:
+        """用列索引的编码构造分组列（分类类型），分组时不再对原始值哈希"""
+        replaced = {
+            col: indexes[col].categorical(df.index) for col in group_by
+            if col in indexes and col not in variables and not isinstance(df[col].dtype, pd.CategoricalDtype)
+        }
+        return df.assign(**replaced) if replaced else df
 
 logger = create_logger(app_name="corr", log_dir="./logs").get_logger()
 mcp = FastMCP('CorrelationServer')
@@ -1079,10 +2011,14 @@ mcp = FastMCP('CorrelationServer')
 @mcp.tool()
 async def correlation_analysis(
     read_data_param: ReadDataParam,
-    filters: Optional[Dict[str, str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
     group_by: Optional[List[str]] = None,
     correlation_vars: Optional[List[str]] = None,
     correlation_method: str = "pearson",
+    top_k: Optional[int] = None,
+    min_abs_correlation: Optional[float] = None,
+    missing_strategy: str = "listwise",
+    output_format: str = "markdown",
     # min_sample_size: int = 15,
     # max_file_size_mb: int = 100
 ) -> str:
@@ -1090,37 +2026,134 @@ async def correlation_analysis(
     相关性分析工具，支持两变量和多变量相关性分析，可按条件过滤数据、按指定列进行分组，分别计算每组的相关性。请严格传入用户描述的变量名称，不要简化与转换。
     
     :param read_data_param: 数据读取参数
-    :param filters: 过滤条件，格式：{列名: 值}
+    :param filters: 过滤条件，格式：{列名: 条件}，多列之间为"且"。条件可以是值（等值，如 {"季节": "冬"}）、
+        列表（取值在列表中，如 {"站点名称": ["站点1", "站点2"]}）或运算符字典：eq/ne/in/not_in/gt/gte/lt/lte/
+        between（闭区间 [下限, 上限]）/not（取反），如 {"时间": {"between": ["2023-01-01", "2023-03-31"]}, "PM2.5": {"gt": 75}}
     :param group_by: 分组列，格式：[列名1, 列名2, ...]，可按指定列进行分组，分别计算每组的相关性
-    :param correlation_vars: 相关性变量（2-10个变量），格式：[变量1, 变量2, ...]
+    :param correlation_vars: 相关性变量（2-10个变量），格式：[变量1, 变量2, ...]；全变量对筛选时不限数量，不传则筛选全部数值列
     :param correlation_method: 相关性计算方法 (pearson/spearman/kendall)
-    :return: 相关性分析结果表格（Markdown格式）
+    :param top_k: 全变量对筛选，仅返回相关性最强的前k个变量对（可选）
+    :param min_abs_correlation: 全变量对筛选，仅返回 |r| 不低于该阈值的变量对（可选）
+    :param missing_strategy: 多变量矩阵的缺失值处理 (listwise: 整行删除 / pairwise: 成对删除，并给出每个单元格的有效样本数)
+    :param output_format: 输出格式 (markdown: 结果表格 / json: 结构化结果，含变量、分组键、相关矩阵数组与有效样本数)
+    :return: 相关性分析结果表格（Markdown格式）或结构化结果（JSON格式）
     """
     try:
+        if output_format not in ("markdown", "json"):
+            raise ValueError(f"不支持的输出格式: {output_format}. 支持的格式: ['markdown', 'json']")
+        
         config = CorrelationConfig(
             # min_sample_size=min_sample_size,
             # max_file_size_mb=max_file_size_mb
         )
         
-        try:
-            method = CorrelationMethod(correlation_method.lower())
-        except ValueError:
-            raise ValueError(f"不支持的相关性方法: {correlation_method}. 支持的方法: {[m.value for m in CorrelationMethod]}")
-        
         manager = CorrelationManager(config)
-        result = await manager.analyze_correlation(
-            read_data_param=read_data_param,
-            filters=filters,
-            group_by=group_by,
-            correlation_vars=correlation_vars,
-            correlation_method=method
-        )
-        
-        return result
+        async with manager.executor.request_slot():
+            result = await _analyze(
+                manager, read_data_param, filters, group_by, correlation_vars,
+                correlation_method, top_k, min_abs_correlation, missing_strategy
+            )
+            if output_format == "json":
+                return json.dumps(result.to_dict(), ensure_ascii=False)
+            return await manager.executor.run("render", manager.table_generator.render, result)
         
     except Exception as e:
         logger.error(f"相关性分析失败: {e}")
         return f"分析失败: {str(e)}"
 
+async def correlation_analysis_result(
+    read_data_param: ReadDataParam,
+    filters: Optional[Dict[str, Any]] = None,
+    group_by: Optional[List[str]] = None,
+    correlation_vars: Optional[List[str]] = None,
+    correlation_method: str = "pearson",
+    top_k: Optional[int] = None,
+    min_abs_correlation: Optional[float] = None,
+    missing_strategy: str = "listwise"
+) -> CorrelationResult:
+    """
+    进程内调用的相关性分析（如可视化服务），参数与 correlation_analysis 相同，直接返回结构化结果而不渲染表格；
+    分析失败时抛出异常
+    """
+    manager = CorrelationManager(CorrelationConfig())
+    async with manager.executor.request_slot():
+        return await _analyze(
+            manager, read_data_param, filters, group_by, correlation_vars,
+            correlation_method, top_k, min_abs_correlation, missing_strategy
+        )
+
+async def _analyze(manager: CorrelationManager,
+                   read_data_param: ReadDataParam,
+                   filters: Optional[Dict[str, Any]],
+                   group_by: Optional[List[str]],
+                   correlation_vars: Optional[List[str]],
+                   correlation_method: str,
+                   top_k: Optional[int],
+                   min_abs_correlation: Optional[float],
+                   missing_strategy: str) -> CorrelationResult:
+    """校验字符串参数后执行分析"""
+    try:
+        method = CorrelationMethod(correlation_method.lower())
+    except ValueError:
+        raise ValueError(f"不支持的相关性方法: {correlation_method}. 支持的方法: {[m.value for m in CorrelationMethod]}")
+    
+    try:
+        strategy = MissingValueStrategy(missing_strategy.lower())
+    except ValueError:
+        raise ValueError(f"不支持的缺失值处理策略: {missing_strategy}. 支持的策略: {[s.value for s in MissingValueStrategy]}")
+    
+    # 读取数据前先检查过滤条件的写法
+    compile_filters(filters)
+    
+    return await manager.analyze_correlation_result(
+        read_data_param=read_data_param,
+        filters=filters,
+        group_by=group_by,
+        correlation_vars=correlation_vars,
+        correlation_method=method,
+        top_k=top_k,
+        min_abs_correlation=min_abs_correlation,
+        missing_strategy=strategy
+    )
+
+@mcp.tool()
+async def register_dataset(
+    read_data_param: ReadDataParam,
+    dimensions: Optional[List[str]] = None
+) -> str:
+    """
+    注册数据集并预计算相关性立方体。之后按这些维度分组或过滤的Pearson相关性分析直接由预计算结果汇总，无需读取原始数据。
+    
+    :param read_data_param: 数据读取参数
+    :param dimensions: 分类维度，格式：[列名1, 列名2, ...]，默认 [站点名称, 季节, 风向方位, 月份]
+    :return: 注册结果（JSON格式）
+    """
+    try:
+        manager = CorrelationManager(CorrelationConfig())
+        async with manager.executor.request_slot():
+            summary = await manager.register_dataset(read_data_param, dimensions)
+        return json.dumps(summary, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.error(f"数据集注册失败: {e}")
+        return f"注册失败: {str(e)}"
+
+@mcp.tool()
+async def correlation_server_status() -> str:
+    """
+    查看相关性分析服务的运行状态，包括执行队列的排队与各阶段耗时指标、数据集缓存命中情况、增量统计量的续读情况、已注册的相关性立方体、结果缓存、列名映射缓存与派生列缓存命中情况
+    
+    :return: 状态信息（JSON格式）
+    """
+    executor = get_analysis_executor(CorrelationConfig(), logger)
+    return json.dumps({
+        "executor": executor.get_metrics(),
+        "dataset_cache": get_dataset_cache(logger).get_stats(),
+        "incremental_store": get_incremental_store(logger).get_stats(),
+        "cube_store": get_cube_store(logger).get_stats(),
+        "result_cache": get_result_cache(logger).get_stats(),
+        "column_mapping_cache": get_mapping_cache(logger).get_stats(),
+        "derived_columns": get_derived_column_cache(logger).get_stats()
+    }, ensure_ascii=False, indent=2)
+
 if __name__ == '__main__':
     mcp.run(transport='sse') 
\ No newline at end of file
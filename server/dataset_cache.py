@@ -0,0 +1,658 @@
+"""
+进程级数据集缓存
+按 (解析后的绝对路径, 文件大小, 修改时间) 缓存已解析时间列的DataFrame，
+在字节预算内按LRU淘汰，供各MCP工具共享，重复分析同一文件时无需再次读取。
+CSV/Excel 源文件读取后另存一份列式(Feather)旁路文件（只读取部分列时只保存读到的列，之后逐步补全），
+之后（包括服务重启后）以内存映射方式读取。
+支持只读取指定列（列裁剪），缓存条目按需补充新列；大文件的过滤条件下推到读取器。
+缓存条目上可挂列索引（见 column_index 模块），随条目一起淘汰
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cache_paths import cache_path
+from column_index import ColumnIndex, build_column_index, index_key
+from filters import compile_filters
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装pyarrow时不启用列式旁路缓存与过滤下推
+    pa = pa_ds = feather = pq = None
+
+DatasetKey = Tuple[str, int, int]
+
+TIME_PATTERNS = ['时间', '日期', 'datetime', 'time', 'timestamp', 'date', '创建时间', '更新时间']
+
+# 旁路文件 schema 元数据：是否包含源文件的全部列
+_SIDECAR_COMPLETE = b"analysis.sidecar_complete"
+
+# 缓存命中时只返回浅拷贝，依赖写时复制隔离调用方的修改；pandas 3 起为默认行为，pandas 2.x 在服务启动（导入本模块）时开启
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+
+def read_dataset(file_path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """根据文件类型读取数据，指定columns时只读取这些列"""
+    file_ext = file_path.suffix.lower()
+
+    loader_map = {
+        '.csv': lambda: pd.read_csv(file_path, usecols=columns),
+        '.xlsx': lambda: pd.read_excel(file_path, usecols=columns),
+        '.xls': lambda: pd.read_excel(file_path, usecols=columns),
+        '.parquet': lambda: pd.read_parquet(file_path, columns=columns),
+        '.json': lambda: pd.read_json(file_path),
+        '.feather': lambda: pd.read_feather(file_path, columns=columns),
+        '.h5': lambda: pd.read_hdf(file_path),
+        '.hdf': lambda: pd.read_hdf(file_path)
+    }
+
+    if file_ext not in loader_map:
+        raise ValueError(f"不支持的文件类型: {file_ext}")
+
+    df = loader_map[file_ext]()
+    return df[columns] if columns is not None else df
+
+
+def read_dataset_columns(file_path: Path) -> List[str]:
+    """只读取表头/schema获取列名，不解析数据"""
+    file_ext = file_path.suffix.lower()
+
+    if file_ext == '.csv':
+        return pd.read_csv(file_path, nrows=0).columns.tolist()
+    if file_ext in ('.xlsx', '.xls'):
+        return pd.read_excel(file_path, nrows=0).columns.tolist()
+    if file_ext == '.parquet' and pq is not None:
+        return [name for name in pq.read_schema(file_path).names if not name.startswith("__index_level_")]
+    if file_ext == '.feather' and pa is not None:
+        with pa.memory_map(str(file_path)) as source:
+            return pa.ipc.open_file(source).schema.names
+
+    return read_dataset(file_path).columns.tolist()
+
+
+def parse_datetime_columns(df: pd.DataFrame, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
+    """自动解析时间列"""
+    for col in df.columns:
+        if any(pattern in str(col).lower() for pattern in TIME_PATTERNS):
+            try:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+                if logger:
+                    logger.debug(f"成功解析时间列: {col}")
+            except Exception as e:
+                if logger:
+                    logger.warning(f"时间列解析失败 {col}: {e}")
+
+    return df
+
+
+def is_time_column(column: str) -> bool:
+    """按列名判断是否为自动解析的时间列"""
+    return any(pattern in str(column).lower() for pattern in TIME_PATTERNS)
+
+
+def csv_filter_dtypes(file_path: Path, columns: List[str], probe_rows: int) -> Dict[str, str]:
+    """
+    由文件开头一块数据确定CSV过滤列在整个读取过程中的类型，避免按块推断的类型不一致
+    （如某块中该列全部缺失被推断为float64，文本比较值无法转换）：
+    数值列按 float64 比较，布尔列读取为可空布尔，其余按文本读取。
+    开头一块中全部缺失的列只读取这些列继续向后查找，由第一块有效值确定类型；整列缺失时按文本读取
+    """
+    header = set(read_dataset_columns(file_path))
+    columns = [col for col in columns if col in header]
+    if not columns:
+        return {}
+    probe = pd.read_csv(file_path, usecols=columns, nrows=probe_rows)
+    samples = {col: probe[col] for col in columns}
+    undetermined = [col for col in columns if probe[col].isna().all()]
+    if undetermined and len(probe) == probe_rows:
+        with pd.read_csv(file_path, usecols=undetermined, skiprows=range(1, probe_rows + 1),
+                         chunksize=probe_rows) as rest:
+            for chunk in rest:
+                for col in [col for col in undetermined if chunk[col].notna().any()]:
+                    samples[col] = chunk[col]
+                    undetermined.remove(col)
+                if not undetermined:
+                    break
+    dtypes = {}
+    for col in columns:
+        series = samples[col]
+        if pd.api.types.is_bool_dtype(series.dtype):
+            dtypes[col] = "boolean"
+        elif pd.api.types.is_numeric_dtype(series.dtype) and series.notna().any():
+            dtypes[col] = "float64"
+        else:
+            dtypes[col] = "str"
+    return dtypes
+
+
+def csv_read_dtypes(dtypes: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """传给 read_csv 的 dtype：数值列不固定读取类型（块中混入文本时读取不会失败），由 with_fixed_dtypes 转换"""
+    read_dtypes = {col: dtype for col, dtype in dtypes.items() if dtype != "float64"}
+    return read_dtypes or None
+
+
+def with_fixed_dtypes(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """数值过滤列统一转换为float64（混入的文本视为缺失）后用于求值过滤条件，不修改 df"""
+    converted = {
+        col: pd.to_numeric(df[col], errors="coerce").astype(np.float64)
+        for col, dtype in dtypes.items() if dtype == "float64" and col in df.columns and df[col].dtype != np.float64
+    }
+    return df.assign(**converted) if converted else df
+
+
+def read_dataset_filtered(file_path: Path,
+                          columns: Optional[List[str]],
+                          filters: Dict[str, Any],
+                          chunk_rows: int = 200000,
+                          logger: Optional[logging.Logger] = None) -> pd.DataFrame:
+    """
+    读取时即应用过滤条件：Parquet/Feather 通过pyarrow表达式下推（不匹配的行组不会解码），
+    CSV 按块流式读取并逐块过滤，其余格式读取后过滤。返回已解析时间列、已完成全部过滤的数据
+    """
+    file_ext = file_path.suffix.lower()
+    compiled = compile_filters(filters)
+    dtypes: Dict[str, str] = {}
+
+    if file_ext in ('.parquet', '.feather') and pa_ds is not None:
+        dataset = pa_ds.dataset(str(file_path), format="parquet" if file_ext == '.parquet' else "ipc")
+        expression = compiled.arrow_expression(dataset.schema, skip_column=is_time_column)
+        table = dataset.to_table(columns=columns, filter=expression)
+        df = table.to_pandas()
+        if logger:
+            logger.info(f"过滤条件下推到列式读取器，读取 {len(df)} 行")
+    elif file_ext == '.csv':
+        # 时间列在读取后才解析，逐块过滤时跳过
+        stream_filter = compile_filters({
+            col: condition for col, condition in compiled.conditions.items() if not is_time_column(col)
+        })
+        # 过滤列的类型在整个读取过程中固定，比较值对每块按同一类型转换
+        dtypes = csv_filter_dtypes(file_path, stream_filter.columns, chunk_rows) if stream_filter else {}
+        chunks = [
+            chunk if stream_filter is None else chunk[stream_filter.mask(with_fixed_dtypes(chunk, dtypes))]
+            for chunk in pd.read_csv(file_path, usecols=columns, chunksize=chunk_rows, dtype=csv_read_dtypes(dtypes))
+        ]
+        df = pd.concat(chunks, ignore_index=True) if chunks else read_dataset(file_path, columns).iloc[0:0]
+        if logger:
+            logger.info(f"CSV流式过滤读取，保留 {len(df)} 行")
+    else:
+        df = read_dataset(file_path, columns)
+
+    df = parse_datetime_columns(df, logger)
+    if columns is not None:
+        df = df[columns]
+    return df[compiled.mask(with_fixed_dtypes(df, dtypes))].reset_index(drop=True)
+
+
+STREAMABLE_FILE_TYPES = ['.csv', '.parquet', '.feather']
+
+
+def iter_dataset_chunks(file_path: Path,
+                        columns: Optional[List[str]] = None,
+                        chunk_rows: int = 200000,
+                        logger: Optional[logging.Logger] = None,
+                        dtype: Optional[Dict[str, str]] = None) -> Iterator[pd.DataFrame]:
+    """按块读取数据（已解析时间列），内存占用与文件大小无关；支持 CSV/Parquet/Feather，dtype 固定CSV列的读取类型"""
+    file_ext = file_path.suffix.lower()
+
+    if file_ext == '.csv':
+        chunks = pd.read_csv(file_path, usecols=columns, chunksize=chunk_rows, dtype=dtype)
+    elif file_ext == '.parquet' and pq is not None:
+        parquet_file = pq.ParquetFile(file_path)
+        chunks = (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns))
+    elif file_ext == '.feather' and pa is not None:
+        dataset = pa_ds.dataset(str(file_path), format="ipc")
+        chunks = (batch.to_pandas() for batch in dataset.to_batches(columns=columns, batch_size=chunk_rows))
+    else:
+        raise ValueError(f"流式读取仅支持 {STREAMABLE_FILE_TYPES} 文件: {file_ext}")
+
+    for chunk in chunks:
+        chunk = parse_datetime_columns(chunk, logger)
+        yield chunk[columns] if columns is not None else chunk
+
+
+def load_parsed_dataset(file_path: Path,
+                        logger: Optional[logging.Logger] = None,
+                        columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """读取文件并解析时间列，即缓存中保存的数据形态"""
+    return parse_datetime_columns(read_dataset(file_path, columns), logger)
+
+
+@dataclass
+class DatasetCacheConfig:
+    """数据集缓存配置"""
+    max_memory_mb: int = field(default_factory=lambda: int(os.environ.get("DATASET_CACHE_MAX_MB", 1024)))
+    sidecar_dir: str = field(default_factory=lambda: cache_path("DATASET_SIDECAR_DIR", "datasets"))
+    sidecar_enabled: bool = True
+    sidecar_file_types: List[str] = field(default_factory=lambda: ['.csv', '.xlsx', '.xls'])
+    # 超过该大小且未缓存的文件，过滤条件下推到读取器（结果不进入缓存）
+    pushdown_min_file_mb: int = 64
+    csv_chunk_rows: int = 200000
+    # 取值数超过该值的列不建列索引
+    index_max_cardinality: int = field(default_factory=lambda: int(os.environ.get("DATASET_INDEX_MAX_CARDINALITY", 10000)))
+
+
+class SidecarStore:
+    """CSV/Excel 的列式旁路缓存，文件名包含源文件指纹，源文件变化后自动失效"""
+
+    def __init__(self, config: DatasetCacheConfig, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self.directory = Path(config.sidecar_dir)
+
+    def applies_to(self, key: DatasetKey) -> bool:
+        return (self.config.sidecar_enabled and feather is not None
+                and Path(key[0]).suffix.lower() in self.config.sidecar_file_types)
+
+    def _source_prefix(self, key: DatasetKey) -> str:
+        return hashlib.sha1(key[0].encode("utf-8")).hexdigest()[:16]
+
+    def path_for(self, key: DatasetKey) -> Path:
+        fingerprint = hashlib.sha1(f"{key[1]}:{key[2]}".encode("utf-8")).hexdigest()[:12]
+        return self.directory / f"{self._source_prefix(key)}_{fingerprint}.feather"
+
+    def exists(self, key: DatasetKey) -> bool:
+        return self.path_for(key).exists()
+
+    def _schema(self, key: DatasetKey) -> Optional["pa.Schema"]:
+        try:
+            with pa.memory_map(str(self.path_for(key))) as source:
+                return pa.ipc.open_file(source).schema
+        except Exception:
+            return None
+
+    @staticmethod
+    def _is_complete(schema: "pa.Schema") -> bool:
+        # 没有标记的旁路文件总是由全量读取写入
+        return (schema.metadata or {}).get(_SIDECAR_COMPLETE, b"1") == b"1"
+
+    def read_columns(self, key: DatasetKey) -> Optional[List[str]]:
+        """读取旁路文件的列名；只保存了部分列的旁路文件返回None"""
+        schema = self._schema(key)
+        if schema is None or not self._is_complete(schema):
+            return None
+        return schema.names
+
+    def covers(self, key: DatasetKey, columns: Optional[List[str]] = None) -> bool:
+        """旁路文件是否包含所需的列（None表示全部列）"""
+        schema = self._schema(key)
+        if schema is None:
+            return False
+        return self._is_complete(schema) if columns is None else set(columns) <= set(schema.names)
+
+    def load(self, key: DatasetKey, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """以内存映射方式读取旁路文件（可只读取部分列），不存在、缺少所需的列或损坏时返回None"""
+        sidecar = self.path_for(key)
+        if not sidecar.exists() or not self.covers(key, columns):
+            return None
+        try:
+            df = feather.read_table(sidecar, columns=columns, memory_map=True).to_pandas()
+            self.logger.info(f"从列式旁路缓存读取: {sidecar.name}")
+            return df
+        except Exception as e:
+            self.logger.warning(f"旁路缓存读取失败，改为读取源文件 {sidecar}: {e}")
+            sidecar.unlink(missing_ok=True)
+            return None
+
+    def merge(self, key: DatasetKey, df: pd.DataFrame, all_columns: List[str]) -> None:
+        """把列裁剪读取到的列并入旁路文件（按源文件列顺序），包含全部列后标记为完整"""
+        sidecar = self.path_for(key)
+        if sidecar.exists():
+            schema = self._schema(key)
+            existing = [] if schema is None else [c for c in schema.names if c not in df.columns]
+            if existing:
+                try:
+                    old = feather.read_table(sidecar, columns=existing, memory_map=True).to_pandas()
+                    df = pd.concat([old, df], axis=1)
+                except Exception as e:
+                    self.logger.warning(f"旁路缓存读取失败，重新写入 {sidecar}: {e}")
+        df = df[[c for c in all_columns if c in df.columns]]
+        self.save(key, df, complete=len(df.columns) == len(all_columns))
+
+    def save(self, key: DatasetKey, df: pd.DataFrame, complete: bool = True) -> None:
+        """写入旁路文件（不压缩以便内存映射），并清理同一源文件的旧版本；complete 标记是否包含全部列"""
+        sidecar = self.path_for(key)
+        # 先写临时文件再原子替换，避免其他进程读到写了一半的文件
+        tmp_path = sidecar.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for stale in self.directory.glob(f"{self._source_prefix(key)}_*.feather"):
+                if stale != sidecar:
+                    stale.unlink(missing_ok=True)
+
+            table = pa.Table.from_pandas(df)
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}), _SIDECAR_COMPLETE: b"1" if complete else b"0"
+            })
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+            os.replace(tmp_path, sidecar)
+            self.logger.info(f"已写入列式旁路缓存: {sidecar.name}" + ("" if complete else f" ({len(df.columns)}列)"))
+        except Exception as e:
+            self.logger.warning(f"旁路缓存写入失败 {key[0]}: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+
+@dataclass
+class _PendingLoad:
+    """同一数据集版本上进行中的加载，最后一个等待者离开后才移除，之后到达的请求不会另起一次读取"""
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    waiters: int = 0
+
+
+@dataclass
+class _CacheEntry:
+    df: pd.DataFrame
+    nbytes: int
+    complete: bool
+    """是否包含文件的全部列"""
+
+    indexes: Dict[Hashable, Optional[ColumnIndex]] = field(default_factory=dict)
+    """列索引，None表示该列不适合建索引"""
+
+
+class DatasetCache:
+    """按内容寻址的DataFrame缓存"""
+
+    def __init__(self, config: DatasetCacheConfig, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self.max_bytes = config.max_memory_mb * 1024 * 1024
+        self.sidecars = SidecarStore(config, logger)
+
+        self._entries: "OrderedDict[DatasetKey, _CacheEntry]" = OrderedDict()
+        self._loading: Dict[DatasetKey, _PendingLoad] = {}
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.index_hits = 0
+        self.index_builds = 0
+
+    @staticmethod
+    def make_key(file_path: Path) -> DatasetKey:
+        """数据集指纹：绝对路径 + 大小 + 修改时间"""
+        resolved = Path(file_path).resolve()
+        stat = resolved.stat()
+        return str(resolved), stat.st_size, stat.st_mtime_ns
+
+    def get_columns(self, file_path: Path) -> List[str]:
+        """获取数据集列名：优先使用缓存或旁路文件，否则只读取表头"""
+        key = self.make_key(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.complete:
+                return entry.df.columns.tolist()
+
+        if self.sidecars.applies_to(key) and self.sidecars.exists(key):
+            columns = self.sidecars.read_columns(key)
+            if columns is not None:
+                return columns
+
+        return read_dataset_columns(Path(key[0]))
+
+    def get_or_load(self,
+                    file_path: Path,
+                    columns: Optional[List[str]] = None,
+                    loader: Optional[Callable[[Path], pd.DataFrame]] = None,
+                    filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """
+        获取数据集，未命中时读取并缓存
+
+        :param file_path: 数据文件路径
+        :param columns: 只需要的列（按给定顺序返回），为None时读取全部列
+        :param loader: 自定义读取函数，默认读取文件（或其列式旁路缓存）并解析时间列
+        :param filters: 过滤条件（语法见 filters 模块）；大文件未缓存时下推到读取器
+        :return: 数据集副本，调用方可自由修改
+        """
+        key = self.make_key(file_path)
+        columns = list(dict.fromkeys(columns)) if columns is not None else None
+
+        if filters:
+            df = self._lookup(key, columns)
+            if df is None and loader is None and self._should_push_down(key):
+                return self._load_filtered(key, columns, filters)
+            if df is None:
+                df = self.get_or_load(file_path, columns, loader)
+            compiled = compile_filters(filters)
+            return df[compiled.mask(df, self.column_indexes(key, df, compiled.columns))]
+
+        df = self._lookup(key, columns)
+        if df is not None:
+            return df
+
+        # 同一文件并发加载时只读取一次
+        with self._lock:
+            pending = self._loading.setdefault(key, _PendingLoad())
+            pending.waiters += 1
+        try:
+            with pending.lock:
+                df = self._lookup(key, columns, count_miss=True)
+                if df is None:
+                    df = self._load_missing(key, columns, loader)
+        finally:
+            with self._lock:
+                pending.waiters -= 1
+                if pending.waiters == 0:
+                    self._loading.pop(key, None)
+        return df
+
+    def _load_missing(self,
+                      key: DatasetKey,
+                      columns: Optional[List[str]],
+                      loader: Optional[Callable[[Path], pd.DataFrame]]) -> pd.DataFrame:
+        """读取缓存中缺少的数据并写入缓存（调用方持有该数据集版本的加载锁）"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if loader is not None:
+            self.logger.info(f"数据集缓存未命中，读取文件: {key[0]}")
+            df, complete = loader(Path(key[0])), True
+        elif columns is None or entry is None:
+            self.logger.info(f"数据集缓存未命中，读取文件: {key[0]}"
+                             + (f" ({len(columns)}列)" if columns is not None else ""))
+            df, complete = self._load_source(key, columns)
+        else:
+            # 已缓存部分列，只补读缺少的列
+            missing = [c for c in columns if c not in entry.df.columns]
+            self.logger.info(f"数据集缓存补充读取 {len(missing)} 列: {key[0]}")
+            extra, _ = self._load_source(key, missing)
+            df, complete = pd.concat([entry.df, extra], axis=1), False
+        self._store(key, df, complete)
+        return self._detach(df[columns] if columns is not None else df)
+
+    def pushes_down(self, file_path: Path, columns: Optional[List[str]] = None) -> bool:
+        """带过滤条件读取时是否下推到读取器（大文件且未缓存，结果不进入缓存）"""
+        key = self.make_key(file_path)
+        with self._lock:
+            covered = self._covers(self._entries.get(key), columns)
+        return not covered and self._should_push_down(key)
+
+    def _should_push_down(self, key: DatasetKey) -> bool:
+        """大文件且读取器支持（CSV/Parquet/Feather，或已有旁路文件）时才下推过滤"""
+        if key[1] < self.config.pushdown_min_file_mb * 1024 * 1024:
+            return False
+        if self.sidecars.applies_to(key) and self.sidecars.exists(key):
+            return True
+        return Path(key[0]).suffix.lower() in ('.csv', '.parquet', '.feather')
+
+    def _load_filtered(self,
+                       key: DatasetKey,
+                       columns: Optional[List[str]],
+                       filters: Dict[str, Any]) -> pd.DataFrame:
+        """带过滤条件直接读取，结果只是数据子集，不进入缓存"""
+        with self._lock:
+            self.misses += 1
+
+        source = Path(key[0])
+        if self.sidecars.applies_to(key) and self.sidecars.covers(key, columns):
+            source = self.sidecars.path_for(key)
+        self.logger.info(f"过滤条件下推读取: {key[0]} {filters}")
+        return read_dataset_filtered(source, columns, filters, self.config.csv_chunk_rows, self.logger)
+
+    def _load_source(self, key: DatasetKey, columns: Optional[List[str]]) -> Tuple[pd.DataFrame, bool]:
+        """
+        读取源文件，返回 (数据, 是否为全部列)
+        CSV/Excel 优先使用旁路缓存；旁路文件缺少所需的列时读取源文件并写入旁路文件：
+        CSV 的列裁剪读取直接使用 usecols，读到的列并入旁路文件，不为生成旁路文件再读取一遍源文件
+        """
+        file_path = Path(key[0])
+        if not self.sidecars.applies_to(key):
+            return load_parsed_dataset(file_path, self.logger, columns), columns is None
+
+        df = self.sidecars.load(key, columns)
+        if df is not None:
+            return df, columns is None
+
+        if columns is not None and file_path.suffix.lower() == '.csv':
+            df = load_parsed_dataset(file_path, self.logger, columns)
+            self.sidecars.merge(key, df, read_dataset_columns(file_path))
+            return df, False
+
+        df = load_parsed_dataset(file_path, self.logger)
+        self.sidecars.save(key, df)
+        return df, True
+
+    def _lookup(self,
+                key: DatasetKey,
+                columns: Optional[List[str]],
+                count_miss: bool = False) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if not self._covers(entry, columns):
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        self.logger.debug(f"数据集缓存命中: {key[0]}")
+        return self._detach(entry.df[columns] if columns is not None else entry.df)
+
+    @staticmethod
+    def _covers(entry: Optional[_CacheEntry], columns: Optional[List[str]]) -> bool:
+        return entry is not None and (
+            entry.complete if columns is None else all(c in entry.df.columns for c in columns)
+        )
+
+    def _store(self, key: DatasetKey, df: pd.DataFrame, complete: bool) -> None:
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            self.logger.info(f"数据集 {key[0]} 占用 {nbytes / 1024 / 1024:.1f}MB，超过缓存预算，不缓存")
+            return
+
+        with self._lock:
+            # 补充列时行不变，保留已建的列索引
+            previous = self._entries.get(key)
+            indexes = previous.indexes if previous is not None and len(previous.df) == len(df) else {}
+            nbytes += sum(index.nbytes for index in indexes.values() if index is not None)
+
+            # 同一路径的旧版本已失效，同一版本的旧条目被新条目替换
+            for stale in [k for k in self._entries if k[0] == key[0]]:
+                self._evict(stale)
+
+            self._entries[key] = _CacheEntry(df=df, nbytes=nbytes, complete=complete, indexes=indexes)
+            self._total_bytes += nbytes
+            self._enforce_budget()
+
+    def _enforce_budget(self) -> None:
+        while self._total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._evict(oldest)
+            self.evictions += 1
+
+    def column_index(self, key: DatasetKey, column_key: Hashable, values: pd.Series) -> Optional[ColumnIndex]:
+        """
+        获取缓存数据集上某列的索引，首次使用时构建并挂在缓存条目上（计入缓存预算，随条目淘汰）
+        values 须与缓存的数据集行对齐；数据集未缓存或该列不适合建索引时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or len(entry.df) != len(values):
+                return None
+            if column_key in entry.indexes:
+                self.index_hits += 1
+                return entry.indexes[column_key]
+
+        index = build_column_index(values, self.config.index_max_cardinality)
+        with self._lock:
+            if self._entries.get(key) is not entry or column_key in entry.indexes:
+                return index
+            entry.indexes[column_key] = index
+            self.index_builds += 1
+            if index is not None:
+                entry.nbytes += index.nbytes
+                self._total_bytes += index.nbytes
+                self.logger.debug(f"已建立列索引 {column_key}: {len(index.categories)}个取值")
+                self._enforce_budget()
+        return index
+
+    def column_indexes(self, key: DatasetKey, df: pd.DataFrame, columns: List[str]) -> Dict[str, ColumnIndex]:
+        """df 中源列的索引 {列名: 索引}，df 须与缓存的数据集行对齐"""
+        indexes = {}
+        for col in columns:
+            if col in df.columns:
+                index = self.column_index(key, index_key(col), df[col])
+                if index is not None:
+                    indexes[col] = index
+        return indexes
+
+    def _evict(self, key: DatasetKey) -> None:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.nbytes
+        self.logger.debug(f"数据集缓存移除: {key[0]}")
+
+    @staticmethod
+    def _detach(df: pd.DataFrame) -> pd.DataFrame:
+        return df.copy(deep=False)
+
+    def invalidate(self, file_path: Optional[Path] = None) -> None:
+        """清除指定文件或全部缓存"""
+        with self._lock:
+            if file_path is None:
+                keys = list(self._entries)
+            else:
+                resolved = str(Path(file_path).resolve())
+                keys = [k for k in self._entries if k[0] == resolved]
+            for key in keys:
+                self._evict(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回缓存统计"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_mb": round(self._total_bytes / 1024 / 1024, 2),
+                "max_memory_mb": self.config.max_memory_mb,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "indexed_columns": sum(
+                    index is not None for entry in self._entries.values() for index in entry.indexes.values()
+                ),
+                "index_hits": self.index_hits,
+                "index_builds": self.index_builds,
+            }
+
+
+_cache: Optional[DatasetCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_dataset_cache(logger: Optional[logging.Logger] = None) -> DatasetCache:
+    """获取进程内共享的数据集缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DatasetCache(DatasetCacheConfig(), logger or logging.getLogger(__name__))
+        return _cache
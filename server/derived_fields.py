@@ -0,0 +1,282 @@
+"""
+派生字段注册表
+每个派生字段声明输入（数据源意图列或其他派生字段）、输出类型和向量化计算函数，字段之间构成依赖图。
+生成器只计算请求实际需要的字段及其上游字段（按拓扑顺序），已生成的列按数据集版本缓存，重复请求不再计算。
+外部模块可调用 register_derived_field 注册新字段，或在环境变量 DERIVED_FIELD_MODULES 中列出模块，
+这些模块首次使用注册表时被导入，并调用其中的 register_derived_fields(registry)。
+"""
+
+import importlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import SEASON_ORDER, WIND_DIRECTION_ORDER
+from dataset_cache import DatasetKey
+
+
+@dataclass
+class DerivedFieldConfig:
+    """派生字段配置"""
+    modules: List[str] = field(default_factory=lambda: [
+        name.strip() for name in os.environ.get("DERIVED_FIELD_MODULES", "").split(",") if name.strip()
+    ])
+    """启动时导入的扩展模块"""
+
+    cache_max_mb: int = field(default_factory=lambda: int(os.environ.get("DERIVED_CACHE_MAX_MB", 256)))
+
+
+@dataclass
+class DerivedField:
+    """派生字段定义"""
+    name: str
+    inputs: List[str]
+    """输入：其他派生字段名，或由列名映射解析的数据源意图列（与自身同名的输入视为数据源列）"""
+
+    compute: Callable[..., Any]
+    """向量化计算函数，按 inputs 顺序接收各输入Series，返回等长的Series或数组"""
+
+    dtype: Any = None
+    """输出类型，为None时保持计算结果的类型"""
+
+    description: str = ""
+
+
+class DerivedFieldRegistry:
+    """派生字段注册表"""
+
+    def __init__(self):
+        self._fields: Dict[str, DerivedField] = {}
+        self._lock = threading.Lock()
+
+    def register(self, derived: DerivedField, replace: bool = False) -> None:
+        """注册派生字段，同名字段需指定 replace，形成循环依赖时抛出 ValueError"""
+        with self._lock:
+            if derived.name in self._fields and not replace:
+                raise ValueError(f"派生字段已存在: {derived.name}")
+            fields = {**self._fields, derived.name: derived}
+            _topological_order(fields, list(fields))
+            self._fields = fields
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            fields = dict(self._fields)
+            fields.pop(name, None)
+            self._fields = fields
+
+    def get(self, name: str) -> DerivedField:
+        return self._fields[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._fields
+
+    def names(self) -> List[str]:
+        return list(self._fields)
+
+    def derived_inputs(self, name: str) -> List[str]:
+        """字段输入中的派生字段"""
+        return _derived_inputs(self._fields, name)
+
+    def source_inputs(self, name: str) -> List[str]:
+        """字段（含上游派生字段）最终依赖的数据源意图列，按首次出现顺序"""
+        fields = self._fields
+        sources: List[str] = []
+        for upstream in _topological_order(fields, [name]):
+            for dep in fields[upstream].inputs:
+                if dep not in _derived_inputs(fields, upstream) and dep not in sources:
+                    sources.append(dep)
+        return sources
+
+    def plan(self, targets: List[str]) -> List[str]:
+        """计算targets需要的全部派生字段，按拓扑顺序排列"""
+        return _topological_order(self._fields, targets)
+
+    def catalogue(self) -> Dict[str, Dict[str, Any]]:
+        """供列名解析使用的字段目录 {派生字段: {"depends_on": [数据源意图列], "description": ...}}"""
+        return {
+            name: {"depends_on": self.source_inputs(name), "description": derived.description}
+            for name, derived in self._fields.items()
+        }
+
+
+def _derived_inputs(fields: Dict[str, DerivedField], name: str) -> List[str]:
+    return [dep for dep in fields[name].inputs if dep in fields and dep != name]
+
+
+def _topological_order(fields: Dict[str, DerivedField], targets: List[str]) -> List[str]:
+    """深度优先得到targets及其上游字段的拓扑顺序"""
+    order: List[str] = []
+    state: Dict[str, int] = {}  # 1: 访问中, 2: 已完成
+
+    def visit(name: str, path: Tuple[str, ...]) -> None:
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError(f"派生字段存在循环依赖: {' -> '.join(path + (name,))}")
+        state[name] = 1
+        for dep in _derived_inputs(fields, name):
+            visit(dep, path + (name,))
+        state[name] = 2
+        order.append(name)
+
+    for target in targets:
+        if target not in fields:
+            raise KeyError(f"未注册的派生字段: {target}")
+        visit(target, ())
+    return order
+
+
+class DerivedColumnCache:
+    """按 (数据集版本, 派生字段, 源列) 缓存已生成的列，在字节预算内按LRU淘汰"""
+
+    def __init__(self, config: DerivedFieldConfig, logger: logging.Logger):
+        self.logger = logger
+        self.max_bytes = config.cache_max_mb * 1024 * 1024
+        self._entries: "OrderedDict[Tuple[DatasetKey, Hashable], Tuple[pd.Series, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, dataset_key: DatasetKey, column_key: Hashable, n_rows: int) -> Optional[pd.Series]:
+        with self._lock:
+            entry = self._entries.get((dataset_key, column_key))
+            if entry is None or len(entry[0]) != n_rows:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((dataset_key, column_key))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, dataset_key: DatasetKey, column_key: Hashable, values: pd.Series) -> None:
+        nbytes = int(values.memory_usage(index=False, deep=True))
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            # 同一文件的旧版本已失效
+            for stale in [k for k in self._entries if k[0][0] == dataset_key[0] and k[0] != dataset_key]:
+                self._evict(stale)
+            if (dataset_key, column_key) in self._entries:
+                self._evict((dataset_key, column_key))
+            self._entries[(dataset_key, column_key)] = (values, nbytes)
+            self._total_bytes += nbytes
+            while self._total_bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: Tuple[DatasetKey, Hashable]) -> None:
+        _, nbytes = self._entries.pop(key)
+        self._total_bytes -= nbytes
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "columns": len(self._entries),
+                "memory_mb": round(self._total_bytes / 1024 / 1024, 2),
+                "max_memory_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# ---------------------------------------------------------------------------
+# 内置派生字段
+# ---------------------------------------------------------------------------
+
+# 类别按字符串排序，分组顺序与字符串列一致
+SEASON_DTYPE = pd.CategoricalDtype(sorted(SEASON_ORDER))
+WIND_DIRECTION_DTYPE = pd.CategoricalDtype(sorted(WIND_DIRECTION_ORDER))
+
+# 下标为月份（0为占位）
+_SEASON_CODES = SEASON_DTYPE.categories.get_indexer(
+    [None, "冬", "冬", "春", "春", "春", "夏", "夏", "夏", "秋", "秋", "秋", "冬"]
+).astype(np.int8)
+# 下标为 floor((角度+22.5)/45) % 8
+_WIND_DIRECTION_CODES = WIND_DIRECTION_DTYPE.categories.get_indexer(WIND_DIRECTION_ORDER).astype(np.int8)
+
+
+def lookup_categorical(index: np.ndarray, table: np.ndarray, dtype: pd.CategoricalDtype) -> pd.Categorical:
+    """按整数下标查表得到分类编码，缺失或越界的下标对应缺失值"""
+    valid = np.isfinite(index)
+    positions = np.where(valid, index, 0).astype(np.int64)
+    valid &= (positions >= 0) & (positions < len(table))
+    codes = np.where(valid, table[np.where(valid, positions, 0)], -1)
+    return pd.Categorical.from_codes(codes, dtype=dtype)
+
+
+def standardize_time(time: pd.Series) -> pd.Series:
+    """时间字段标准化"""
+    return pd.to_datetime(time, errors="coerce")
+
+
+def month_of(time: pd.Series) -> pd.Series:
+    """时间所在月份"""
+    return time.dt.month
+
+
+def season_of_month(month: pd.Series) -> pd.Categorical:
+    """月份查表得到季节"""
+    months = pd.to_numeric(month, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return lookup_categorical(months, _SEASON_CODES, SEASON_DTYPE)
+
+
+def wind_direction_of(degree: pd.Series) -> pd.Categorical:
+    """风向角度分箱后查表得到中文方位"""
+    degrees = pd.to_numeric(degree, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(invalid="ignore"):
+        bins = np.floor((np.mod(degrees, 360) + 22.5) / 45) % 8
+    return lookup_categorical(bins, _WIND_DIRECTION_CODES, WIND_DIRECTION_DTYPE)
+
+
+BUILTIN_FIELDS = [
+    DerivedField("时间", ["时间"], standardize_time, description="时间字段标准化"),
+    DerivedField("月份", ["时间"], month_of, dtype="Int8", description="根据时间生成月份字段"),
+    DerivedField("季节", ["月份"], season_of_month, dtype=SEASON_DTYPE, description="根据时间生成季节字段"),
+    DerivedField("风向方位", ["风向"], wind_direction_of, dtype=WIND_DIRECTION_DTYPE,
+                 description="将风向角度转换为中文方位"),
+]
+
+
+_registry: Optional[DerivedFieldRegistry] = None
+_column_cache: Optional[DerivedColumnCache] = None
+_lock = threading.Lock()
+
+
+def get_derived_field_registry(logger: Optional[logging.Logger] = None) -> DerivedFieldRegistry:
+    """获取进程内共享的派生字段注册表（内置字段 + 扩展模块注册的字段）"""
+    global _registry
+    with _lock:
+        if _registry is not None:
+            return _registry
+        logger = logger or logging.getLogger(__name__)
+        registry = DerivedFieldRegistry()
+        for derived in BUILTIN_FIELDS:
+            registry.register(derived)
+        for module_name in DerivedFieldConfig().modules:
+            try:
+                module = importlib.import_module(module_name)
+                module.register_derived_fields(registry)
+                logger.info(f"已加载派生字段扩展模块: {module_name}")
+            except Exception as e:
+                logger.error(f"加载派生字段扩展模块失败 {module_name}: {e}")
+        _registry = registry
+        return _registry
+
+
+def register_derived_field(derived: DerivedField, replace: bool = False) -> None:
+    """向共享注册表注册派生字段"""
+    get_derived_field_registry().register(derived, replace=replace)
+
+
+def get_derived_column_cache(logger: Optional[logging.Logger] = None) -> DerivedColumnCache:
+    """获取进程内共享的派生列缓存"""
+    global _column_cache
+    with _lock:
+        if _column_cache is None:
+            _column_cache = DerivedColumnCache(DerivedFieldConfig(), logger or logging.getLogger(__name__))
+        return _column_cache
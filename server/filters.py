@@ -0,0 +1,345 @@
+"""
+过滤条件语言
+filters 为 {列名: 条件}，不同列的条件之间为"且"。条件可以是：
+- 标量，如 "冬"、5、"2023-01-01"：等值，比较值按列类型转换（数值列、时间列、布尔列均可用字符串传入）
+- 列表，如 ["春", "夏"]：取值在列表中
+- 字典，多个运算符之间为"且"：
+    {"eq": v}  {"ne": v}  {"in": [...]}  {"not_in": [...]}
+    {"gt": v}  {"gte": v}  {"lt": v}  {"lte": v}  {"between": [下限, 上限]}（闭区间）
+    {"not": 条件}（取反，缺失值视为满足）
+值无法转换为列类型时抛出 ValueError；以文本存储的数值列（如 "62(H)"）在范围条件的边界为数值时按数值比较。
+整组条件只解析一次，之后对任意数据（或数据块）求值为一个向量化的布尔掩码：
+分类列与有列索引的列在类别上求值后按编码查表，单调递增的列的范围条件用二分查找定位区间。
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from column_index import ColumnIndex
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_ds
+except ImportError:  # 未安装pyarrow时不下推过滤条件
+    pa = pa_ds = None
+
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte", "between")
+OPERATORS = ("eq", "ne", "in", "not_in", *RANGE_OPERATORS, "not")
+
+
+@dataclass(frozen=True)
+class Condition:
+    """单列条件表达式树的节点"""
+    op: str
+    """eq / in / gt / gte / lt / lte / between 为叶子节点，and / not 为组合节点"""
+
+    value: Any = None
+    """叶子节点的原始比较值；组合节点为子条件元组"""
+
+
+def parse_condition(spec: Any) -> Condition:
+    """把单列的过滤条件解析为表达式树，不支持的写法抛出 ValueError"""
+    if isinstance(spec, Condition):
+        return spec
+    if isinstance(spec, (list, tuple, set)):
+        return Condition("in", tuple(spec))
+    if not isinstance(spec, dict):
+        return Condition("eq", spec)
+    if not spec:
+        raise ValueError("过滤条件不能为空字典")
+
+    parts = []
+    for op, arg in spec.items():
+        if op not in OPERATORS:
+            raise ValueError(f"不支持的过滤运算符: {op}，可用: {list(OPERATORS)}")
+        if op == "not":
+            parts.append(Condition("not", (parse_condition(arg),)))
+        elif op == "ne":
+            parts.append(Condition("not", (Condition("eq", arg),)))
+        elif op in ("in", "not_in"):
+            if not isinstance(arg, (list, tuple, set)):
+                raise ValueError(f"{op} 的值必须是列表: {arg!r}")
+            leaf = Condition("in", tuple(arg))
+            parts.append(leaf if op == "in" else Condition("not", (leaf,)))
+        elif op == "between":
+            if not isinstance(arg, (list, tuple)) or len(arg) != 2:
+                raise ValueError(f"between 的值必须是 [下限, 上限]: {arg!r}")
+            parts.append(Condition("between", tuple(arg)))
+        else:
+            parts.append(Condition(op, arg))
+    return parts[0] if len(parts) == 1 else Condition("and", tuple(parts))
+
+
+def coerce_filter_value(value: Any, dtype: Any, column: str = "") -> Any:
+    """把过滤值转换为列的类型（过滤条件通常以字符串传入），无法转换时抛出 ValueError"""
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if value is None:
+        return None
+
+    try:
+        if pd.api.types.is_bool_dtype(dtype):
+            if isinstance(value, str):
+                lowered = value.strip().lower()
+                if lowered not in ("true", "false", "1", "0"):
+                    raise ValueError(value)
+                return lowered in ("true", "1")
+            return bool(value)
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            timestamp = pd.Timestamp(value)
+            tz = getattr(dtype, "tz", None)
+            if tz is not None and timestamp.tzinfo is None:
+                timestamp = timestamp.tz_localize(tz)
+            return timestamp
+        if pd.api.types.is_numeric_dtype(dtype):
+            number = float(value)
+            return int(number) if pd.api.types.is_integer_dtype(dtype) and number.is_integer() else number
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"过滤列 {column} 的值 {value!r} 无法转换为列类型 {dtype}") from e
+
+    if pd.api.types.is_string_dtype(dtype) and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+class _Evaluator:
+    """在一列（或分类列的类别）上对表达式树求值"""
+
+    def __init__(self, values: pd.Series, column: str):
+        self.values = values
+        self.column = column
+        self.dtype = values.dtype
+        self._sorted: Optional[bool] = None
+
+    def evaluate(self, condition: Condition) -> np.ndarray:
+        if condition.op == "and":
+            mask = np.ones(len(self.values), dtype=bool)
+            for part in condition.value:
+                mask &= self.evaluate(part)
+            return mask
+        if condition.op == "not":
+            return ~self.evaluate(condition.value[0])
+        if condition.op == "in":
+            targets = [coerce_filter_value(v, self.dtype, self.column) for v in condition.value]
+            return self.values.isin(targets).to_numpy(dtype=bool, na_value=False)
+        if condition.op == "eq":
+            target = coerce_filter_value(condition.value, self.dtype, self.column)
+            if target is None:
+                return self.values.isna().to_numpy()
+            return (self.values == target).to_numpy(dtype=bool, na_value=False)
+        return self._range(condition)
+
+    def _range(self, condition: Condition) -> np.ndarray:
+        raw_bounds = condition.value if condition.op == "between" else (condition.value,)
+        values, dtype = self.values, self.dtype
+        if _is_text(dtype) and all(_is_number(v) for v in raw_bounds):
+            # 以文本存储的数值列（如 "62(H)"、"—"）按数值比较，与相关性计算对该列的解析一致
+            values = pd.to_numeric(values, errors="coerce")
+            dtype = values.dtype
+
+        coerced = [coerce_filter_value(v, dtype, self.column) for v in raw_bounds]
+        bounds = list(zip(("gte", "lte"), coerced)) if condition.op == "between" else [(condition.op, coerced[0])]
+
+        if values is self.values and self._is_sorted():
+            # 有序列：二分查找得到满足条件的连续区间
+            start, stop = 0, len(values)
+            for op, bound in bounds:
+                if op in ("gt", "gte"):
+                    start = max(start, int(values.searchsorted(bound, side="right" if op == "gt" else "left")))
+                else:
+                    stop = min(stop, int(values.searchsorted(bound, side="left" if op == "lt" else "right")))
+            mask = np.zeros(len(values), dtype=bool)
+            mask[start:max(start, stop)] = True
+            return mask
+
+        compare: Dict[str, Callable[[Any], pd.Series]] = {
+            "gt": values.gt, "gte": values.ge, "lt": values.lt, "lte": values.le,
+        }
+        mask = np.ones(len(values), dtype=bool)
+        for op, bound in bounds:
+            mask &= compare[op](bound).to_numpy(dtype=bool, na_value=False)
+        return mask
+
+    def _is_sorted(self) -> bool:
+        """列单调递增且无缺失值时可二分查找（首次使用范围条件时检查）"""
+        if self._sorted is None:
+            dtype = self.dtype
+            self._sorted = bool(
+                not isinstance(dtype, pd.CategoricalDtype)
+                and (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype))
+                and not pd.api.types.is_bool_dtype(dtype)
+                and self.values.is_monotonic_increasing and not self.values.hasnans
+            )
+        return self._sorted
+
+
+def _is_text(dtype: Any) -> bool:
+    return pd.api.types.is_string_dtype(dtype) or pd.api.types.is_object_dtype(dtype)
+
+
+def _is_number(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+class CompiledFilter:
+    """已解析的过滤条件，可对多个数据块重复求值"""
+
+    def __init__(self, filters: Dict[str, Any]):
+        self.conditions: Dict[str, Condition] = {col: parse_condition(spec) for col, spec in filters.items()}
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.conditions)
+
+    def mask(self, df: pd.DataFrame, indexes: Optional[Mapping[str, ColumnIndex]] = None) -> np.ndarray:
+        """
+        全部条件合并后的布尔行掩码
+        indexes 为与 df 行对齐的列索引：全部条件列都有索引时，从选中行最少的列出发，
+        其余列只检查这些行的编码，代价与选中行数成正比
+        """
+        for col in self.conditions:
+            if col not in df.columns:
+                raise ValueError(f"过滤列不存在于数据中: {col}")
+
+        indexed = {
+            col: (indexes[col], _category_table(indexes[col].categories, col, condition))
+            for col, condition in self.conditions.items()
+            if indexes and indexes.get(col) is not None and indexes[col].n_rows == len(df)
+        }
+        if indexed:
+            ordered = sorted(indexed.values(), key=lambda item: item[0].count(item[1]))
+            rows = ordered[0][0].rows(ordered[0][1])
+            for index, table in ordered[1:]:
+                rows = rows[table[index.codes[rows]]]
+            mask = np.zeros(len(df), dtype=bool)
+            mask[rows] = True
+        else:
+            mask = np.ones(len(df), dtype=bool)
+
+        for col, condition in self.conditions.items():
+            if col not in indexed:
+                mask &= self._column_mask(df[col], col, condition)
+        return mask
+
+    @staticmethod
+    def _column_mask(series: pd.Series, column: str, condition: Condition) -> np.ndarray:
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # 在类别上求值后按编码查表（编码-1落在末尾的缺失值位置）
+            table = _category_table(series.cat.categories, column, condition)
+            return table[series.cat.codes.to_numpy()]
+        return _Evaluator(series, column).evaluate(condition)
+
+    def arrow_expression(self,
+                         schema: "pa.Schema",
+                         skip_column: Callable[[str], bool] = lambda col: False) -> Optional["pa_ds.Expression"]:
+        """
+        转换为pyarrow表达式供读取器下推，只转换能保证不漏行的部分（结果是过滤后数据的超集），
+        取反条件与类型无法对应的条件留给内存中过滤
+        """
+        if pa_ds is None:
+            return None
+        expression = None
+        for col, condition in self.conditions.items():
+            if col not in schema.names or skip_column(col):
+                continue
+            part = _arrow_condition(pa_ds.field(col), schema.field(col).type, condition)
+            if part is not None:
+                expression = part if expression is None else expression & part
+        return expression
+
+
+def _category_table(categories: pd.Index, column: str, condition: Condition) -> np.ndarray:
+    """在类别上求值，末尾追加一个位置代表缺失值"""
+    table = np.append(_Evaluator(pd.Series(categories), column).evaluate(condition), False)
+    table[-1] = _negates_missing(condition)
+    return table
+
+
+def _negates_missing(condition: Condition) -> bool:
+    """缺失值是否满足条件（叶子条件对缺失值均为False，只有取反会改变结果）"""
+    if condition.op == "not":
+        return not _negates_missing(condition.value[0])
+    if condition.op == "and":
+        return all(_negates_missing(part) for part in condition.value)
+    if condition.op == "eq" and condition.value is None:
+        return True
+    return False
+
+
+def _arrow_scalar(value: Any, arrow_type: "pa.DataType") -> Optional["pa.Scalar"]:
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pa.scalar(str(value), type=arrow_type)
+    if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+        try:
+            number = float(value)
+            if pa.types.is_integer(arrow_type) and not number.is_integer():
+                return pa.scalar(number)
+            return pa.scalar(number).cast(arrow_type)
+        except (TypeError, ValueError, pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return None
+    return None
+
+
+def _arrow_condition(field: "pa_ds.Expression",
+                     arrow_type: "pa.DataType",
+                     condition: Condition) -> Optional["pa_ds.Expression"]:
+    if condition.op == "and":
+        parts = [p for p in (_arrow_condition(field, arrow_type, c) for c in condition.value) if p is not None]
+        if not parts:
+            return None
+        expression = parts[0]
+        for part in parts[1:]:
+            expression = expression & part
+        return expression
+    if condition.op == "not" or (condition.op == "eq" and condition.value is None):
+        return None
+    if condition.op == "in":
+        scalars = [_arrow_scalar(v, arrow_type) for v in condition.value]
+        if any(s is None or s.type != arrow_type for s in scalars):
+            return None
+        return field.isin(pa.array([s.as_py() for s in scalars], type=arrow_type)) if scalars else None
+
+    if condition.op != "eq" and (pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)):
+        # 文本列的范围条件可能按数值比较，不下推
+        return None
+    bounds: List[Tuple[str, Any]] = (
+        [("gte", condition.value[0]), ("lte", condition.value[1])] if condition.op == "between"
+        else [(condition.op, condition.value)]
+    )
+    expression = None
+    for op, value in bounds:
+        scalar = _arrow_scalar(value, arrow_type)
+        if scalar is None:
+            return None
+        part = {
+            "eq": lambda: field == scalar, "gt": lambda: field > scalar, "gte": lambda: field >= scalar,
+            "lt": lambda: field < scalar, "lte": lambda: field <= scalar,
+        }[op]()
+        expression = part if expression is None else expression & part
+    return expression
+
+
+def compile_filters(filters: Optional[Dict[str, Any]]) -> Optional[CompiledFilter]:
+    """解析过滤条件，没有条件时返回None"""
+    return CompiledFilter(filters) if filters else None
+
+
+def filter_mask(df: pd.DataFrame, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """把全部过滤条件合并成一个布尔行掩码，没有条件时返回None"""
+    compiled = compile_filters(filters)
+    return None if compiled is None else compiled.mask(df)
+
+
+def filter_frame(df: pd.DataFrame, filters: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """按全部过滤条件合并成一个布尔掩码后一次性筛选"""
+    mask = filter_mask(df, filters)
+    return df if mask is None else df[mask]
@@ -0,0 +1,459 @@
+"""
+增量相关性累加器存储
+针对只追加写入的数据文件，按 (数据集, 变量, 分组, 过滤条件, 派生字段) 持久化各分组可合并的二阶统计量，
+并记录已消费的位置（CSV为字节偏移，Parquet/Feather为行数）与已消费内容的指纹。
+文件追加新数据后只读取新增部分并合并进已有统计量，耗时与新增数据量成正比；
+文件被截断、原地改写或无法证明只是追加时自动全量重建。状态文件的数量与保存时间有上限，超出时删除最久未使用的。
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from cache_paths import cache_path
+from correlation_engine import CoMomentAccumulator
+from dataset_cache import parse_datetime_columns, read_dataset_columns, pq, pa_ds
+
+INCREMENTAL_FILE_TYPES = ['.csv', '.parquet', '.feather']
+
+# 存储格式版本，累加器结构变化时递增以废弃旧文件
+_STATE_VERSION = 4
+
+# 行哈希与行号混合用的常数（64位黄金分割数）
+_POSITION_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+@dataclass
+class AppendCursor:
+    """数据文件的已消费位置"""
+    size: int
+    """已消费的字节数（CSV）或读取时的文件大小"""
+    mtime_ns: int
+    rows: int
+    """已消费的数据行数"""
+    header: List[str] = field(default_factory=list)
+    """CSV表头，从字节偏移处续读时作为列名"""
+    prefix_digest: str = ""
+    """已消费部分的指纹：CSV为已消费字节的摘要，Parquet为所在行组列块压缩字节的摘要，Feather为逐行内容的可累加哈希"""
+
+
+@dataclass
+class AccumulatorState:
+    """持久化的累加器状态"""
+    accumulator: CoMomentAccumulator
+    cursor: AppendCursor
+    version: int = _STATE_VERSION
+
+
+@dataclass
+class IncrementalStoreConfig:
+    """增量累加器存储配置"""
+    store_dir: str = field(default_factory=lambda: cache_path("ACCUMULATOR_STORE_DIR", "accumulators"))
+    max_entries: int = field(default_factory=lambda: int(os.environ.get("ACCUMULATOR_STORE_MAX_ENTRIES", 256)))
+    """最多保留的状态文件数，超出时删除最久未使用的"""
+    max_age_days: float = field(default_factory=lambda: float(os.environ.get("ACCUMULATOR_STORE_MAX_AGE_DAYS", 30)))
+    """超过该天数未使用的状态文件被删除"""
+
+
+class _BoundedReader(io.RawIOBase):
+    """只读取到指定字节位置的文件句柄，避免读到统计期间新追加的数据；读到的字节同时计入 file_hash"""
+
+    def __init__(self, handle: io.BufferedReader, limit: int, file_hash):
+        self._handle = handle
+        self._remaining = limit
+        self._file_hash = file_hash
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._handle.read(size)
+        buffer[:len(data)] = data
+        self._file_hash.update(data)
+        self._remaining -= len(data)
+        return len(data)
+
+
+class AppendReader:
+    """从已消费位置开始按块读取新增数据，读取完成后 cursor 即为新的已消费位置"""
+
+    def __init__(self,
+                 file_path: Path,
+                 columns: Optional[List[str]],
+                 start: Optional[AppendCursor],
+                 chunk_rows: int,
+                 logger: logging.Logger,
+                 dtype: Optional[Dict[str, str]] = None,
+                 file_hash=None):
+        self.file_path = file_path
+        self.columns = columns
+        self.dtype = dtype
+        """固定CSV列的读取类型，各次续读保持一致"""
+        self.start = start
+        self.chunk_rows = chunk_rows
+        self.logger = logger
+        self.rows_read = 0
+
+        stat = file_path.stat()
+        self._end_size = stat.st_size
+        self._mtime_ns = stat.st_mtime_ns
+        self._file_ext = file_path.suffix.lower()
+        self._header = start.header if start else (
+            read_dataset_columns(file_path) if self._file_ext == '.csv' else []
+        )
+        # CSV 已消费字节的摘要随读取继续更新，续读时传入的 file_hash 已包含已消费部分
+        self._file_hash = file_hash if file_hash is not None else hashlib.sha1()
+        # Feather 的内容哈希可按块累加，续读时只需加上新增行
+        self._rows_hash = int(start.prefix_digest, 16) if start and self._file_ext == '.feather' else 0
+
+    @property
+    def resumed(self) -> bool:
+        """是否在已有统计量基础上续读"""
+        return self.start is not None
+
+    @property
+    def cursor(self) -> AppendCursor:
+        rows = (self.start.rows if self.start else 0) + self.rows_read
+        if self._file_ext == '.parquet':
+            return AppendCursor(size=self._end_size, mtime_ns=self._mtime_ns, rows=rows,
+                                prefix_digest=parquet_prefix_digest(self.file_path, rows))
+        if self._file_ext == '.feather':
+            return AppendCursor(size=self._end_size, mtime_ns=self._mtime_ns, rows=rows,
+                                prefix_digest=_format_rows_hash(self._rows_hash))
+        return AppendCursor(
+            size=self._end_size,
+            mtime_ns=self._mtime_ns,
+            rows=rows,
+            header=self._header,
+            prefix_digest=self._file_hash.hexdigest(),
+        )
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        for chunk in self._iter_raw():
+            if self._file_ext == '.feather':
+                position = (self.start.rows if self.start else 0) + self.rows_read
+                self._rows_hash = (self._rows_hash + rows_hash(chunk, position)) % 2 ** 64
+            self.rows_read += len(chunk)
+            chunk = parse_datetime_columns(chunk, self.logger)
+            yield chunk[self.columns] if self.columns is not None else chunk
+
+    def _iter_raw(self) -> Iterator[pd.DataFrame]:
+        if self._file_ext == '.csv':
+            yield from self._iter_csv()
+        elif self._file_ext == '.parquet':
+            yield from self._iter_parquet()
+        elif self._file_ext == '.feather':
+            yield from self._iter_feather()
+        else:
+            raise ValueError(f"增量读取仅支持 {INCREMENTAL_FILE_TYPES} 文件: {self._file_ext}")
+
+    def _iter_csv(self) -> Iterator[pd.DataFrame]:
+        offset = self.start.size if self.start else 0
+        if offset >= self._end_size:
+            return
+        with open(self.file_path, 'rb') as handle:
+            handle.seek(offset)
+            bounded = io.BufferedReader(_BoundedReader(handle, self._end_size - offset, self._file_hash))
+            if offset == 0:
+                reader = pd.read_csv(bounded, usecols=self.columns, chunksize=self.chunk_rows, dtype=self.dtype)
+            else:
+                # 续读部分没有表头，沿用首次读取时记录的列名
+                reader = pd.read_csv(bounded, header=None, names=self._header,
+                                     usecols=self.columns, chunksize=self.chunk_rows, dtype=self.dtype)
+            yield from reader
+
+    def _iter_parquet(self) -> Iterator[pd.DataFrame]:
+        if pq is None:
+            raise ValueError("增量读取Parquet文件需要安装pyarrow")
+        parquet_file = pq.ParquetFile(self.file_path)
+        skip = self.start.rows if self.start else 0
+        # 跳过已完整消费的行组，只解码包含新增数据的部分
+        row_groups = []
+        for i in range(parquet_file.num_row_groups):
+            group_rows = parquet_file.metadata.row_group(i).num_rows
+            if skip >= group_rows and not row_groups:
+                skip -= group_rows
+                continue
+            row_groups.append(i)
+        if not row_groups:
+            return
+        batches = parquet_file.iter_batches(batch_size=self.chunk_rows, row_groups=row_groups, columns=self.columns)
+        yield from _skip_rows(batches, skip)
+
+    def _iter_feather(self) -> Iterator[pd.DataFrame]:
+        if pa_ds is None:
+            raise ValueError("增量读取Feather文件需要安装pyarrow")
+        dataset = pa_ds.dataset(str(self.file_path), format="ipc")
+        batches = dataset.to_batches(columns=self.columns, batch_size=self.chunk_rows)
+        yield from _skip_rows(batches, self.start.rows if self.start else 0)
+
+
+def _skip_rows(batches, skip: int) -> Iterator[pd.DataFrame]:
+    """跳过前 skip 行后逐批转换为DataFrame"""
+    for batch in batches:
+        if skip >= batch.num_rows:
+            skip -= batch.num_rows
+            continue
+        if skip:
+            batch = batch.slice(skip)
+            skip = 0
+        yield batch.to_pandas()
+
+
+def _row_count(file_path: Path) -> int:
+    """从元数据读取Parquet/Feather文件的行数"""
+    if file_path.suffix.lower() == '.parquet':
+        return pq.ParquetFile(file_path).metadata.num_rows
+    return pa_ds.dataset(str(file_path), format="ipc").count_rows()
+
+
+def parquet_prefix_digest(file_path: Path, rows: int) -> str:
+    """前 rows 行所在行组各列块压缩字节的摘要（只读取字节，不解码）；rows 不在行组边界上时返回空字符串"""
+    metadata = pq.ParquetFile(file_path).metadata
+    digest = hashlib.sha1()
+    remaining = rows
+    with open(file_path, 'rb') as handle:
+        for i in range(metadata.num_row_groups):
+            if remaining == 0:
+                break
+            row_group = metadata.row_group(i)
+            if row_group.num_rows > remaining:
+                return ""
+            remaining -= row_group.num_rows
+            digest.update(str(row_group.num_rows).encode("utf-8"))
+            for j in range(row_group.num_columns):
+                column = row_group.column(j)
+                start = column.dictionary_page_offset if column.has_dictionary_page else column.data_page_offset
+                handle.seek(start)
+                digest.update(handle.read(column.total_compressed_size))
+    return digest.hexdigest() if remaining == 0 else ""
+
+
+def rows_hash(frame: pd.DataFrame, start_row: int) -> int:
+    """逐行内容哈希与行号混合后求和（按2^64取模）：可按块累加，行的内容或顺序变化都会改变结果"""
+    if frame.empty:
+        return 0
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    positions = np.arange(start_row, start_row + len(frame), dtype=np.uint64)
+    return int(pd.util.hash_array(hashes ^ (positions * _POSITION_MIX)).sum(dtype=np.uint64))
+
+
+def _format_rows_hash(value: int) -> str:
+    return f"{value:016x}"
+
+
+def feather_prefix_digest(file_path: Path, columns: Optional[List[str]], rows: int, chunk_rows: int) -> str:
+    """Feather文件前 rows 行的内容哈希（需要读取这部分数据，但不做解析与统计）；行数不足时返回空字符串"""
+    dataset = pa_ds.dataset(str(file_path), format="ipc")
+    total = 0
+    position = 0
+    for batch in dataset.to_batches(columns=columns, batch_size=chunk_rows):
+        if position >= rows:
+            break
+        batch = batch.slice(0, rows - position)
+        total = (total + rows_hash(batch.to_pandas(), position)) % 2 ** 64
+        position += batch.num_rows
+    return _format_rows_hash(total) if position == rows else ""
+
+
+def update_prefix_hash(file_hash, file_path: Path, size: int, block_bytes: int = 1 << 20) -> None:
+    """把文件前 size 字节计入摘要对象（只读取字节，不做解析）"""
+    with open(file_path, 'rb') as handle:
+        while size > 0:
+            data = handle.read(min(block_bytes, size))
+            if not data:
+                break
+            file_hash.update(data)
+            size -= len(data)
+
+
+class IncrementalAccumulatorStore:
+    """持久化的增量累加器存储"""
+
+    def __init__(self, config: IncrementalStoreConfig, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self.directory = Path(config.store_dir)
+        self._lock = threading.Lock()
+        self.resumed = 0
+        self.rebuilds = 0
+        self.appended_rows = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def applies_to(self, file_path: str) -> bool:
+        return Path(file_path).suffix.lower() in INCREMENTAL_FILE_TYPES
+
+    def make_key(self,
+                 file_path: str,
+                 columns: Optional[List[str]],
+                 variables: List[str],
+                 group_by: List[str],
+                 filters: Optional[Dict[str, Any]],
+                 derived_fields: Dict[str, List[str]]) -> str:
+        """由数据集与分析参数生成存储键"""
+        payload = json.dumps({
+            "path": str(Path(file_path).resolve()),
+            "columns": columns,
+            "variables": variables,
+            "group_by": group_by,
+            "filters": filters or {},
+            "derived_fields": derived_fields,
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def load(self, key: str) -> Optional[AccumulatorState]:
+        """读取已保存的状态，不存在、损坏或版本不符时返回None"""
+        path = self._path_for(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'rb') as handle:
+                state = pickle.load(handle)
+        except Exception as e:
+            self.logger.warning(f"增量累加器读取失败，将全量重建 {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        if not isinstance(state, AccumulatorState) or state.version != _STATE_VERSION:
+            return None
+        return state
+
+    def save(self, key: str, state: AccumulatorState) -> None:
+        """先写临时文件再原子替换，保证并发读取到的总是完整状态"""
+        path = self._path_for(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as handle:
+                pickle.dump(state, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.warning(f"增量累加器保存失败 {path.name}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        """删除超过保存期限的状态文件；数量超过上限时按最后使用时间（每次分析都会重写状态文件）淘汰最旧的"""
+        expire_before = time.time() - self.config.max_age_days * 86400
+        entries = []
+        expired = 0
+        for path in self.directory.glob("*.pkl"):
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime < expire_before:
+                path.unlink(missing_ok=True)
+                expired += 1
+            else:
+                entries.append((mtime, path))
+        entries.sort()
+        evicted = entries[:max(len(entries) - self.config.max_entries, 0)]
+        for _, path in evicted:
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self.expirations += expired
+            self.evictions += len(evicted)
+
+    def open(self,
+             file_path: str,
+             columns: Optional[List[str]],
+             state: Optional[AccumulatorState],
+             chunk_rows: int,
+             dtype: Optional[Dict[str, str]] = None) -> AppendReader:
+        """打开新增数据读取器；已保存的位置不再有效时从头读取，dtype 固定CSV列的读取类型"""
+        file_path_obj = Path(file_path).resolve()
+        start = state.cursor if state is not None else None
+        # CSV 校验时读过的已消费部分直接用于续读后的摘要，不再重复读取
+        file_hash = hashlib.sha1()
+        if start is not None and not self._is_append_of(file_path_obj, start, columns, chunk_rows, file_hash):
+            self.logger.info(f"数据文件不是在原有内容后追加，全量重建统计量: {file_path_obj.name}")
+            start = None
+            file_hash = hashlib.sha1()
+
+        reader = AppendReader(file_path_obj, columns, start, chunk_rows, self.logger, dtype, file_hash)
+        with self._lock:
+            if reader.resumed:
+                self.resumed += 1
+            else:
+                self.rebuilds += 1
+        return reader
+
+    def commit(self, key: str, reader: AppendReader, accumulator: CoMomentAccumulator) -> None:
+        """读取完成后保存新的统计量与已消费位置"""
+        cursor = reader.cursor
+        with self._lock:
+            self.appended_rows += reader.rows_read if reader.resumed else 0
+        if reader.resumed and reader.rows_read == 0 and cursor.size == reader.start.size:
+            # 文件没有新增数据，只刷新修改时间
+            cursor = replace(reader.start, mtime_ns=cursor.mtime_ns)
+        self.logger.info(f"增量统计: 本次读取{reader.rows_read}行, 累计{cursor.rows}行")
+        self.save(key, AccumulatorState(accumulator, cursor))
+
+    def _is_append_of(self,
+                      file_path: Path,
+                      cursor: AppendCursor,
+                      columns: Optional[List[str]],
+                      chunk_rows: int,
+                      file_hash) -> bool:
+        """判断当前文件是否只是在已消费内容之后追加了数据；CSV 已消费部分的字节计入 file_hash"""
+        stat = file_path.stat()
+        if stat.st_size < cursor.size:
+            return False
+        if stat.st_size == cursor.size and stat.st_mtime_ns == cursor.mtime_ns:
+            return True
+        file_ext = file_path.suffix.lower()
+        if file_ext != '.csv':
+            # Parquet/Feather 追加时整个文件重写，只有已消费部分的指纹不变才能视为追加（或内容未变）
+            if not cursor.prefix_digest or _row_count(file_path) < cursor.rows:
+                return False
+            if file_ext == '.parquet':
+                return parquet_prefix_digest(file_path, cursor.rows) == cursor.prefix_digest
+            return feather_prefix_digest(file_path, columns, cursor.rows, chunk_rows) == cursor.prefix_digest
+        if stat.st_size == cursor.size:
+            # 大小未变但修改时间变化，说明内容被原地改写
+            return False
+        # 只读取已消费部分的字节计算摘要（不做解析），中间任意位置被改写都能识别
+        update_prefix_hash(file_hash, file_path, cursor.size)
+        return file_hash.hexdigest() == cursor.prefix_digest
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "resumed": self.resumed,
+                "rebuilds": self.rebuilds,
+                "appended_rows": self.appended_rows,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_store: Optional[IncrementalAccumulatorStore] = None
+_store_lock = threading.Lock()
+
+
+def get_incremental_store(logger: Optional[logging.Logger] = None) -> IncrementalAccumulatorStore:
+    """获取进程内共享的增量累加器存储"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = IncrementalAccumulatorStore(IncrementalStoreConfig(), logger or logging.getLogger(__name__))
+        return _store
@@ -36,7 +36,10 @@ sys.path.append(str(PROJECT_ROOT / 'frontend'))
 from logger_config import create_logger
 from mcp.server.fastmcp import FastMCP
 from custom_types.types import ReadDataParam
-from correlation_server import correlation_analysis
+from correlation_server import correlation_analysis, correlation_analysis_result, CorrelationConfig, TableGenerator
+from correlation_result import CorrelationResult
+from dataset_cache import get_dataset_cache
+from filters import filter_frame
 
 # ===== 异常定义 =====
 class VisualizationError(Exception):
@@ -96,8 +99,9 @@ class VisualizationSession:
     conversation_history: List[Dict]     # 对话历史
     
     # 新增：相关性分析相关字段
-    correlation_result: Optional[str]    # 相关性分析原始结果（Markdown表格）
-    correlation_matrix: Optional[pd.DataFrame]  # 解析后的相关性矩阵
+    correlation_result: Optional[CorrelationResult]  # 相关性分析结构化结果
+    correlation_table: Optional[str]     # 相关性表格（Markdown），首次需要展示时才渲染
+    correlation_matrix: Optional[pd.DataFrame]  # 用于绘图的相关性矩阵（分组结果取第一个分组）
     correlation_vars: Optional[List[str]]  # 相关性分析变量
     correlation_method: str              # 相关性计算方法
     has_correlation_analysis: bool       # 是否包含相关性分析
@@ -124,22 +128,19 @@ class VisualizationSession:
         self.updated_at = datetime.now()
     
     def set_correlation_data(self, 
-                           correlation_result: str,
+                           correlation_result: CorrelationResult,
                            correlation_matrix: pd.DataFrame,
                            correlation_vars: List[str],
                            correlation_method: str):
         """设置相关性分析数据"""
         self.correlation_result = correlation_result
+        self.correlation_table = None
         self.correlation_matrix = correlation_matrix
         self.correlation_vars = correlation_vars
         self.correlation_method = correlation_method
         self.has_correlation_analysis = True
         self.updated_at = datetime.now()
     
-    def get_correlation_table(self) -> Optional[str]:
-        """获取相关性表格"""
-        return self.correlation_result
-    
     def get_correlation_matrix(self) -> Optional[pd.DataFrame]:
         """获取相关性矩阵（用于绘图）"""
         return self.correlation_matrix
@@ -172,6 +173,7 @@ class SessionManager:
             conversation_history=[],
             # 新增字段
             correlation_result=None,
+            correlation_table=None,
             correlation_matrix=None,
             correlation_vars=None,
             correlation_method="pearson",
@@ -232,29 +234,29 @@ class DataLoader:
     def __init__(self, config: VisualizationConfig):
         self.config = config
         self.logger = create_logger(app_name="data_loader", log_dir="./logs").get_logger()
+        self.dataset_cache = get_dataset_cache(self.logger)
     
-    async def load_data(self, read_data_param: ReadDataParam) -> pd.DataFrame:
-        """加载数据"""
+    async def load_data(self,
+                        read_data_param: ReadDataParam,
+                        filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """加载数据（经由进程级数据集缓存，同一文件只读取一次）；过滤条件在读取时应用，大文件下推到读取器"""
         try:
             file_path = Path(read_data_param.read_data_query).resolve()
             
             if not file_path.exists():
                 raise FileNotFoundError(f"文件不存在: {file_path}")
             
-            # 根据文件类型加载数据
             file_ext = file_path.suffix.lower()
-            
-            if file_ext == '.csv':
-                df = pd.read_csv(file_path)
-            elif file_ext in ['.xlsx', '.xls']:
-                df = pd.read_excel(file_path)
-            elif file_ext == '.json':
-                df = pd.read_json(file_path)
-            elif file_ext == '.parquet':
-                df = pd.read_parquet(file_path)
-            else:
+            if file_ext not in ['.csv', '.xlsx', '.xls', '.json', '.parquet']:
                 raise ValueError(f"不支持的文件类型: {file_ext}")
             
+            if filters:
+                missing_cols = [col for col in filters if col not in self.dataset_cache.get_columns(file_path)]
+                if missing_cols:
+                    raise ValueError(f"过滤列不存在: {missing_cols[0]}")
+            
+            df = self.dataset_cache.get_or_load(file_path, filters=filters)
+            
             self.logger.info(f"成功加载数据: {df.shape[0]}行 x {df.shape[1]}列")
             return df
             
@@ -262,18 +264,17 @@ class DataLoader:
             self.logger.error(f"数据加载失败: {e}")
             raise VisualizationError(f"数据加载失败: {str(e)}") from e
     
-    def apply_filters(self, df: pd.DataFrame, filters: Dict[str, str]) -> pd.DataFrame:
-        """应用过滤条件"""
+    def apply_filters(self, df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
+        """应用过滤条件（所有条件合并为一个掩码，只筛选一次）"""
         if not filters:
             return df
         
-        df_filtered = df.copy()
-        for col, value in filters.items():
-            if col not in df_filtered.columns:
+        for col in filters:
+            if col not in df.columns:
                 raise ValueError(f"过滤列不存在: {col}")
-            df_filtered = df_filtered[df_filtered[col] == value]
-            self.logger.debug(f"应用过滤条件 {col}={value}，剩余 {len(df_filtered)} 行")
         
+        df_filtered = filter_frame(df, filters)
+        self.logger.debug(f"应用过滤条件 {filters}，剩余 {len(df_filtered)} 行")
         return df_filtered
 
 # ===== 代码执行器 =====
@@ -390,118 +391,6 @@ class SafeCodeExecutor:
             plt.close('all')
             raise ChartGenerationError(f"代码执行失败: {str(e)}")
 
-# ===== 相关性结果解析器 =====
-class CorrelationResultParser:
-    """相关性结果解析器"""
-    
-    def __init__(self):
-        self.logger = create_logger(app_name="corr_parser", log_dir="./logs").get_logger()
-    
-    def parse_to_matrix(self, correlation_result: str, variables: List[str]) -> pd.DataFrame:
-        """将Markdown表格解析为数值矩阵"""
-        try:
-            # 检查是否有分组
-            if "**" in correlation_result and "-" in correlation_result:
-                # 分组相关性分析，取第一个分组
-                return self._parse_grouped_correlation(correlation_result, variables)
-            else:
-                # 简单相关性矩阵
-                return self._parse_simple_correlation(correlation_result, variables)
-                
-        except Exception as e:
-            self.logger.error(f"相关性结果解析失败: {e}")
-            # 如果解析失败，创建一个示例矩阵
-            return self._create_dummy_matrix(variables)
-    
-    def _parse_simple_correlation(self, result: str, variables: List[str]) -> pd.DataFrame:
-        """解析简单相关性矩阵"""
-        lines = result.strip().split('\n')
-        
-        # 找到表格开始位置
-        table_start = -1
-        for i, line in enumerate(lines):
-            if '| 变量 |' in line:
-                table_start = i
-                break
-        
-        if table_start == -1:
-            raise ValueError("无法找到相关性矩阵表格")
-        
-        # 解析表格数据
-        matrix_data = {}
-        data_lines = lines[table_start + 2:]  # 跳过表头和分隔线
-        
-        for line in data_lines:
-            if not line.strip() or not line.startswith('|'):
-                continue
-                
-            parts = [p.strip() for p in line.split('|')[1:-1]]  # 去掉首尾空元素
-            if len(parts) < len(variables) + 1:
-                continue
-                
-            row_var = parts[0]
-            for i, col_var in enumerate(variables):
-                if i + 1 < len(parts):
-                    try:
-                        value_str = parts[i + 1]
-                        if value_str == "数据不足":
-                            value = 0.0
-                        elif value_str == "1.000":
-                            value = 1.0 if row_var == col_var else 0.0
-                        else:
-                            value = float(value_str)
-                        matrix_data[(row_var, col_var)] = value
-                    except (ValueError, IndexError):
-                        matrix_data[(row_var, col_var)] = 0.0
-        
-        # 构建DataFrame
-        matrix = pd.DataFrame(index=variables, columns=variables)
-        for var1 in variables:
-            for var2 in variables:
-                matrix.loc[var1, var2] = matrix_data.get((var1, var2), 1.0 if var1 == var2 else 0.0)
-        
-        return matrix.astype(float)
-    
-    def _parse_grouped_correlation(self, result: str, variables: List[str]) -> pd.DataFrame:
-        """解析分组相关性矩阵，取第一个分组"""
-        # 简化实现：找到第一个表格并解析
-        lines = result.strip().split('\n')
-        
-        # 找到第一个表格
-        table_start = -1
-        for i, line in enumerate(lines):
-            if '| 变量 |' in line:
-                table_start = i
-                break
-        
-        if table_start != -1:
-            # 提取第一个表格的内容
-            table_lines = []
-            for line in lines[table_start:]:
-                if line.strip() and ('|' in line):
-                    table_lines.append(line)
-                elif line.strip() == "" and table_lines:
-                    break  # 表格结束
-            
-            if table_lines:
-                table_content = '\n'.join(table_lines)
-                return self._parse_simple_correlation(table_content, variables)
-        
-        # 如果解析失败，返回示例矩阵
-        return self._create_dummy_matrix(variables)
-    
-    def _create_dummy_matrix(self, variables: List[str]) -> pd.DataFrame:
-        """创建示例相关性矩阵"""
-        n = len(variables)
-        # 创建随机相关性矩阵
-        np.random.seed(42)
-        matrix = np.random.rand(n, n)
-        matrix = (matrix + matrix.T) / 2  # 确保对称
-        np.fill_diagonal(matrix, 1.0)  # 对角线为1
-        
-        self.logger.warning(f"使用示例相关性矩阵，变量: {variables}")
-        return pd.DataFrame(matrix, index=variables, columns=variables)
-
 # ===== 主要实现类 =====
 class InteractiveVisualizationMCP:
     """交互式可视化MCP实现类"""
@@ -511,16 +400,22 @@ class InteractiveVisualizationMCP:
         self.session_manager = SessionManager(self.config)
         self.data_loader = DataLoader(self.config)
         self.code_executor = SafeCodeExecutor(self.config)
-        self.correlation_parser = CorrelationResultParser()
         self.data_cache = {}  # 简单的数据缓存
         self.logger = create_logger(app_name="interactive_viz", log_dir="./logs").get_logger()
+        self.table_generator = TableGenerator(CorrelationConfig(), self.logger)
+    
+    def get_correlation_table(self, session: VisualizationSession) -> Optional[str]:
+        """会话的相关性表格，首次需要展示时才由结构化结果渲染为Markdown"""
+        if session.correlation_table is None and session.correlation_result is not None:
+            session.correlation_table = self.table_generator.render(session.correlation_result)
+        return session.correlation_table
     
     async def start_session_impl(self, 
                                 user_request: str,
                                 read_data_param: ReadDataParam,
                                 correlation_vars: Optional[List[str]] = None,
                                 correlation_method: str = "pearson",
-                                filters: Optional[Dict[str, str]] = None,
+                                filters: Optional[Dict[str, Any]] = None,
                                 group_by: Optional[List[str]] = None,
                                 include_correlation_table: bool = False) -> str:
         """开始会话的具体实现"""
@@ -531,7 +426,7 @@ class InteractiveVisualizationMCP:
             # 1. 准备数据和相关性结果
             data_df, correlation_result, correlation_matrix = await self._prepare_data_and_correlation_enhanced(
                 read_data_param, correlation_vars, correlation_method,
-                filters, group_by, user_request, include_correlation_table
+                filters, group_by, user_request
             )
             
             # 2. 缓存数据
@@ -590,7 +485,7 @@ class InteractiveVisualizationMCP:
             
             # 11. 如果需要相关性表格，添加到结果中
             if include_correlation_table and correlation_result:
-                result["correlation_table"] = correlation_result
+                result["correlation_table"] = self.get_correlation_table(self.session_manager.get_session(session_id))
                 result["message"] += " 相关性表格也已包含在结果中。"
             
             # 12. 如果有相关性分析，添加相关信息
@@ -731,10 +626,9 @@ class InteractiveVisualizationMCP:
                                                    read_data_param: ReadDataParam,
                                                    correlation_vars: Optional[List[str]],
                                                    correlation_method: str,
-                                                   filters: Optional[Dict[str, str]],
+                                                   filters: Optional[Dict[str, Any]],
                                                    group_by: Optional[List[str]],
-                                                   user_request: str,
-                                                   include_correlation_table: bool) -> Tuple[pd.DataFrame, Optional[str], Optional[pd.DataFrame]]:
+                                                   user_request: str) -> Tuple[pd.DataFrame, Optional[CorrelationResult], Optional[pd.DataFrame]]:
         """准备数据和相关性结果（增强版）"""
         
         correlation_result = None
@@ -750,7 +644,7 @@ class InteractiveVisualizationMCP:
         if need_correlation and correlation_vars:
             # 执行相关性分析
             self.logger.info(f"执行相关性分析: {correlation_vars}")
-            correlation_result = await correlation_analysis(
+            correlation_result = await correlation_analysis_result(
                 read_data_param=read_data_param,
                 correlation_vars=correlation_vars,
                 correlation_method=correlation_method,
@@ -758,29 +652,23 @@ class InteractiveVisualizationMCP:
                 group_by=group_by
             )
             
-            # 解析相关性结果为矩阵
-            correlation_matrix = self.correlation_parser.parse_to_matrix(correlation_result, correlation_vars)
-            
-            # 如果不需要表格，只返回矩阵和空的相关性结果
-            if not include_correlation_table:
-                # 保留原始结果用于会话缓存，但不在响应中返回
-                data_df = correlation_matrix
-                return data_df, correlation_result, correlation_matrix
-            else:
-                # 既要表格又要图表
-                data_df = correlation_matrix
-                return data_df, correlation_result, correlation_matrix
+            # 直接使用结构化结果中的矩阵，表格只在需要展示时渲染
+            correlation_matrix = self._correlation_matrix(correlation_result)
+            return correlation_matrix, correlation_result, correlation_matrix
         
         else:
             # 直接加载原始数据
-            df = await self.data_loader.load_data(read_data_param)
-            
-            # 应用过滤条件
-            if filters:
-                df = self.data_loader.apply_filters(df, filters)
+            df = await self.data_loader.load_data(read_data_param, filters)
             
             return df, None, None
     
+    def _correlation_matrix(self, correlation_result: CorrelationResult) -> pd.DataFrame:
+        """用于绘图的相关性矩阵；分组结果取第一个分组"""
+        if correlation_result.groups:
+            self.logger.info(f"分组相关性结果共{len(correlation_result.groups)}个分组，"
+                             f"使用第一个分组绘图: {correlation_result.groups[0]}")
+        return correlation_result.to_frame()
+    
     def _get_data_info(self, df: pd.DataFrame) -> Dict:
         """获取数据信息供LLM参考"""
         numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
@@ -825,7 +713,7 @@ async def start_visualization_session(
     read_data_param: ReadDataParam,
     correlation_vars: Optional[List[str]] = None,
     correlation_method: str = "pearson",
-    filters: Optional[Dict[str, str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
     group_by: Optional[List[str]] = None,
     include_correlation_table: bool = False
 ) -> str:
@@ -838,7 +726,7 @@ async def start_visualization_session(
     仅在需要进行相关性分析时，提供相关性分析变量。相关性分析变量需要是数据中的列名，且数据类型为数值型。
     :param correlation_vars: 相关性分析变量（可选）
     :param correlation_method: 相关性计算方法（可选，默认pearson）
-    :param filters: 数据过滤条件（可选）
+    :param filters: 数据过滤条件（可选），格式：{列名: 条件}，条件可以是值、列表或运算符字典（eq/ne/in/not_in/gt/gte/lt/lte/between/not），与 correlation_analysis 相同
     :param group_by: 分组条件（可选）
     :param include_correlation_table: 是否同时返回相关性表格（可选，默认False）
     #---------返回值---------#
@@ -943,7 +831,7 @@ async def visualization_with_correlation_table(
     read_data_param: ReadDataParam,
     correlation_vars: List[str],
     correlation_method: str = "pearson",
-    filters: Optional[Dict[str, str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
     group_by: Optional[List[str]] = None
 ) -> str:
     """
@@ -956,7 +844,7 @@ async def visualization_with_correlation_table(
     :param correlation_vars: 相关性分析变量（必填，需要是数据中的数值型列名）
     #---------可选参数---------#
     :param correlation_method: 相关性计算方法（可选，默认pearson）
-    :param filters: 数据过滤条件（可选）
+    :param filters: 数据过滤条件（可选），格式：{列名: 条件}，条件可以是值、列表或运算符字典（eq/ne/in/not_in/gt/gte/lt/lte/between/not），与 correlation_analysis 相同
     :param group_by: 分组条件（可选）
     #---------返回值---------#
     :return: JSON格式结果，包含：session_id, chart_path, correlation_table, message
@@ -976,7 +864,7 @@ async def get_correlation_table_only(
     read_data_param: ReadDataParam,
     correlation_vars: List[str],
     correlation_method: str = "pearson",
-    filters: Optional[Dict[str, str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
     group_by: Optional[List[str]] = None
 ) -> str:
     """
@@ -987,7 +875,7 @@ async def get_correlation_table_only(
     :param correlation_vars: 相关性分析变量（必填，需要是数据中的数值型列名）
     #---------可选参数---------#
     :param correlation_method: 相关性计算方法（可选，默认pearson）
-    :param filters: 数据过滤条件（可选）
+    :param filters: 数据过滤条件（可选），格式：{列名: 条件}，条件可以是值、列表或运算符字典（eq/ne/in/not_in/gt/gte/lt/lte/between/not），与 correlation_analysis 相同
     :param group_by: 分组条件（可选）
     #---------返回值---------#
     :return: 相关性分析表格的Markdown格式文本
@@ -1025,7 +913,7 @@ async def get_correlation_table_from_session(session_id: str) -> str:
         if not session.has_correlation_analysis:
             return f"会话 {session_id} 中没有相关性分析数据。请使用包含相关性分析的会话或重新开始相关性分析。"
         
-        correlation_table = session.get_correlation_table()
+        correlation_table = viz_mcp_instance.get_correlation_table(session)
         if not correlation_table:
             return f"会话 {session_id} 中的相关性表格数据缺失。"
         
@@ -1112,7 +1000,7 @@ async def start_correlation_analysis_only(
     read_data_param: ReadDataParam,
     correlation_vars: List[str],
     correlation_method: str = "pearson",
-    filters: Optional[Dict[str, str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
     group_by: Optional[List[str]] = None
 ) -> str:
     """
@@ -1121,13 +1009,16 @@ async def start_correlation_analysis_only(
     :param read_data_param: 数据源参数
     :param correlation_vars: 相关性分析变量
     :param correlation_method: 相关性计算方法（默认pearson）
-    :param filters: 数据过滤条件（可选）
+    :param filters: 数据过滤条件（可选），格式：{列名: 条件}，条件可以是值、列表或运算符字典（eq/ne/in/not_in/gt/gte/lt/lte/between/not），与 correlation_analysis 相同
     :param group_by: 分组条件（可选）
     :return: 会话信息和相关性表格
     """
     try:
-        # 1. 执行相关性分析
-        correlation_result = await correlation_analysis(
+        # 1. 加载原始数据（用于数据信息），相关性分析随后直接命中数据集缓存，文件只读取一次
+        original_df = await viz_mcp_instance.data_loader.load_data(read_data_param, filters)
+        
+        # 2. 执行相关性分析
+        correlation_result = await correlation_analysis_result(
             read_data_param=read_data_param,
             correlation_vars=correlation_vars,
             correlation_method=correlation_method,
@@ -1135,15 +1026,8 @@ async def start_correlation_analysis_only(
             group_by=group_by
         )
         
-        # 2. 解析相关性结果为矩阵
-        correlation_matrix = viz_mcp_instance.correlation_parser.parse_to_matrix(
-            correlation_result, correlation_vars
-        )
-        
-        # 3. 加载原始数据（用于数据信息）
-        original_df = await viz_mcp_instance.data_loader.load_data(read_data_param)
-        if filters:
-            original_df = viz_mcp_instance.data_loader.apply_filters(original_df, filters)
+        # 3. 取出用于绘图的相关性矩阵
+        correlation_matrix = viz_mcp_instance._correlation_matrix(correlation_result)
         
         # 4. 缓存数据
         data_key = f"data_{int(time.time())}_{random.randint(1000, 9999)}"
@@ -1180,7 +1064,7 @@ async def start_correlation_analysis_only(
         result = {
             "session_id": session_id,
             "session_type": "correlation_only",
-            "correlation_table": correlation_result,
+            "correlation_table": viz_mcp_instance.get_correlation_table(session),
             "correlation_vars": correlation_vars,
             "correlation_method": correlation_method,
             "message": "相关性分析完成。您可以使用 visualize_existing_correlation 基于此结果生成图表。"
@@ -0,0 +1,181 @@
+"""
+列名映射缓存
+以 (数据表结构哈希, 用户意图列) 为键，把大模型给出的列名映射保存在本地SQLite数据库中，
+同一台机器上的多个服务进程共享，服务重启后仍然有效；同一表结构与意图只需调用一次大模型。
+含有未能映射（None）的结果不缓存，缓存的映射超过有效期后重新调用大模型。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from cache_paths import cache_path
+
+
+@dataclass
+class MappingCacheConfig:
+    """列名映射缓存配置"""
+    db_path: str = field(default_factory=lambda: cache_path("COLUMN_MAPPING_DB", "column_mappings.sqlite"))
+    timeout_seconds: float = 10.0
+    """等待其他进程释放写锁的时间"""
+    ttl_seconds: float = field(default_factory=lambda: float(os.environ.get("COLUMN_MAPPING_TTL_SECONDS", 7 * 86400)))
+    """映射的有效期，不大于0时永不过期"""
+
+
+def schema_hash(columns: Sequence[str]) -> str:
+    """数据表结构哈希（与列的顺序无关）"""
+    payload = json.dumps(sorted(columns), ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _has_missing(value: Any) -> bool:
+    """映射结果（含嵌套的依赖映射）中是否有未能映射的值"""
+    if isinstance(value, dict):
+        return any(_has_missing(v) for v in value.values())
+    return value is None
+
+
+class ColumnMappingCache:
+    """基于SQLite的列名映射缓存，进程内另有一层内存缓存"""
+
+    def __init__(self, config: MappingCacheConfig, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self.db_path = Path(config.db_path)
+        self._memory: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        """(表结构哈希, 意图) -> (映射JSON, 写入时间)"""
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=self.config.timeout_seconds)
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS column_mappings ("
+                " schema_hash TEXT NOT NULL,"
+                " intent TEXT NOT NULL,"
+                " mapping TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (schema_hash, intent))"
+            )
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def _intent_key(intent_cols: Sequence[str]) -> str:
+        return json.dumps(sorted(intent_cols), ensure_ascii=False)
+
+    def _expired(self, created_at: float) -> bool:
+        return self.config.ttl_seconds > 0 and time.time() - created_at > self.config.ttl_seconds
+
+    def get(self, exist_cols: Sequence[str], intent_cols: Sequence[str]) -> Optional[Dict[str, Optional[str]]]:
+        """读取缓存的映射，每次返回新的字典，调用方可自由修改；过期的映射删除后按未命中处理"""
+        key = (schema_hash(exist_cols), self._intent_key(intent_cols))
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is None:
+            try:
+                with self._lock, closing(self._connect()) as conn:
+                    entry = conn.execute(
+                        "SELECT mapping, created_at FROM column_mappings WHERE schema_hash = ? AND intent = ?", key
+                    ).fetchone()
+            except sqlite3.Error as e:
+                self.logger.warning(f"读取列名映射缓存失败: {e}")
+                entry = None
+
+        if entry is not None and self._expired(entry[1]):
+            self._delete(key)
+            with self._lock:
+                self.expirations += 1
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._memory[key] = tuple(entry)
+        return json.loads(entry[0])
+
+    def put(self, exist_cols: Sequence[str], intent_cols: Sequence[str], mapping: Dict[str, Optional[str]]) -> None:
+        """保存映射结果；含有未能映射的值时不保存，下次请求重新调用大模型"""
+        if _has_missing(mapping):
+            self.logger.info(f"列名映射含有未能映射的值，不缓存: {mapping}")
+            return
+        key = (schema_hash(exist_cols), self._intent_key(intent_cols))
+        payload = json.dumps(mapping, ensure_ascii=False)
+        created_at = time.time()
+        with self._lock:
+            self._memory[key] = (payload, created_at)
+            try:
+                with closing(self._connect()) as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO column_mappings (schema_hash, intent, mapping, created_at)"
+                        " VALUES (?, ?, ?, ?)",
+                        (*key, payload, created_at)
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                self.logger.warning(f"写入列名映射缓存失败: {e}")
+
+    def _delete(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            try:
+                with closing(self._connect()) as conn:
+                    conn.execute("DELETE FROM column_mappings WHERE schema_hash = ? AND intent = ?", key)
+                    conn.commit()
+            except sqlite3.Error as e:
+                self.logger.warning(f"删除列名映射缓存失败: {e}")
+
+    def clear(self) -> int:
+        """清空全部缓存的映射（包括其他进程写入的），返回删除的条数"""
+        with self._lock:
+            self._memory.clear()
+            try:
+                with closing(self._connect()) as conn:
+                    deleted = conn.execute("DELETE FROM column_mappings").rowcount
+                    conn.commit()
+            except sqlite3.Error as e:
+                self.logger.warning(f"清空列名映射缓存失败: {e}")
+                return 0
+        self.logger.info(f"已清空列名映射缓存: {deleted} 条")
+        return deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "db_path": str(self.db_path),
+                "memory_entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "ttl_seconds": self.config.ttl_seconds,
+            }
+
+
+_cache: Optional[ColumnMappingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_mapping_cache(logger: Optional[logging.Logger] = None) -> ColumnMappingCache:
+    """获取进程内共享的列名映射缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ColumnMappingCache(MappingCacheConfig(), logger or logging.getLogger(__name__))
+        return _cache
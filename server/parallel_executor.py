@@ -0,0 +1,153 @@
+"""
+分组相关性并行执行器
+按行数将分组均衡地划分到进程池，列数据通过共享内存一次性传给子进程，结果按分组编号合并
+"""
+
+import atexit
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from correlation_engine import kendall_matrix
+
+
+def _kendall_task(block: np.ndarray) -> np.ndarray:
+    """单个分组的Kendall相关矩阵（两变量时取[0, 1]即为相关系数）"""
+    return kendall_matrix(block)
+
+
+# 可在子进程中执行的分组任务，按名称分发以避免序列化函数对象。
+# Pearson/Spearman 由分组充分统计量一次向量化完成，没有逐组任务；服务中也没有逐组重抽样（bootstrap）计算，
+# 需要时在此注册即可
+GROUP_TASKS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "kendall": _kendall_task,
+}
+
+def _run_partition(task: str,
+                   segment_name: str,
+                   shape: Tuple[int, int],
+                   ranges: List[Tuple[int, int, int]]) -> List[Tuple[int, np.ndarray]]:
+    """子进程入口：挂载共享内存并对分片内的每个分组执行任务，结束时解除映射，子进程不长期占用已释放的数据"""
+    segment = shared_memory.SharedMemory(name=segment_name, track=False)
+    try:
+        return _run_tasks(GROUP_TASKS[task], segment.buf, shape, ranges)
+    finally:
+        try:
+            segment.close()
+        except BufferError:
+            # 任务异常时回溯仍引用映射数组，回溯释放后由垃圾回收解除映射
+            pass
+
+
+def _run_tasks(func: Callable[[np.ndarray], np.ndarray],
+               buffer: memoryview,
+               shape: Tuple[int, int],
+               ranges: List[Tuple[int, int, int]]) -> List[Tuple[int, np.ndarray]]:
+    """以零拷贝方式映射为数组后逐组执行，返回前释放对映射的引用"""
+    values = np.ndarray(shape, dtype=np.float64, buffer=buffer)
+    try:
+        return [(group_id, func(values[start:end])) for group_id, start, end in ranges]
+    finally:
+        del values
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """惰性创建进程池并在进程内复用；使用spawn避免在多线程事件循环中fork"""
+    global _pool, _pool_size
+    if _pool is None or _pool_size != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        _pool_size = workers
+    return _pool
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ParallelGroupExecutor:
+    """分组并行执行器"""
+
+    def __init__(self, config, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+
+    def should_parallelize(self, n_groups: int, n_rows: int) -> bool:
+        """分组数与数据量足够大时才值得承担进程间调度开销"""
+        return (self.config.parallel_workers > 1
+                and n_groups >= self.config.parallel_min_groups
+                and n_rows >= self.config.parallel_min_rows)
+
+    def run(self,
+            values: np.ndarray,
+            codes: np.ndarray,
+            group_ids: np.ndarray,
+            task: str) -> Dict[int, np.ndarray]:
+        """
+        对指定分组并行执行任务
+
+        :param values: 二维数值数组（行=样本，列=变量）
+        :param codes: 每一行所属分组编号
+        :param group_ids: 需要计算的分组编号
+        :param task: GROUP_TASKS 中的任务名称
+        :return: {分组编号: 任务结果}
+        """
+        if task not in GROUP_TASKS:
+            raise ValueError(f"不支持的并行任务: {task}")
+
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        starts = np.searchsorted(sorted_codes, group_ids, side="left")
+        ends = np.searchsorted(sorted_codes, group_ids, side="right")
+
+        data = np.ascontiguousarray(values[order], dtype=np.float64)
+        partitions = self._partition(group_ids, starts, ends)
+        self.logger.info(f"并行计算 {len(group_ids)} 个分组: {len(partitions)} 个分片, "
+                         f"{self.config.parallel_workers} 个进程")
+
+        segment = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        try:
+            np.ndarray(data.shape, dtype=np.float64, buffer=segment.buf)[:] = data
+            pool = _get_pool(self.config.parallel_workers)
+            futures = [
+                pool.submit(_run_partition, task, segment.name, data.shape, ranges)
+                for ranges in partitions
+            ]
+
+            results = {}
+            for future in futures:
+                for group_id, value in future.result():
+                    results[group_id] = value
+            return results
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def _partition(self,
+                   group_ids: np.ndarray,
+                   starts: np.ndarray,
+                   ends: np.ndarray) -> List[List[Tuple[int, int, int]]]:
+        """按累计行数把分组切成若干连续分片，分片数为进程数的数倍以平衡负载"""
+        n_partitions = min(len(group_ids), self.config.parallel_workers * 4)
+        sizes = (ends - starts).astype(np.float64)
+        # 以 n·log n 估计单组开销
+        cost = np.cumsum(sizes * np.log2(np.maximum(sizes, 2)))
+        boundaries = np.searchsorted(cost, cost[-1] * np.arange(1, n_partitions) / n_partitions)
+
+        partitions = []
+        for chunk in np.split(np.arange(len(group_ids)), boundaries):
+            if chunk.size:
+                partitions.append([
+                    (int(group_ids[i]), int(starts[i]), int(ends[i])) for i in chunk
+                ])
+        return partitions
@@ -0,0 +1,158 @@
+"""
+相关性分析结果缓存
+按 (数据集指纹, 列名映射, 过滤条件, 分组, 方法, 最小样本数等参数) 缓存最终结果，
+相同的分析请求（例如可视化服务反复调用）直接返回，不再重新计算。
+内存中按LRU淘汰并设置过期时间，可选持久化到磁盘以便服务重启后继续使用。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass
+class ResultCacheConfig:
+    """结果缓存配置"""
+    max_entries: int = field(default_factory=lambda: int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 256)))
+    ttl_seconds: float = field(default_factory=lambda: float(os.environ.get("RESULT_CACHE_TTL_SECONDS", 3600)))
+    persist_dir: Optional[str] = field(default_factory=lambda: os.environ.get("RESULT_CACHE_DIR") or None)
+    """设置后结果同时写入该目录，未设置时只缓存在内存中"""
+
+
+class ResultCache:
+    """LRU + TTL 的分析结果缓存"""
+
+    def __init__(self, config: ResultCacheConfig, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self.directory = Path(config.persist_dir) if config.persist_dir else None
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(**params: Any) -> str:
+        """由请求参数生成缓存键，参数需可JSON序列化（元组、枚举等按字符串处理）"""
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取未过期的结果，内存未命中时再查找磁盘"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        from_disk = entry is None
+        if from_disk:
+            entry = self._load(key)
+        with self._lock:
+            if entry is not None and entry[0] <= now:
+                self._entries.pop(key, None)
+                self._remove_file(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._insert(key, entry)
+        return entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        """写入结果（需可JSON序列化）并按容量淘汰最久未使用的条目"""
+        entry = (time.time() + self.config.ttl_seconds, value)
+        with self._lock:
+            self._insert(key, entry)
+        self._save(key, entry)
+
+    def _insert(self, key: str, entry: Tuple[float, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.config.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[Tuple[float, Any]]:
+        if self.directory is None:
+            return None
+        path = self._path_for(key)
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return float(data["expires_at"]), data["result"]
+        except Exception as e:
+            self.logger.warning(f"结果缓存文件损坏，已删除 {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def _remove_file(self, key: str) -> None:
+        if self.directory is not None:
+            self._path_for(key).unlink(missing_ok=True)
+
+    def _save(self, key: str, entry: Tuple[float, Any]) -> None:
+        if self.directory is None:
+            return
+        path = self._path_for(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps({"expires_at": entry[0], "result": entry[1]}, ensure_ascii=False),
+                                encoding="utf-8")
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.warning(f"结果缓存写入失败 {path.name}: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """清除全部结果（含磁盘）"""
+        with self._lock:
+            self._entries.clear()
+        if self.directory is not None and self.directory.exists():
+            for path in self.directory.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.config.max_entries,
+                "ttl_seconds": self.config.ttl_seconds,
+                "persistent": self.directory is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache(logger: Optional[logging.Logger] = None) -> ResultCache:
+    """获取进程内共享的结果缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(ResultCacheConfig(), logger or logging.getLogger(__name__))
+        return _cache
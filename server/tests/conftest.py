@@ -0,0 +1,16 @@
+"""
+pytest 公共配置
+服务模块以 server/ 为根目录平铺导入，测试同样把该目录加入导入路径；
+本地缓存（旁路文件、累加器、列名映射等）写入临时目录，不影响项目下的 cache
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault("ANALYSIS_CACHE_DIR", tempfile.mkdtemp(prefix="analysis-cache-"))
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+if str(SERVER_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVER_DIR))
@@ -0,0 +1,139 @@
+"""分析执行层：请求名额与排队、事件循环不被阻塞、按事件循环创建信号量、配置冲突警告"""
+
+import asyncio
+import logging
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import analysis_executor
+from analysis_executor import AnalysisExecutor, get_analysis_executor
+
+LOGGER = logging.getLogger("test_analysis_executor")
+
+
+@pytest.fixture
+def executor():
+    executor = AnalysisExecutor(max_workers=4, max_concurrent_requests=2, max_queued_requests=8, logger=LOGGER)
+    yield executor
+    executor._pool.shutdown(wait=True)
+
+
+async def _wait_until(condition) -> None:
+    for _ in range(1000):
+        if condition():
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError("等待超时")
+
+
+def test_requests_beyond_slots_wait_and_loop_stays_responsive(executor):
+    release = threading.Event()
+    running = []
+    peak = []
+
+    def work(i):
+        running.append(i)
+        peak.append(len(running))
+        release.wait(5)
+        running.remove(i)
+        return i
+
+    async def request(i):
+        async with executor.request_slot():
+            return await executor.run("work", work, i)
+
+    async def main():
+        tasks = [asyncio.create_task(request(i)) for i in range(5)]
+        await _wait_until(lambda: len(running) == 2)
+
+        # 两个请求在工作线程中阻塞时，事件循环仍可调度其他协程，其余请求排队
+        ticks = 0
+        for _ in range(20):
+            await asyncio.sleep(0)
+            ticks += 1
+        metrics = executor.get_metrics()
+        assert ticks == 20
+        assert (metrics["active_requests"], metrics["queued_requests"]) == (2, 3)
+        assert len(running) == 2
+
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(main()) == [0, 1, 2, 3, 4]
+    assert max(peak) == 2
+    metrics = executor.get_metrics()
+    assert (metrics["completed_requests"], metrics["active_requests"], metrics["queued_requests"]) == (5, 0, 0)
+    assert metrics["stages"]["work"]["calls"] == 5
+
+
+def test_full_queue_rejects(executor):
+    executor.max_queued_requests = 1
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def hold():
+            async with executor.request_slot():
+                await gate.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(3)]  # 两个占用名额，一个排队
+        await _wait_until(lambda: executor.get_metrics()["queued_requests"] == 1)
+        with pytest.raises(RuntimeError, match="排队已满"):
+            async with executor.request_slot():
+                pass
+        gate.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert executor.get_metrics()["rejected_requests"] == 1
+
+
+def test_stage_failure_recorded(executor):
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(executor.run("load", fail))
+    assert executor.get_metrics()["stages"]["load"]["failures"] == 1
+
+
+def test_semaphore_per_event_loop(executor):
+    async def slot_semaphore():
+        # 名额用尽时排队，信号量必须属于当前事件循环
+        gate = asyncio.Event()
+
+        async def hold():
+            async with executor.request_slot():
+                await gate.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(3)]
+        await _wait_until(lambda: executor.get_metrics()["queued_requests"] == 1)
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert executor._semaphore() is executor._semaphore()
+        return executor._semaphore()
+
+    first = asyncio.run(slot_semaphore())
+    second = asyncio.run(slot_semaphore())
+    assert first is not second
+    assert executor.get_metrics()["completed_requests"] == 6
+
+
+def _config(workers=4, concurrent=4, queued=64):
+    return SimpleNamespace(analysis_workers=workers, max_concurrent_analyses=concurrent, max_queued_analyses=queued)
+
+
+def test_conflicting_config_warns(monkeypatch, caplog):
+    monkeypatch.setattr(analysis_executor, "_executor", None)
+    shared = get_analysis_executor(_config(), LOGGER)
+    try:
+        with caplog.at_level(logging.WARNING, logger=LOGGER.name):
+            assert get_analysis_executor(_config(), LOGGER) is shared
+            assert caplog.records == []
+            assert get_analysis_executor(_config(concurrent=8), LOGGER) is shared
+        assert "max_concurrent_requests=4 (忽略 8)" in caplog.text
+        assert shared.max_concurrent_requests == 4
+    finally:
+        shared._pool.shutdown(wait=True)
@@ -0,0 +1,79 @@
+"""列索引：编码、分组行号映射与按索引过滤"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from column_index import build_column_index
+from dataset_cache import DatasetCache, DatasetCacheConfig
+from filters import compile_filters
+
+
+@pytest.fixture
+def values():
+    return pd.Series(["b", "a", None, "c", "a", "b", None, "a"], dtype="str")
+
+
+def test_codes_and_rows_match_factorize(values):
+    index = build_column_index(values, max_cardinality=10)
+
+    codes, categories = pd.factorize(values, sort=True)
+    np.testing.assert_array_equal(index.codes, codes)
+    assert index.categories.tolist() == ["a", "b", "c"]
+    for k, category in enumerate(index.categories):
+        table = np.arange(len(categories) + 1) == k
+        assert sorted(index.rows(table).tolist()) == np.flatnonzero(values == category).tolist()
+        assert index.count(table) == (values == category).sum()
+
+    missing = np.arange(len(categories) + 1) == len(categories)
+    assert index.rows(missing).tolist() == [2, 6]
+    assert index.rows(np.zeros(len(categories) + 1, dtype=bool)).size == 0
+
+
+def test_categorical_series_keeps_groupby_order(values):
+    index = build_column_index(values, max_cardinality=10)
+    grouped = pd.Series(range(len(values))).groupby(index.categorical(), observed=True).sum()
+    expected = pd.Series(range(len(values))).groupby(values).sum()
+    assert grouped.index.tolist() == expected.index.tolist()
+    assert grouped.tolist() == expected.tolist()
+
+
+def test_unsuitable_columns_are_not_indexed(values):
+    assert build_column_index(values, max_cardinality=2) is None
+    assert build_column_index(pd.Series(pd.date_range("2023-01-01", periods=3)), 10) is None
+
+
+@pytest.mark.parametrize("filters", [
+    {"站点": "a"},
+    {"站点": {"ne": "a"}},
+    {"站点": None},
+    {"站点": ["a", "c"], "季节": {"not_in": ["冬"]}},
+    {"站点": "b", "PM2.5": {"gt": 20}},
+])
+def test_indexed_mask_matches_scan(filters):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "站点": pd.Series(rng.choice(["a", "b", "c", None], 500), dtype="str"),
+        "季节": pd.Series(rng.choice(["春", "夏", "秋", "冬"], 500), dtype="str"),
+        "PM2.5": rng.uniform(0, 100, 500),
+    })
+    compiled = compile_filters(filters)
+    indexes = {col: build_column_index(df[col], 10) for col in ("站点", "季节")}
+
+    np.testing.assert_array_equal(compiled.mask(df, indexes), compiled.mask(df))
+
+
+def test_cache_builds_index_once_and_drops_it_with_entry(tmp_path):
+    path = tmp_path / "data.csv"
+    pd.DataFrame({"站点": ["a", "b", "a"], "PM2.5": [1, 2, 3]}).to_csv(path, index=False)
+    cache = DatasetCache(DatasetCacheConfig(sidecar_enabled=False), logging.getLogger("test_column_index"))
+
+    for _ in range(3):
+        assert cache.get_or_load(path, filters={"站点": "a"})["PM2.5"].tolist() == [1, 3]
+    stats = cache.get_stats()
+    assert (stats["index_builds"], stats["index_hits"], stats["indexed_columns"]) == (1, 2, 1)
+
+    cache.invalidate(path)
+    assert cache.get_stats()["indexed_columns"] == 0
@@ -0,0 +1,59 @@
+"""列名解析：本地无法确定的意图列与派生字段依赖合并为一次大模型调用"""
+
+import asyncio
+import logging
+
+import pytest
+
+from correlation_server import ColumnMapper, ColumnMappingError, CorrelationConfig
+
+CATALOGUE = {
+    "季节": {"depends_on": ["时间"], "description": "根据时间生成季节字段"},
+    "风向方位": {"depends_on": ["风向"], "description": "将风向角度转换为中文方位"},
+}
+
+
+@pytest.fixture
+def mapper(monkeypatch):
+    mapper = ColumnMapper(CorrelationConfig(), logging.getLogger("test_column_mapper"))
+    mapper.llm_calls = []
+
+    async def fake_run_agent(agent, input_text, cache_cols, cache_intents):
+        mapper.llm_calls.append(cache_intents)
+        return mapper.llm_response
+
+    monkeypatch.setattr(mapper, "_run_agent", fake_run_agent)
+    return mapper
+
+
+def test_unresolved_intents_and_dependencies_share_one_call(mapper):
+    mapper.llm_response = {"mapping": {"颗粒物浓度": "细粒子"}, "dependencies": {"季节": {"时间": "time"}}}
+    column_map, derived_fields = asyncio.run(
+        mapper.resolve(["站点", "细粒子", "time"], ["颗粒物浓度", "季节"], CATALOGUE)
+    )
+    assert column_map == {"颗粒物浓度": "细粒子", "季节": "季节"}
+    assert derived_fields == {"季节": ["time"]}
+    assert mapper.llm_calls == [("颗粒物浓度", "依赖:季节.时间")]
+
+
+def test_locally_resolved_skips_llm(mapper):
+    column_map, derived_fields = asyncio.run(
+        mapper.resolve(["站点", "PM2.5", "时间"], ["PM2.5", "季节"], CATALOGUE)
+    )
+    assert column_map == {"PM2.5": "PM2.5", "季节": "季节"}
+    assert derived_fields == {"季节": ["时间"]}
+    assert mapper.llm_calls == []
+
+
+def test_unresolvable_dependency(mapper):
+    mapper.llm_response = {"mapping": {}, "dependencies": {"季节": {"时间": None}}}
+    with pytest.raises(ColumnMappingError):
+        asyncio.run(mapper.resolve(["站点", "PM2.5", "time"], ["PM2.5", "季节"], CATALOGUE))
+
+    # 非严格模式跳过该派生字段
+    column_map, derived_fields = asyncio.run(
+        mapper.resolve(["站点", "PM2.5", "time"], ["PM2.5", "季节"], CATALOGUE, strict=False)
+    )
+    assert column_map == {"PM2.5": "PM2.5", "季节": None}
+    assert derived_fields == {}
+    assert len(mapper.llm_calls) == 2
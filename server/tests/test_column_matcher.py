@@ -0,0 +1,48 @@
+"""本地列名匹配：完全匹配、规范化匹配、相似度匹配，无法唯一确定时交给大模型"""
+
+import logging
+
+import pytest
+
+from column_matcher import ColumnMatcher, normalize_column_name
+from correlation_server import CorrelationConfig
+
+
+@pytest.fixture
+def matcher():
+    return ColumnMatcher(CorrelationConfig(), logging.getLogger("test_column_matcher"))
+
+
+def test_exact_match(matcher):
+    result = matcher.match(["站点名称", "PM2.5", "PM10"], ["PM2.5", "站点名称"])
+    assert result.resolved == {"PM2.5": "PM2.5", "站点名称": "站点名称"}
+    assert result.unresolved == []
+
+
+def test_normalized_match_strips_units(matcher):
+    assert normalize_column_name("ＰＭ２.５（μg/m³）") == "pm2.5"
+    result = matcher.match(["站点名称", "PM2.5(μg/m³)", "风速（m/s）"], ["pm2.5", "ＰＭ２.５", "风速"])
+    assert result.resolved == {"pm2.5": "PM2.5(μg/m³)", "ＰＭ２.５": "PM2.5(μg/m³)", "风速": "风速（m/s）"}
+
+
+def test_normalized_collision_unresolved(matcher):
+    # 两列规范化后相同，无法确定
+    result = matcher.match(["PM2.5(μg/m³)", "PM2.5[ppm]"], ["PM2.5"])
+    assert result.resolved == {} and result.unresolved == ["PM2.5"]
+
+
+def test_similarity_match(matcher):
+    result = matcher.match(["二氧化氮浓度小时均值", "二氧化氮浓度日均值"], ["二氧化氮浓度小时值"])
+    assert result.resolved == {"二氧化氮浓度小时值": "二氧化氮浓度小时均值"}
+
+
+def test_near_tie_unresolved(matcher):
+    # 最优（0.857）与次优（0.842）都超过阈值但差距不足 column_match_margin
+    result = matcher.match(["二氧化氮浓度小时均值", "二氧化氮浓度时值"], ["二氧化氮浓度小时值"])
+    assert result.resolved == {} and result.unresolved == ["二氧化氮浓度小时值"]
+
+
+def test_below_threshold_unresolved(matcher):
+    result = matcher.match(["站点名称", "PM2.5", "相对湿度"], ["细颗粒物", "湿度值"])
+    assert result.resolved == {}
+    assert result.unresolved == ["细颗粒物", "湿度值"]
@@ -0,0 +1,95 @@
+"""流式二阶统计量累加与合并"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_engine import (
+    CoMomentAccumulator, chunk_comoments, comoment_correlation, group_sort_order, merge_comoments,
+)
+
+
+def _frame(seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = 900
+    df = pd.DataFrame({
+        "g": rng.choice(["a", "b", "c", "d"], n),
+        "x": rng.normal(size=n),
+        "y": rng.normal(size=n),
+        "z": rng.normal(size=n),
+    })
+    df["y"] += df["x"]
+    df.loc[df["g"] == "d", "z"] = 1.5  # 常数列
+    df.loc[rng.random(n) < 0.05, "x"] = np.nan
+    df.loc[rng.random(n) < 0.02, "g"] = None
+    return df
+
+
+def _feed(accumulator: CoMomentAccumulator, df: pd.DataFrame, chunk_rows: int) -> None:
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        codes, keys = pd.factorize(chunk["g"])
+        accumulator.update(chunk[["x", "y", "z"]].to_numpy(), codes, list(keys))
+
+
+def _expected(df: pd.DataFrame, key: str) -> np.ndarray:
+    group = df[df["g"] == key][["x", "y", "z"]].dropna()
+    return group.corr().to_numpy()
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 37, 10_000])
+def test_chunked_updates_match_groupby_corr(chunk_rows):
+    df = _frame()
+    accumulator = CoMomentAccumulator(3)
+    _feed(accumulator, df, chunk_rows)
+    r, n = accumulator.correlations()
+
+    complete = df.dropna()
+    for i, key in enumerate(accumulator.keys):
+        np.testing.assert_allclose(r[i], _expected(df, key), atol=1e-10)
+        assert n[i] == (complete["g"] == key).sum()
+    assert sorted(accumulator.keys) == ["a", "b", "c", "d"]
+
+
+def test_constant_column_is_nan():
+    df = _frame()
+    accumulator = CoMomentAccumulator(3)
+    _feed(accumulator, df, 100)
+    r, _ = accumulator.correlations()
+    d = accumulator.keys.index("d")
+    assert np.isnan(r[d, 0, 2]) and np.isnan(r[d, 2, 2])
+    assert not np.isnan(r[d, 0, 1])
+
+
+def test_merge_accumulators_with_different_key_order():
+    df = _frame(1)
+    whole, left, right = CoMomentAccumulator(3), CoMomentAccumulator(3), CoMomentAccumulator(3)
+    _feed(whole, df, 250)
+    _feed(left, df.iloc[:300], 50)
+    _feed(right, df.iloc[300:].sort_values("g", ascending=False, na_position="first"), 80)
+
+    left.merge(right)
+
+    order = [left.keys.index(key) for key in whole.keys]
+    np.testing.assert_allclose(left.correlations()[0][order], whole.correlations()[0], atol=1e-10)
+    np.testing.assert_array_equal(left.moments.n[order], whole.moments.n)
+
+
+def test_merge_comoments_matches_single_pass():
+    rng = np.random.default_rng(2)
+    values = rng.normal(loc=100.0, size=(500, 2))
+    codes = rng.integers(0, 3, 500)
+
+    merged = merge_comoments(chunk_comoments(values[:123], codes[:123], 3),
+                             chunk_comoments(values[123:], codes[123:], 3))
+    single = chunk_comoments(values, codes, 3)
+
+    np.testing.assert_array_equal(merged.n, single.n)
+    np.testing.assert_allclose(merged.mean, single.mean)
+    np.testing.assert_allclose(merged.comoment, single.comoment, rtol=1e-9)
+    np.testing.assert_allclose(comoment_correlation(merged), comoment_correlation(single), atol=1e-12)
+
+
+def test_group_sort_order():
+    assert group_sort_order(["10", "9", "2"]) == [2, 1, 0]
+    assert group_sort_order(["b", "a", "c"]) == [1, 0, 2]
@@ -0,0 +1,58 @@
+"""紧凑相关矩阵：上三角的下标与对称查找和完整方阵 df.corr() 一致"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_matrix import CorrelationMatrix, square_positions, triangle_indices
+
+VARS = ["PM2.5", "PM10", "O3", "NO2", "CO"]
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 200
+    base = rng.normal(size=n)
+    return pd.DataFrame({
+        "站点名称": rng.choice(["站点1", "站点2", "站点3"], n),
+        **{var: base * i + rng.normal(size=n) for i, var in enumerate(VARS)},
+    })
+
+
+def test_triangle_indices():
+    rows, cols = triangle_indices(4)
+    assert len(rows) == 4 * 5 // 2
+    assert (rows <= cols).all()
+    positions = square_positions(4)
+    assert (positions == positions.T).all()
+    assert (positions[rows, cols] == np.arange(len(rows))).all()
+
+
+def test_symmetric_lookups_match_dense_corr(frame):
+    dense = frame[VARS].corr()
+    matrix = CorrelationMatrix.from_square(dense.to_numpy(), VARS)
+    assert matrix.values.shape == (1, len(VARS) * (len(VARS) + 1) // 2)
+
+    pd.testing.assert_frame_equal(matrix.to_frame(), dense)
+    for var1 in VARS:
+        for var2 in VARS:
+            assert matrix.cell(var1, var2)[0] == matrix.cell(var2, var1)[0] == dense.loc[var1, var2]
+
+    long = matrix.to_long_frame()
+    for row in long.itertuples():
+        assert row.r == dense.loc[row.var1, row.var2]
+
+
+def test_grouped_squares_match_dense_corr(frame):
+    grouped = frame.groupby("站点名称")
+    dense = {name: g[VARS].corr() for name, g in grouped}
+    matrix = CorrelationMatrix.from_square(np.stack([d.to_numpy() for d in dense.values()]), VARS,
+                                           groups=list(dense))
+    assert matrix.values.flags.c_contiguous
+
+    squares = matrix.squares()
+    for i, (name, expected) in enumerate(dense.items()):
+        np.testing.assert_array_equal(squares[i], expected.to_numpy())
+        pd.testing.assert_frame_equal(matrix.to_frame(name), expected)
+    np.testing.assert_array_equal(matrix.cell("O3", "PM2.5"), [d.loc["PM2.5", "O3"] for d in dense.values()])
@@ -0,0 +1,67 @@
+"""结构化结果：to_dict / from_dict 往返后内容不变，且可JSON序列化"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from correlation_matrix import CorrelationMatrix
+from correlation_result import MATRIX, TOP_PAIRS, CorrelationResult, from_matrix_result, from_top_pairs_result
+
+VARS = ["PM2.5", "O3", "NO2"]
+
+
+def _frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 300
+    df = pd.DataFrame({"站点名称": rng.choice(["站点1", "站点2"], n),
+                       **{var: rng.normal(size=n) for var in VARS}})
+    df.loc[rng.choice(n, 30, replace=False), "O3"] = np.nan
+    return df
+
+
+def _round_trip(result: CorrelationResult) -> CorrelationResult:
+    data = result.to_dict()
+    restored = CorrelationResult.from_dict(json.loads(json.dumps(data)))
+    assert restored.to_dict() == data
+    return restored
+
+
+def test_grouped_matrix_round_trip():
+    grouped = _frame().groupby("站点名称")
+    squares = np.stack([g[VARS].corr().to_numpy() for _, g in grouped])
+    squares[1, 0, 2] = squares[1, 2, 0] = np.nan  # 数据不足的单元格
+    valid = [g[VARS].notna().to_numpy().astype(np.int64) for _, g in grouped]
+    n = np.stack([v.T @ v for v in valid])  # 成对有效样本数
+    matrix = CorrelationMatrix.from_square(squares, VARS, groups=list(grouped.groups), n=n, precision=3)
+    result = from_matrix_result({"matrix": matrix, "variables": VARS, "method": "pearson",
+                                 "missing_strategy": "pairwise"}, ["站点名称"])
+
+    restored = _round_trip(result)
+    assert restored.kind == MATRIX and restored.groups == ["站点1", "站点2"]
+    np.testing.assert_array_equal(restored.matrix.values, matrix.values)
+    np.testing.assert_array_equal(restored.matrix.n, matrix.n)
+    assert np.isnan(restored.matrix.cell("PM2.5", "NO2")[1])
+    pd.testing.assert_frame_equal(restored.to_frame("站点2"), result.to_frame("站点2"))
+
+
+def test_ungrouped_matrix_round_trip():
+    matrix = CorrelationMatrix.from_square(_frame()[VARS].corr().to_numpy(), VARS)
+    result = from_matrix_result({"matrix": matrix, "variables": VARS, "method": "spearman",
+                                 "missing_strategy": "listwise"}, [])
+    restored = _round_trip(result)
+    assert restored.groups == [] and not restored.matrix.grouped
+    np.testing.assert_array_equal(restored.matrix.values, matrix.values)
+
+
+def test_screening_round_trip():
+    result = from_top_pairs_result({
+        "variables": VARS, "method": "pearson", "missing_strategy": "listwise", "top_k": 2,
+        "min_abs_correlation": 0.3,
+        "groups": {"站点1": [("PM2.5", "NO2", 0.81), ("O3", "NO2", -0.42)], "站点2": None},
+    }, ["站点名称"])
+
+    restored = _round_trip(result)
+    assert restored.kind == TOP_PAIRS and restored.matrix is None
+    assert restored.pairs == [[("PM2.5", "NO2", 0.81), ("O3", "NO2", -0.42)], None]
+    assert (restored.top_k, restored.min_abs_correlation) == (2, 0.3)
@@ -0,0 +1,182 @@
+"""数据集缓存按 (路径, 大小, 修改时间) 失效"""
+
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import dataset_cache
+from dataset_cache import DatasetCache, DatasetCacheConfig
+
+
+@pytest.fixture
+def cache(tmp_path):
+    config = DatasetCacheConfig(sidecar_dir=str(tmp_path / "sidecars"), sidecar_enabled=False)
+    return DatasetCache(config, logging.getLogger("test_dataset_cache"))
+
+
+def _write(path, values, mtime_ns=None):
+    pd.DataFrame({"站点": ["a"] * len(values), "PM2.5": values}).to_csv(path, index=False)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_repeated_load_hits_cache(cache, tmp_path):
+    path = tmp_path / "data.csv"
+    _write(path, [1, 2, 3])
+
+    first = cache.get_or_load(path)
+    second = cache.get_or_load(path)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_size_change_invalidates(cache, tmp_path):
+    path = tmp_path / "data.csv"
+    _write(path, [1, 2, 3], mtime_ns=1_700_000_000_000_000_000)
+    cache.get_or_load(path)
+
+    _write(path, [1, 2, 3, 40], mtime_ns=1_700_000_000_000_000_000)
+
+    assert cache.get_or_load(path)["PM2.5"].tolist() == [1, 2, 3, 40]
+    assert cache.misses == 2
+
+
+def test_mtime_change_invalidates_same_size(cache, tmp_path):
+    path = tmp_path / "data.csv"
+    _write(path, [1, 2, 3], mtime_ns=1_700_000_000_000_000_000)
+    cache.get_or_load(path)
+
+    _write(path, [7, 8, 9], mtime_ns=1_700_000_001_000_000_000)
+
+    assert cache.get_or_load(path)["PM2.5"].tolist() == [7, 8, 9]
+    assert cache.misses == 2
+
+
+def test_unchanged_fingerprint_is_trusted(cache, tmp_path):
+    path = tmp_path / "data.csv"
+    _write(path, [1, 2, 3], mtime_ns=1_700_000_000_000_000_000)
+    cache.get_or_load(path)
+
+    # 大小与修改时间都不变时视为同一版本
+    _write(path, [7, 8, 9], mtime_ns=1_700_000_000_000_000_000)
+
+    assert cache.get_or_load(path)["PM2.5"].tolist() == [1, 2, 3]
+
+
+def test_callers_cannot_modify_cached_frame(cache, tmp_path):
+    path = tmp_path / "data.csv"
+    _write(path, [1, 2, 3])
+
+    df = cache.get_or_load(path)
+    df.loc[0, "PM2.5"] = 100
+
+    assert cache.get_or_load(path)["PM2.5"].tolist() == [1, 2, 3]
+
+
+def test_invalidate_drops_entry(cache, tmp_path):
+    path = tmp_path / "data.csv"
+    _write(path, [1, 2, 3])
+    cache.get_or_load(path)
+
+    cache.invalidate(path)
+
+    assert cache.get_stats()["entries"] == 0
+    cache.get_or_load(path)
+    assert cache.misses == 2
+
+
+@pytest.fixture
+def sidecar_config(tmp_path):
+    pytest.importorskip("pyarrow")
+    return DatasetCacheConfig(sidecar_dir=str(tmp_path / "sidecars"))
+
+
+def test_sidecar_survives_restart_and_follows_source_version(sidecar_config, tmp_path):
+    path = tmp_path / "data.csv"
+    _write(path, [1, 2, 3], mtime_ns=1_700_000_000_000_000_000)
+    DatasetCache(sidecar_config, logging.getLogger("test_dataset_cache")).get_or_load(path)
+    sidecars = list((tmp_path / "sidecars").glob("*.feather"))
+    assert len(sidecars) == 1
+
+    # 新实例（服务重启）直接读取旁路文件：改写旁路文件内容可验证确实读取了它
+    pd.DataFrame({"站点": ["a"], "PM2.5": [99]}).to_feather(sidecars[0])
+    restarted = DatasetCache(sidecar_config, logging.getLogger("test_dataset_cache"))
+    assert restarted.get_or_load(path)["PM2.5"].tolist() == [99]
+
+    # 源文件变化后旧的旁路文件不再使用，并被新版本替换
+    _write(path, [7, 8, 9], mtime_ns=1_700_000_001_000_000_000)
+    assert restarted.get_or_load(path)["PM2.5"].tolist() == [7, 8, 9]
+    assert list((tmp_path / "sidecars").glob("*.feather")) != sidecars
+    assert len(list((tmp_path / "sidecars").glob("*.feather"))) == 1
+
+
+def test_projected_loads_build_sidecar_without_rereading(sidecar_config, tmp_path, monkeypatch):
+    path = tmp_path / "data.csv"
+    _write(path, [1, 2, 3])
+    reads = []
+    load = dataset_cache.load_parsed_dataset
+
+    def counting_load(file_path, logger=None, columns=None):
+        reads.append(columns)
+        return load(file_path, logger, columns)
+
+    monkeypatch.setattr(dataset_cache, "load_parsed_dataset", counting_load)
+    cache = DatasetCache(sidecar_config, logging.getLogger("test_dataset_cache"))
+    key = cache.make_key(path)
+
+    # 列裁剪读取只读取一次源文件，读到的列写入旁路文件
+    assert cache.get_or_load(path, columns=["PM2.5"]).columns.tolist() == ["PM2.5"]
+    assert reads == [["PM2.5"]]
+    assert cache.sidecars.covers(key, ["PM2.5"]) and not cache.sidecars.covers(key)
+    assert cache.sidecars.read_columns(key) is None  # 不完整的旁路文件不用于读取列名
+
+    # 重启后已保存的列直接从旁路文件读取，缺少的列才读取源文件并补入旁路文件
+    restarted = DatasetCache(sidecar_config, logging.getLogger("test_dataset_cache"))
+    assert restarted.get_or_load(path, columns=["PM2.5"])["PM2.5"].tolist() == [1, 2, 3]
+    assert reads == [["PM2.5"]]
+    assert restarted.get_or_load(path, columns=["站点", "PM2.5"])["站点"].tolist() == ["a"] * 3
+    assert reads == [["PM2.5"], ["站点"]]
+    assert restarted.sidecars.read_columns(key) == ["站点", "PM2.5"]
+
+    # 旁路文件补全后，全量读取也不再读取源文件
+    again = DatasetCache(sidecar_config, logging.getLogger("test_dataset_cache"))
+    assert again.get_or_load(path).columns.tolist() == ["站点", "PM2.5"]
+    assert len(reads) == 2
+
+
+def test_concurrent_loads_read_each_column_once(cache, tmp_path, monkeypatch):
+    path = tmp_path / "data.csv"
+    _write(path, [1, 2, 3])
+    loaded, b_started = [], threading.Event()
+    release = {"a": threading.Event(), "b": threading.Event()}
+
+    def slow_load(key, columns):
+        loaded.append(columns)
+        if columns == ["b"]:
+            b_started.set()
+        release[columns[0]].wait(5)
+        return pd.DataFrame({col: [1, 2, 3] for col in columns}), False
+
+    monkeypatch.setattr(cache, "_load_source", slow_load)
+    threads = [threading.Thread(target=cache.get_or_load, args=(path, [col])) for col in ("a", "b", "b")]
+
+    threads[0].start()  # 读取 a 列
+    time.sleep(0.1)
+    threads[1].start()  # 等待 a 列读取完成后补读 b 列
+    time.sleep(0.1)
+    release["a"].set()
+    assert b_started.wait(5)
+    time.sleep(0.1)
+    threads[2].start()  # b 列读取期间到达，应等待而不是重复读取
+    time.sleep(0.1)
+    release["b"].set()
+    for thread in threads:
+        thread.join(5)
+
+    assert loaded == [["a"], ["b"]]
+    assert cache.get_or_load(path, ["a", "b"]).columns.tolist() == ["a", "b"]
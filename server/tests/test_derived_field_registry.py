@@ -0,0 +1,75 @@
+"""派生字段注册表：依赖图解析、循环检测与按需求值"""
+
+import logging
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from correlation_server import CorrelationConfig, DerivedFieldGenerator
+from derived_fields import BUILTIN_FIELDS, DerivedField, DerivedFieldRegistry, get_derived_field_registry
+
+
+def test_builtin_dependency_chain():
+    registry = get_derived_field_registry()
+    assert registry.plan(["季节"]) == ["时间", "月份", "季节"]
+    assert registry.plan(["季节", "风向方位", "月份"]) == ["时间", "月份", "季节", "风向方位"]
+    # 与自身同名的输入是数据源列，不是循环
+    assert registry.derived_inputs("时间") == []
+    assert registry.derived_inputs("季节") == ["月份"]
+    assert registry.source_inputs("季节") == ["时间"]
+    assert registry.catalogue()["季节"]["depends_on"] == ["时间"]
+    assert registry.catalogue()["风向方位"]["depends_on"] == ["风向"]
+
+
+def test_cycles_rejected():
+    registry = DerivedFieldRegistry()
+    registry.register(DerivedField("A", ["B"], lambda b: b))  # B 尚未注册，视为数据源列
+    registry.register(DerivedField("C", ["A"], lambda a: a))
+    with pytest.raises(ValueError, match="循环依赖"):
+        registry.register(DerivedField("B", ["C"], lambda c: c))
+    assert "B" not in registry
+    assert registry.plan(["C"]) == ["A", "C"]
+
+    # 替换已有字段形成循环同样被拒绝，原定义保留
+    with pytest.raises(ValueError, match="循环依赖"):
+        registry.register(DerivedField("A", ["C"], lambda c: c), replace=True)
+    assert registry.get("A").inputs == ["B"]
+
+
+def test_duplicate_and_unknown_fields():
+    registry = DerivedFieldRegistry()
+    registry.register(DerivedField("A", ["x"], lambda x: x))
+    with pytest.raises(ValueError):
+        registry.register(DerivedField("A", ["y"], lambda y: y))
+    with pytest.raises(KeyError):
+        registry.plan(["未注册"])
+
+
+@pytest.fixture
+def generator():
+    """内置字段的计算函数包装为计数版本"""
+    generator = DerivedFieldGenerator(CorrelationConfig(), logging.getLogger("test_derived_field_registry"))
+    generator.calls = Counter()
+    registry = DerivedFieldRegistry()
+    for derived in BUILTIN_FIELDS:
+        def compute(*args, _derived=derived):
+            generator.calls[_derived.name] += 1
+            return _derived.compute(*args)
+        registry.register(DerivedField(derived.name, derived.inputs, compute, derived.dtype, derived.description))
+    generator.registry = registry
+    return generator
+
+
+def test_apply_fields_computes_only_required_upstream(generator, tmp_path):
+    df = pd.DataFrame({"采样时间": ["2023-01-15", "2023-04-15", "2023-07-15", "2023-10-15"], "风向(°)": [0, 90, 180, 270]})
+    dataset_key = (str(tmp_path / "data.csv"), 1, 1)
+
+    result = generator.apply_fields(df.copy(), {"季节": ["采样时间"]}, dataset_key)
+    assert result.columns.tolist() == ["采样时间", "风向(°)", "季节"]  # 上游字段不写入
+    assert result["季节"].astype(str).tolist() == ["冬", "春", "夏", "秋"]
+    assert generator.calls == Counter({"时间": 1, "月份": 1, "季节": 1})
+
+    # 已缓存的字段不再计算，也不计算其上游字段
+    generator.apply_fields(df.copy(), {"季节": ["采样时间"], "风向方位": ["风向(°)"]}, dataset_key)
+    assert generator.calls == Counter({"时间": 1, "月份": 1, "季节": 1, "风向方位": 1})
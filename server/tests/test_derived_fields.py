@@ -0,0 +1,68 @@
+"""内置派生字段：查表向量化结果与原逐行转换函数一致"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from derived_fields import month_of, season_of_month, standardize_time, wind_direction_of
+
+
+def baseline_season(month):
+    """原 DerivedFieldGenerator._get_chinese_season"""
+    if pd.isna(month) or not isinstance(month, (int, float)):
+        return None
+    month = int(month)
+    for months, season in {(3, 4, 5): "春", (6, 7, 8): "夏", (9, 10, 11): "秋", (12, 1, 2): "冬"}.items():
+        if month in months:
+            return season
+    return None
+
+
+def baseline_wind_direction(degree):
+    """原 DerivedFieldGenerator._get_chinese_wind_direction"""
+    if pd.isna(degree) or not isinstance(degree, (int, float)):
+        return None
+    degree = degree % 360
+    return ["北", "东北", "东", "东南", "南", "西南", "西", "西北"][int((degree + 22.5) / 45) % 8]
+
+
+def _as_list(values) -> list:
+    return [None if pd.isna(v) else v for v in pd.Series(values).astype(object)]
+
+
+def test_season_matches_baseline_for_every_month():
+    time = standardize_time(pd.Series([f"2023-{m:02d}-15 08:00" for m in range(1, 13)] + ["not a time", None]))
+    months = month_of(time)
+    expected = [baseline_season(m) for m in months.astype(object)]
+    assert _as_list(season_of_month(months)) == expected
+    assert expected[:12] == ["冬", "冬", "春", "春", "春", "夏", "夏", "夏", "秋", "秋", "秋", "冬"]
+    assert expected[12:] == [None, None]
+
+
+def test_season_out_of_range_month():
+    assert _as_list(season_of_month(pd.Series([0, 13, -1, 12.0]))) == [None, None, None, "冬"]
+
+
+EDGES = [edge + offset for edge in np.arange(22.5, 360, 45) for offset in (-1e-9, 0.0, 1e-9)]
+
+
+@pytest.mark.parametrize("degrees", [
+    EDGES,
+    [-22.5, -22.4, -45.0, -90.0, -359.9, -360.0, -720.5],
+    [360.0, 382.5, 404.9, 719.9, 720.0, 1080.1],
+    [0.0, 0.5, 90, 180, 270, 359.99, np.nan],
+], ids=["bin-edges", "negative", "over-360", "common"])
+def test_wind_direction_matches_baseline(degrees):
+    series = pd.Series(degrees, dtype=np.float64)
+    assert _as_list(wind_direction_of(series)) == [baseline_wind_direction(d) for d in degrees]
+
+
+def test_wind_direction_integer_column():
+    degrees = [0, 22, 23, 337, 338, 359]
+    assert _as_list(wind_direction_of(pd.Series(degrees))) == [baseline_wind_direction(d) for d in degrees]
+
+
+def test_wind_direction_parses_numeric_strings():
+    # 与原逐行函数不同：文本列中的数字按数值转换，无法解析的文本为缺失值
+    series = pd.Series(["90", "静风", None, "225.0"], dtype=object)
+    assert _as_list(wind_direction_of(series)) == ["东", None, None, "西南"]
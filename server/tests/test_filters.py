@@ -0,0 +1,138 @@
+"""过滤条件语言：运算符、缺失值语义与类型转换错误"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filters import coerce_filter_value, compile_filters, filter_frame, parse_condition
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "季节": pd.Series(["春", "夏", None, "冬", "夏", "秋"], dtype="str"),
+        "站点": pd.Categorical(["a", "b", "a", None, "c", "b"]),
+        "PM2.5": [10.0, 35.5, np.nan, 80.0, 12.0, 55.0],
+        "序号": [1, 2, 3, 4, 5, 6],
+        "O3": pd.Series(["62(H)", "40", "—", "75", None, "58"], dtype="str"),
+        "时间": pd.to_datetime(["2023-01-01", "2023-04-01", "2023-07-01",
+                              "2023-10-01", "2024-01-01", "2024-04-01"]),
+        "有效": [True, False, True, True, False, True],
+    })
+
+
+def _rows(df, filters):
+    return np.flatnonzero(compile_filters(filters).mask(df)).tolist()
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"季节": "夏"}, [1, 4]),
+    ({"季节": ["春", "冬"]}, [0, 3]),
+    ({"季节": {"ne": "夏"}}, [0, 2, 3, 5]),
+    ({"季节": {"not_in": ["夏", "秋"]}}, [0, 2, 3]),
+    ({"季节": None}, [2]),
+    ({"PM2.5": {"gt": 35.5}}, [3, 5]),
+    ({"PM2.5": {"gte": "35.5"}}, [1, 3, 5]),
+    ({"PM2.5": {"lt": 12}}, [0]),
+    ({"PM2.5": {"lte": 12}}, [0, 4]),
+    ({"PM2.5": {"between": [12, 55]}}, [1, 4, 5]),
+    ({"PM2.5": {"gt": 10, "lt": 80}}, [1, 4, 5]),
+    ({"PM2.5": {"not": {"between": [12, 55]}}}, [0, 2, 3]),
+    ({"季节": "夏", "PM2.5": {"gt": 20}}, [1]),
+])
+def test_operators(df, filters, expected):
+    assert _rows(df, filters) == expected
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"站点": "b"}, [1, 5]),
+    ({"站点": {"in": ["a", "c"]}}, [0, 2, 4]),
+    ({"站点": {"ne": "a"}}, [1, 3, 4, 5]),
+    ({"站点": None}, [3]),
+])
+def test_categorical_column(df, filters, expected):
+    assert _rows(df, filters) == expected
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"序号": {"between": [2, 4]}}, [1, 2, 3]),
+    ({"序号": {"gt": 4}}, [4, 5]),
+    ({"序号": {"lt": 1}}, []),
+    ({"时间": {"gte": "2023-07-01", "lt": "2024-01-01"}}, [2, 3]),
+])
+def test_sorted_column_range(df, filters, expected):
+    assert _rows(df, filters) == expected
+    # 打乱顺序后走逐行比较，结果一致
+    shuffled = df.iloc[::-1].reset_index(drop=True)
+    assert sorted(len(df) - 1 - i for i in _rows(shuffled, filters)) == expected
+
+
+def test_scalar_coercion(df):
+    assert _rows(df, {"序号": "3"}) == [2]
+    assert _rows(df, {"有效": "false"}) == [1, 4]
+    assert _rows(df, {"时间": "2023-04-01"}) == [1]
+
+
+def test_numeric_range_on_text_column(df):
+    # "62(H)" 与 "—" 无法解析为数值，不满足范围条件
+    assert _rows(df, {"O3": {"gt": 50}}) == [3, 5]
+    assert _rows(df, {"O3": "40"}) == [1]
+
+
+@pytest.mark.parametrize("filters", [
+    {"PM2.5": "abc"},
+    {"PM2.5": {"between": [1, "x"]}},
+    {"有效": "yes"},
+    {"时间": {"gt": "not a date"}},
+])
+def test_uncoercible_values_raise(df, filters):
+    with pytest.raises(ValueError, match="无法转换为列类型"):
+        compile_filters(filters).mask(df)
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({}, "不能为空"),
+    ({"like": "a"}, "不支持的过滤运算符"),
+    ({"in": "a"}, "必须是列表"),
+    ({"between": [1]}, "between"),
+])
+def test_invalid_conditions_raise(spec, message):
+    with pytest.raises(ValueError, match=message):
+        parse_condition(spec)
+
+
+def test_missing_column_raises(df):
+    with pytest.raises(ValueError, match="过滤列不存在"):
+        compile_filters({"NO2": 1}).mask(df)
+
+
+@pytest.mark.parametrize("value, dtype, expected", [
+    ("5", np.dtype("int64"), 5),
+    ("5.5", np.dtype("int64"), 5.5),
+    ("1", np.dtype("float64"), 1.0),
+    ("TRUE", np.dtype("bool"), True),
+    (3, pd.StringDtype(), "3"),
+    ("2023-01-01", pd.DatetimeTZDtype(tz="Asia/Shanghai"), pd.Timestamp("2023-01-01", tz="Asia/Shanghai")),
+    (None, np.dtype("float64"), None),
+])
+def test_coerce_filter_value(value, dtype, expected):
+    assert coerce_filter_value(value, dtype) == expected
+
+
+def test_filter_frame_without_filters_returns_input(df):
+    assert filter_frame(df, None) is df
+    assert filter_frame(df, {"季节": "冬"})["PM2.5"].tolist() == [80.0]
+
+
+def test_arrow_expression_is_superset(df):
+    pa = pytest.importorskip("pyarrow")
+    pa_ds = pytest.importorskip("pyarrow.dataset")
+    table = pa.table({"PM2.5": df["PM2.5"], "季节": df["季节"], "O3": df["O3"]})
+    compiled = compile_filters({"PM2.5": {"gte": 12}, "季节": {"not": "春"}, "O3": {"gt": 50}})
+
+    expression = compiled.arrow_expression(table.schema)
+    # 取反条件与文本列的范围条件不下推，只保留数值范围
+    assert expression is not None
+    pushed = pa_ds.dataset(table).to_table(filter=expression).to_pandas()
+    assert pushed["PM2.5"].tolist() == [35.5, 80.0, 12.0, 55.0]
+    assert np.flatnonzero(compiled.mask(df)).tolist() == [3, 5]
@@ -0,0 +1,143 @@
+"""增量统计：追加后续读的结果与全量重算一致，改写、截断时全量重建，状态文件按数量与期限淘汰"""
+
+import asyncio
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import pytest
+
+from correlation_engine import CoMomentAccumulator
+from correlation_server import CorrelationConfig, CorrelationManager
+from custom_types.types import ReadDataParam
+from incremental_store import (AccumulatorState, AppendCursor, IncrementalAccumulatorStore,
+                               IncrementalStoreConfig, get_incremental_store)
+
+VARS = ["PM2.5", "O3", "NO2"]
+
+
+def _frame(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "站点名称": rng.choice(["站点1", "站点2", "站点3"], n),
+        "PM2.5": rng.normal(50, 10, n).round(3),
+        "O3": rng.normal(80, 20, n).round(3),
+        "NO2": rng.normal(30, 5, n).round(3),
+    })
+    df.loc[rng.choice(n, n // 20, replace=False), "O3"] = np.nan
+    return df
+
+
+def _write(path, df: pd.DataFrame, start: int = 0) -> None:
+    """写入数据文件；CSV 从 start 行开始以追加方式写入，Parquet/Feather 整个文件重写"""
+    ext = path.suffix
+    if ext == ".csv":
+        df.iloc[start:].to_csv(path, mode="a" if start else "w", header=not start, index=False)
+    elif ext == ".parquet":
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, row_group_size=200)
+    else:
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path, chunksize=200)
+    # 保证修改时间变化，不依赖文件系统的时间精度
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@pytest.fixture
+def managers(monkeypatch):
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("列名应在本地匹配，不应调用大模型")
+
+    result = []
+    for enabled in (True, False):
+        manager = CorrelationManager(CorrelationConfig(incremental_enabled=enabled, incremental_min_file_mb=0,
+                                                       streaming_chunk_rows=128))
+        monkeypatch.setattr(manager.column_mapper, "_run_agent", no_llm)
+        result.append(manager)
+    return result
+
+
+def _analyze(manager, path) -> str:
+    manager.result_cache.clear()
+    param = ReadDataParam(read_data_method="PANDAS", read_data_query=str(path))
+    return asyncio.run(manager.analyze_correlation(param, correlation_vars=VARS, group_by=["站点名称"]))
+
+
+def _run(managers, path):
+    """增量分析一次，返回 (与全量重算是否一致, 存储统计的变化)"""
+    incremental, full = managers
+    before = get_incremental_store().get_stats()
+    result = _analyze(incremental, path)
+    after = get_incremental_store().get_stats()
+    delta = {k: after[k] - before[k] for k in ("resumed", "rebuilds", "appended_rows")}
+    return result == _analyze(full, path), delta
+
+
+@pytest.mark.parametrize("ext", [".csv", ".parquet", ".feather"])
+def test_append_matches_full_recompute(managers, tmp_path, ext):
+    path = tmp_path / f"data{ext}"
+    df = _frame(1000)
+
+    _write(path, df.iloc[:600])
+    assert _run(managers, path) == (True, {"resumed": 0, "rebuilds": 1, "appended_rows": 0})
+
+    _write(path, df, start=600)
+    assert _run(managers, path) == (True, {"resumed": 1, "rebuilds": 0, "appended_rows": 400})
+
+    # 文件未变化时不读取数据
+    assert _run(managers, path) == (True, {"resumed": 1, "rebuilds": 0, "appended_rows": 0})
+
+
+@pytest.mark.parametrize("ext", [".csv", ".parquet", ".feather"])
+def test_rewritten_middle_rebuilds(managers, tmp_path, ext):
+    path = tmp_path / f"data{ext}"
+    df = _frame(1000)
+    _write(path, df.iloc[:600])
+    _run(managers, path)
+
+    # 改写已消费部分的中间一行（长度不变），同时追加新数据
+    modified = df.copy()
+    modified.loc[300, "PM2.5"] = round(modified.loc[300, "PM2.5"] + 1, 3)
+    if ext == ".csv":
+        path.unlink()
+    _write(path, modified)
+    assert _run(managers, path) == (True, {"resumed": 0, "rebuilds": 1, "appended_rows": 0})
+
+
+@pytest.mark.parametrize("ext", [".csv", ".parquet", ".feather"])
+def test_truncated_file_rebuilds(managers, tmp_path, ext):
+    path = tmp_path / f"data{ext}"
+    df = _frame(1000)
+    _write(path, df)
+    _run(managers, path)
+
+    _write(path, df.iloc[:700])
+    assert _run(managers, path) == (True, {"resumed": 0, "rebuilds": 1, "appended_rows": 0})
+
+
+def _state() -> AccumulatorState:
+    return AccumulatorState(CoMomentAccumulator(2), AppendCursor(size=0, mtime_ns=0, rows=0))
+
+
+def test_store_evicts_least_recently_used_and_expired(tmp_path):
+    store = IncrementalAccumulatorStore(IncrementalStoreConfig(store_dir=str(tmp_path), max_entries=2, max_age_days=1),
+                                        logging.getLogger("test_incremental"))
+    now = time.time()
+    for i, key in enumerate(["a", "b"]):
+        store.save(key, _state())
+        os.utime(tmp_path / f"{key}.pkl", (now - 100 + i, now - 100 + i))
+
+    # 超过数量上限时删除最久未使用的
+    store.save("c", _state())
+    assert sorted(p.stem for p in tmp_path.glob("*.pkl")) == ["b", "c"]
+    assert store.load("a") is None and store.load("b") is not None
+
+    # 超过保存期限的状态文件直接删除
+    os.utime(tmp_path / "b.pkl", (now - 2 * 86400, now - 2 * 86400))
+    store.save("d", _state())
+    assert sorted(p.stem for p in tmp_path.glob("*.pkl")) == ["c", "d"]
+    assert store.get_stats()["evictions"] == 1 and store.get_stats()["expirations"] == 1
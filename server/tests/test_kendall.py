@@ -0,0 +1,61 @@
+"""Kendall tau-b 与 scipy.stats.kendalltau 的一致性"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from correlation_engine import _count_inversions, kendall_matrix, kendall_tau_b
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_inversion_count_matches_brute_force(seed):
+    ranks = np.random.default_rng(seed).integers(0, 20, 60)
+    expected = sum(int(ranks[i] > ranks[j]) for i in range(60) for j in range(i + 1, 60))
+    assert _count_inversions(ranks) == expected
+
+
+@pytest.mark.parametrize("levels", [None, 3, 10])
+def test_tau_b_matches_scipy(levels):
+    rng = np.random.default_rng(1)
+    x = rng.normal(size=500)
+    y = x + rng.normal(size=500)
+    if levels is not None:
+        # 离散化制造大量并列值
+        x, y = np.floor(x * levels / 4), np.floor(y * levels / 4)
+    assert kendall_tau_b(x, y) == pytest.approx(stats.kendalltau(x, y).statistic, abs=1e-12)
+
+
+def test_tau_b_drops_missing_pairs():
+    rng = np.random.default_rng(2)
+    x, y = rng.normal(size=200), rng.normal(size=200)
+    x[::7] = np.nan
+    y[::11] = np.nan
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    expected = stats.kendalltau(x[valid], y[valid]).statistic
+    assert kendall_tau_b(x, y) == pytest.approx(expected, abs=1e-12)
+
+
+def test_tau_b_constant_or_tiny_input_is_nan():
+    assert np.isnan(kendall_tau_b(np.ones(10), np.arange(10.0)))
+    assert np.isnan(kendall_tau_b(np.array([1.0]), np.array([2.0])))
+
+
+@pytest.mark.parametrize("with_nans", [False, True])
+def test_matrix_matches_dataframe_corr(with_nans):
+    rng = np.random.default_rng(3)
+    values = np.round(rng.normal(size=(300, 4)), 1)
+    values[:, 1] += values[:, 0]
+    if with_nans:
+        values[rng.random(values.shape) < 0.05] = np.nan
+
+    expected = pd.DataFrame(values).corr(method="kendall").to_numpy()
+    np.testing.assert_allclose(kendall_matrix(values), expected, atol=1e-12)
+
+
+def test_matrix_constant_column_is_nan_off_diagonal():
+    values = np.column_stack([np.arange(10.0), np.full(10, 3.0), np.arange(10.0)[::-1]])
+    matrix = kendall_matrix(values)
+    assert np.isnan(matrix[0, 1]) and np.isnan(matrix[1, 2])
+    assert matrix[0, 2] == pytest.approx(-1.0)
+    np.testing.assert_array_equal(np.diag(matrix), np.ones(3))
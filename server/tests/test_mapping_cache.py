@@ -0,0 +1,101 @@
+"""列名映射缓存：跨实例与重启后命中、与列顺序无关、不缓存未能映射的结果、按有效期过期"""
+
+import asyncio
+import json
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import correlation_server
+import mapping_cache
+from correlation_server import ColumnMapper, CorrelationConfig
+from mapping_cache import ColumnMappingCache, MappingCacheConfig, schema_hash
+
+LOGGER = logging.getLogger("test_mapping_cache")
+
+
+@pytest.fixture
+def config(tmp_path):
+    return MappingCacheConfig(db_path=str(tmp_path / "mappings.sqlite"))
+
+
+def test_round_trip_across_instances(config):
+    ColumnMappingCache(config, LOGGER).put(["站点", "PM2.5", "O3"], ["细颗粒物"], {"细颗粒物": "PM2.5"})
+
+    # 新实例（另一个进程或重启后）内存为空，从SQLite读取
+    restarted = ColumnMappingCache(config, LOGGER)
+    mapping = restarted.get(["站点", "PM2.5", "O3"], ["细颗粒物"])
+    assert mapping == {"细颗粒物": "PM2.5"}
+    assert restarted.get_stats()["hits"] == 1
+
+    # 每次返回新的字典，调用方修改不影响缓存
+    mapping["细颗粒物"] = "O3"
+    assert restarted.get(["站点", "PM2.5", "O3"], ["细颗粒物"]) == {"细颗粒物": "PM2.5"}
+
+
+def test_key_ignores_column_order(config):
+    assert schema_hash(["a", "b", "c"]) == schema_hash(["c", "a", "b"])
+    assert schema_hash(["a", "b"]) != schema_hash(["a", "b", "c"])
+
+    cache = ColumnMappingCache(config, LOGGER)
+    cache.put(["站点", "PM2.5", "O3"], ["臭氧", "细颗粒物"], {"臭氧": "O3", "细颗粒物": "PM2.5"})
+    assert ColumnMappingCache(config, LOGGER).get(["O3", "站点", "PM2.5"], ["细颗粒物", "臭氧"]) is not None
+
+
+@pytest.mark.parametrize("mapping", [
+    {"细颗粒物": None},
+    {"mapping": {"细颗粒物": "PM2.5"}, "dependencies": {"季节": {"时间": None}}},
+])
+def test_unresolved_mapping_not_cached(config, mapping):
+    cache = ColumnMappingCache(config, LOGGER)
+    cache.put(["站点", "PM2.5"], ["细颗粒物"], mapping)
+    assert cache.get(["站点", "PM2.5"], ["细颗粒物"]) is None
+    assert ColumnMappingCache(config, LOGGER).get(["站点", "PM2.5"], ["细颗粒物"]) is None
+
+
+def test_expired_mapping_removed(config, monkeypatch):
+    config.ttl_seconds = 60
+    cache = ColumnMappingCache(config, LOGGER)
+    cache.put(["站点", "PM2.5"], ["细颗粒物"], {"细颗粒物": "PM2.5"})
+    assert cache.get(["站点", "PM2.5"], ["细颗粒物"]) is not None
+
+    now = time.time()
+    monkeypatch.setattr(mapping_cache, "time", SimpleNamespace(time=lambda: now + 61))
+    assert cache.get(["站点", "PM2.5"], ["细颗粒物"]) is None
+    assert cache.get_stats()["expirations"] == 1
+    assert ColumnMappingCache(config, LOGGER).get(["站点", "PM2.5"], ["细颗粒物"]) is None
+
+
+def test_clear(config):
+    cache = ColumnMappingCache(config, LOGGER)
+    cache.put(["站点", "PM2.5"], ["细颗粒物"], {"细颗粒物": "PM2.5"})
+    cache.put(["站点", "O3"], ["臭氧"], {"臭氧": "O3"})
+    assert cache.clear() == 2
+    assert cache.get(["站点", "PM2.5"], ["细颗粒物"]) is None
+    assert ColumnMappingCache(config, LOGGER).get(["站点", "O3"], ["臭氧"]) is None
+
+
+@pytest.mark.parametrize("llm_mapping, expected_calls", [
+    ({"细颗粒物": "PM2.5"}, 1),
+    ({"细颗粒物": None}, 2),
+])
+def test_repeated_requests_reuse_llm_result(config, monkeypatch, llm_mapping, expected_calls):
+    # 回归：lru_cache 曾缓存协程对象，重复请求会 await 已完成的协程
+    calls = []
+
+    async def fake_run(starting_agent, input):
+        calls.append(input)
+        return SimpleNamespace(final_output=json.dumps({"mapping": llm_mapping, "dependencies": {}}))
+
+    monkeypatch.setattr(correlation_server, "Runner", SimpleNamespace(run=fake_run))
+    results = []
+    for _ in range(2):
+        # 每个请求新建映射器与缓存实例，共享同一个数据库
+        mapper = ColumnMapper(CorrelationConfig(), LOGGER)
+        mapper.mapping_cache = ColumnMappingCache(config, LOGGER)
+        results.append(asyncio.run(mapper.resolve(["站点", "PM2.5"], ["细颗粒物"], {})))
+
+    assert results[0] == results[1] == (llm_mapping, {})
+    assert len(calls) == expected_calls
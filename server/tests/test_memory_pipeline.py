@@ -0,0 +1,76 @@
+"""分析流水线各阶段不复制缓存的数据表"""
+
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_server import CorrelationManager, CorrelationMethod
+from custom_types.types import ReadDataParam
+from dataset_cache import get_dataset_cache
+
+
+def test_copy_on_write_enabled():
+    # 缓存命中只返回浅拷贝，pandas 2.x 需开启写时复制才能隔离调用方的修改
+    assert int(pd.__version__.split('.')[0]) >= 3 or pd.get_option("mode.copy_on_write") is True
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 2000
+    path = tmp_path / "memory.csv"
+    pd.DataFrame({
+        "站点名称": rng.choice(["站点1", "站点2", "站点3"], n),
+        "时间": pd.date_range("2023-01-01", periods=n, freq="h").astype(str),
+        "PM2.5": rng.normal(50, 10, n),
+        "O3": rng.normal(80, 20, n),
+        "NO2": rng.normal(30, 5, n),
+    }).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = CorrelationManager()
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("列名应在本地匹配，不应调用大模型")
+
+    monkeypatch.setattr(manager.column_mapper, "_run_agent", no_llm)
+    return manager
+
+
+@pytest.mark.parametrize("request_kwargs", [
+    # 两变量 + 派生字段过滤 + 分组
+    dict(correlation_vars=["PM2.5", "O3"], group_by=["站点名称"], filters={"季节": "冬"}),
+    # 矩阵 + 源列过滤 + 成对删除
+    dict(correlation_vars=["PM2.5", "O3", "NO2"], filters={"站点名称": ["站点1", "站点2"]}),
+])
+def test_stages_share_memory_with_cached_frame(manager, dataset, monkeypatch, request_kwargs):
+    seen = []
+    compute = manager._compute_result
+
+    def capture(df, row_mask, *args):
+        seen.append(df)
+        return compute(df, row_mask, *args)
+
+    monkeypatch.setattr(manager, "_compute_result", capture)
+    param = ReadDataParam(read_data_method="PANDAS", read_data_query=str(dataset))
+
+    async def analyze():
+        # 第二次（结果缓存未命中时）从数据集缓存读取
+        manager.result_cache.clear()
+        return await manager.analyze_correlation_result(param, correlation_method=CorrelationMethod.PEARSON,
+                                                        **request_kwargs)
+
+    asyncio.run(analyze())
+    asyncio.run(analyze())
+    assert len(seen) == 2
+
+    cache = get_dataset_cache()
+    cached = cache._entries[cache.make_key(dataset)].df
+    for df in seen:
+        for col in request_kwargs["correlation_vars"]:
+            assert np.shares_memory(df[col].to_numpy(), cached[col].to_numpy()), f"{col} 在计算前被复制"
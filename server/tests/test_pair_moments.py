@@ -0,0 +1,67 @@
+"""相关性立方体：单元统计量汇总到粗粒度分组"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_engine import (
+    comoment_correlation, pair_correlation, pair_moments, pair_to_comoments, rollup_pair_moments,
+)
+
+
+def _cells(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    n = 1200
+    values = rng.normal(size=(n, 3))
+    values[:, 1] += values[:, 0]
+    values[rng.random(values.shape) < 0.08] = np.nan
+    site = rng.integers(0, 4, n)
+    season = rng.integers(0, 3, n)
+    return values, site, season
+
+
+def test_rollup_matches_direct_computation():
+    values, site, season = _cells()
+    cells = pair_moments(values, site * 3 + season, 12)
+
+    by_site = rollup_pair_moments(cells, np.arange(12) // 3, 4)
+    direct = pair_moments(values, site, 4)
+
+    np.testing.assert_array_equal(by_site.n, direct.n)
+    np.testing.assert_allclose(by_site.mean, direct.mean, atol=1e-12)
+    np.testing.assert_allclose(by_site.m2, direct.m2, rtol=1e-9)
+    np.testing.assert_allclose(by_site.cross, direct.cross, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("group", range(4))
+def test_pair_correlation_matches_dataframe_corr(group):
+    values, site, season = _cells(1)
+    cells = pair_moments(values, site * 3 + season, 12)
+    r = pair_correlation(rollup_pair_moments(cells, np.arange(12) // 3, 4))
+
+    expected = pd.DataFrame(values[site == group]).corr().to_numpy()
+    np.testing.assert_allclose(r[group], expected, atol=1e-10)
+
+
+def test_rollup_skips_unmapped_cells_and_empty_groups():
+    values, site, season = _cells(2)
+    cells = pair_moments(values, site * 3 + season, 12)
+    targets = np.where(np.arange(12) % 3 == 0, 0, -1)  # 只汇总每个站点的第一个季节
+
+    rolled = rollup_pair_moments(cells, targets, 2)
+    direct = pair_moments(values, np.where(season == 0, 0, -1), 1)
+
+    np.testing.assert_array_equal(rolled.n[0], direct.n[0])
+    np.testing.assert_allclose(pair_correlation(rolled)[0], pair_correlation(direct)[0], atol=1e-10)
+    assert (rolled.n[1] == 0).all() and np.isnan(pair_correlation(rolled)[1]).all()
+
+
+def test_pair_to_comoments_two_variables():
+    values, site, _ = _cells(3)
+    values = values[:, :2]
+    moments = pair_moments(values, site, 4)
+
+    r = comoment_correlation(pair_to_comoments(moments))
+    for group in range(4):
+        expected = pd.DataFrame(values[site == group]).dropna().corr().to_numpy()
+        np.testing.assert_allclose(r[group], expected, atol=1e-10)
@@ -0,0 +1,34 @@
+"""成对完整Pearson相关矩阵与 DataFrame.corr 的一致性"""
+
+import numpy as np
+import pandas as pd
+
+from correlation_engine import pairwise_complete_pearson, pairwise_valid_counts
+
+
+def test_matches_dataframe_corr_with_nans():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(200, 8))
+    values[:, 3] = values[:, 1] * 3 + rng.normal(scale=0.5, size=200)
+    values[rng.random(values.shape) < 0.1] = np.nan
+
+    r, n = pairwise_complete_pearson(values)
+
+    np.testing.assert_allclose(r, pd.DataFrame(values).corr().to_numpy(), atol=1e-10)
+    valid = (~np.isnan(values)).astype(np.int64)
+    np.testing.assert_array_equal(n, valid.T @ valid)
+    np.testing.assert_array_equal(pairwise_valid_counts(values), n)
+
+
+def test_constant_and_sparse_pairs_are_nan():
+    values = np.array([
+        [1.0, 5.0, np.nan],
+        [2.0, 5.0, 1.0],
+        [3.0, 5.0, np.nan],
+        [4.0, 5.0, np.nan],
+    ])
+    r, n = pairwise_complete_pearson(values)
+
+    assert np.isnan(r[0, 1])  # 第二列为常数
+    assert n[0, 2] == 1 and np.isnan(r[0, 2])  # 有效样本不足2
+    assert r[0, 0] == 1.0
@@ -0,0 +1,62 @@
+"""分组并行执行器：多进程计算的Kendall结果与逐组计算一致，包括极小分组与常数分组"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_server import CorrelationCalculator, CorrelationConfig, CorrelationMethod
+
+VARS = ["PM2.5", "O3", "NO2"]
+
+
+def _calculator(workers: int, min_sample_size: int) -> CorrelationCalculator:
+    config = CorrelationConfig(parallel_workers=workers, parallel_min_groups=1, parallel_min_rows=1,
+                               min_sample_size=min_sample_size)
+    return CorrelationCalculator(config, logging.getLogger("test_parallel_executor"))
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    parts = []
+    for i, size in enumerate([400, 250, 120, 60]):
+        base = rng.normal(size=size)
+        parts.append(pd.DataFrame({
+            "站点名称": f"站点{i}",
+            "PM2.5": base + rng.normal(size=size),
+            "O3": -base + rng.normal(size=size),
+            "NO2": np.round(rng.normal(size=size), 1),  # 含并列值
+        }))
+    parts += [
+        pd.DataFrame({"站点名称": "单行", "PM2.5": [1.0], "O3": [2.0], "NO2": [3.0]}),
+        pd.DataFrame({"站点名称": "两行", "PM2.5": [1.0, 2.0], "O3": [2.0, 1.0], "NO2": [3.0, 3.5]}),
+        pd.DataFrame({"站点名称": "常数", "PM2.5": np.arange(30.0), "O3": 5.0, "NO2": np.arange(30.0) % 7}),
+    ]
+    df = pd.concat(parts, ignore_index=True)
+    df.loc[rng.choice(len(df) - 33, 40, replace=False), "O3"] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("min_sample_size", [1, 2, 15])
+def test_pair_parallel_matches_serial(frame, min_sample_size):
+    parallel = _calculator(2, min_sample_size)
+    serial = _calculator(1, min_sample_size)
+    assert parallel.parallel_executor.should_parallelize(7, len(frame))
+
+    expected = serial.calculate_correlation(frame, "PM2.5", "O3", ["站点名称"], CorrelationMethod.KENDALL)
+    result = parallel.calculate_correlation(frame, "PM2.5", "O3", ["站点名称"], CorrelationMethod.KENDALL)
+    assert result == expected
+    assert expected["常数"] == 0.0
+
+
+@pytest.mark.parametrize("min_sample_size", [1, 15])
+def test_matrix_parallel_matches_serial(frame, min_sample_size):
+    parallel = _calculator(2, min_sample_size)
+    serial = _calculator(1, min_sample_size)
+
+    expected = serial.calculate_correlation_matrix(frame, VARS, ["站点名称"], CorrelationMethod.KENDALL)["matrix"]
+    result = parallel.calculate_correlation_matrix(frame, VARS, ["站点名称"], CorrelationMethod.KENDALL)["matrix"]
+    assert result.groups == expected.groups
+    np.testing.assert_array_equal(result.values, expected.values)
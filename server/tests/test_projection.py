@@ -0,0 +1,77 @@
+"""列裁剪：只读取分析需要的列（含过滤列与派生字段依赖），结果与读取全部列时一致"""
+
+import asyncio
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset_cache
+from correlation_server import CorrelationManager
+from custom_types.types import ReadDataParam
+from dataset_cache import DatasetCache, DatasetCacheConfig
+
+N = 500
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "站点名称": rng.choice(["站点1", "站点2"], N),
+        "时间": pd.date_range("2023-01-01", periods=N, freq="D").strftime("%Y-%m-%d"),
+        "PM2.5": rng.normal(50, 10, N),
+        "O3": rng.normal(80, 20, N),
+        **{f"无关列{i}": rng.normal(size=N) for i in range(20)},
+    })
+
+
+@pytest.mark.parametrize("ext", [".csv", ".parquet", ".feather"])
+def test_projected_load_matches_full_read(frame, tmp_path, ext, monkeypatch):
+    path = tmp_path / f"data{ext}"
+    {".csv": lambda: frame.to_csv(path, index=False), ".parquet": lambda: frame.to_parquet(path, index=False),
+     ".feather": lambda: frame.to_feather(path)}[ext]()
+    reads = []
+    read_dataset = dataset_cache.read_dataset
+    monkeypatch.setattr(dataset_cache, "read_dataset",
+                        lambda file_path, columns=None: reads.append(columns) or read_dataset(file_path, columns))
+
+    config = DatasetCacheConfig(sidecar_enabled=False)
+    projected = DatasetCache(config, logging.getLogger("test_projection")).get_or_load(path, ["O3", "时间"])
+    full = DatasetCache(config, logging.getLogger("test_projection")).get_or_load(path)
+    assert reads == [["O3", "时间"], None]
+    assert projected.columns.tolist() == ["O3", "时间"]
+    pd.testing.assert_frame_equal(projected, full[["O3", "时间"]])
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = CorrelationManager()
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("列名应在本地匹配，不应调用大模型")
+
+    monkeypatch.setattr(manager.column_mapper, "_run_agent", no_llm)
+    return manager
+
+
+def test_analysis_reads_only_required_columns(frame, tmp_path, manager, monkeypatch):
+    wide, narrow = tmp_path / "wide.csv", tmp_path / "narrow.csv"
+    frame.to_csv(wide, index=False)
+    frame[["站点名称", "时间", "PM2.5", "O3"]].to_csv(narrow, index=False)
+    loads = []
+    load = dataset_cache.load_parsed_dataset
+    monkeypatch.setattr(dataset_cache, "load_parsed_dataset",
+                        lambda file_path, logger=None, columns=None: loads.append(columns) or load(file_path, logger, columns))
+
+    def analyze(path):
+        manager.result_cache.clear()
+        param = ReadDataParam(read_data_method="PANDAS", read_data_query=str(path))
+        return asyncio.run(manager.analyze_correlation(param, filters={"站点名称": "站点1"}, group_by=["季节"],
+                                                       correlation_vars=["PM2.5", "O3"]))
+
+    result = analyze(wide)
+    # 变量、过滤列与派生字段（季节）依赖的时间列
+    assert len(loads) == 1 and sorted(loads[0]) == sorted(["PM2.5", "O3", "站点名称", "时间"])
+    assert result == analyze(narrow)
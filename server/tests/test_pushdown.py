@@ -0,0 +1,89 @@
+"""过滤下推：Parquet/Feather 的 pyarrow 表达式与 CSV 按块过滤的结果和读取后在内存中过滤一致"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset_cache
+from dataset_cache import DatasetCache, DatasetCacheConfig, csv_filter_dtypes
+
+N = 300
+CHUNK_ROWS = 50
+
+FILTERS = [
+    {"站点名称": ["站点1", "站点2"]},
+    {"站点名称": {"not_in": ["站点1"]}, "PM2.5": {"gt": 50}},
+    {"等级": {"gte": 2}},
+    {"等级": 3, "风速": {"between": [2, 5]}},
+    {"等级": {"not": {"lt": 2}}},
+    {"时间": {"gte": "2023-01-05"}, "风速": "3"},
+    {"备注码": 7},
+]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "站点名称": [f"站点{i % 3 + 1}" for i in range(N)],
+        "时间": pd.date_range("2023-01-01", periods=N, freq="h").strftime("%Y-%m-%d %H:%M:%S"),
+        "PM2.5": rng.normal(50, 10, N).round(2),
+        "风速": rng.integers(0, 8, N),
+        "等级": rng.integers(1, 5, N).astype(float),
+        "备注码": rng.integers(5, 9, N).astype(float),
+    })
+    # 一整块中过滤列全部缺失；另一列在用于确定类型的开头一块中全部缺失
+    df.loc[2 * CHUNK_ROWS:3 * CHUNK_ROWS - 1, "等级"] = np.nan
+    df.loc[:CHUNK_ROWS - 1, "备注码"] = np.nan
+    return df
+
+
+@pytest.fixture(scope="module", params=[".csv", ".parquet", ".feather"])
+def path(request, frame, tmp_path_factory):
+    path = tmp_path_factory.mktemp("pushdown") / f"data{request.param}"
+    if request.param == ".csv":
+        frame.to_csv(path, index=False)
+    elif request.param == ".parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_feather(path)
+    return path
+
+
+def _cache(pushdown_min_file_mb: int) -> DatasetCache:
+    config = DatasetCacheConfig(max_memory_mb=64, sidecar_enabled=False,
+                                pushdown_min_file_mb=pushdown_min_file_mb, csv_chunk_rows=CHUNK_ROWS)
+    return DatasetCache(config, logging.getLogger("test_pushdown"))
+
+
+@pytest.mark.parametrize("filters", FILTERS, ids=[str(list(f)) for f in FILTERS])
+def test_pushdown_matches_in_memory_filter(path, filters, monkeypatch):
+    pushed = []
+    read_filtered = dataset_cache.read_dataset_filtered
+    monkeypatch.setattr(dataset_cache, "read_dataset_filtered",
+                        lambda *args, **kwargs: pushed.append(args[0]) or read_filtered(*args, **kwargs))
+
+    columns = list(dict.fromkeys(["站点名称", "PM2.5", *filters]))
+    in_memory = _cache(pushdown_min_file_mb=1024)
+    pushdown = _cache(pushdown_min_file_mb=0)  # 阈值调低，测试文件也下推
+    assert not in_memory.pushes_down(path, columns) and pushdown.pushes_down(path, columns)
+
+    expected = in_memory.get_or_load(path, columns, filters=filters).reset_index(drop=True)
+    assert pushed == []
+    result = pushdown.get_or_load(path, columns, filters=filters)
+    assert pushed == [path]
+
+    assert 0 < len(expected) < N
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    # 下推读取的子集不进入缓存
+    assert pushdown.get_stats()["entries"] == 0
+
+
+def test_csv_filter_dtypes_look_past_missing_probe(frame, tmp_path):
+    path = tmp_path / "data.csv"
+    frame.assign(全部缺失=np.nan).to_csv(path, index=False)
+    dtypes = csv_filter_dtypes(path, ["站点名称", "等级", "备注码", "全部缺失"], CHUNK_ROWS)
+    # 备注码在开头一块中全部缺失，由之后第一块有效值确定为数值
+    assert dtypes == {"站点名称": "str", "等级": "float64", "备注码": "float64", "全部缺失": "str"}
@@ -0,0 +1,87 @@
+"""结果缓存：过期、LRU淘汰、磁盘持久化与损坏文件处理（注入时钟，结果确定）"""
+
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, ResultCacheConfig
+
+LOGGER = logging.getLogger("test_result_cache")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(result_cache, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def _cache(max_entries=8, ttl_seconds=10, persist_dir=None) -> ResultCache:
+    return ResultCache(ResultCacheConfig(max_entries=max_entries, ttl_seconds=ttl_seconds,
+                                         persist_dir=None if persist_dir is None else str(persist_dir)), LOGGER)
+
+
+def test_make_key_ignores_param_order():
+    assert ResultCache.make_key(a=1, b=["x"]) == ResultCache.make_key(b=["x"], a=1)
+    assert ResultCache.make_key(a=1) != ResultCache.make_key(a=2)
+
+
+def test_ttl_expiry(clock, tmp_path):
+    cache = _cache(persist_dir=tmp_path)
+    cache.put("k", {"r": 0.5})
+    clock.now += 9
+    assert cache.get("k") == {"r": 0.5}
+
+    clock.now += 2
+    assert cache.get("k") is None
+    assert not (tmp_path / "k.json").exists()
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["entries"]) == (1, 1, 1, 0)
+
+
+def test_lru_eviction(clock):
+    cache = _cache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a 成为最近使用
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_disk_persistence(clock, tmp_path):
+    _cache(persist_dir=tmp_path).put("k", {"values": [[1.0, None]]})
+
+    # 服务重启后从磁盘命中，过期时间沿用写入时的
+    restarted = _cache(persist_dir=tmp_path)
+    assert restarted.get("k") == {"values": [[1.0, None]]}
+    clock.now += 11
+    assert _cache(persist_dir=tmp_path).get("k") is None
+    assert not (tmp_path / "k.json").exists()
+
+
+def test_memory_eviction_falls_back_to_disk(clock, tmp_path):
+    cache = _cache(max_entries=1, persist_dir=tmp_path)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+
+@pytest.mark.parametrize("content", ['{"expires_at": 2000, "res', '[]', '{"result": 1}'])
+def test_corrupted_file_removed(clock, tmp_path, content):
+    (tmp_path / "k.json").write_text(content, encoding="utf-8")
+    cache = _cache(persist_dir=tmp_path)
+    assert cache.get("k") is None
+    assert not (tmp_path / "k.json").exists()
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_clear(clock, tmp_path):
+    cache = _cache(persist_dir=tmp_path)
+    cache.put("a", 1)
+    cache.clear()
+    assert cache.get("a") is None
+    assert list(tmp_path.glob("*.json")) == []
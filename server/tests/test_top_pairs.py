@@ -0,0 +1,49 @@
+"""分块变量对筛选与完整相关矩阵的一致性"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_engine import blocked_top_pairs, select_top_pairs
+
+
+def _values(seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(200, 23))
+    values[:, 5] = values[:, 2] * 2 + rng.normal(scale=0.1, size=200)
+    values[:, 17] = -values[:, 9] + rng.normal(scale=0.3, size=200)
+    values[:, 20] = 4.0  # 常数列
+    return values
+
+
+@pytest.mark.parametrize("block_size", [1, 4, 7, 256])
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+def test_blocked_matches_full_matrix(block_size, method):
+    values = _values()
+    expected = select_top_pairs(pd.DataFrame(values).corr(method=method).to_numpy(), top_k=15)
+
+    result = blocked_top_pairs(values, top_k=15, block_size=block_size,
+                               rank_transform=method == "spearman")
+
+    np.testing.assert_array_equal(result.rows, expected.rows)
+    np.testing.assert_array_equal(result.cols, expected.cols)
+    np.testing.assert_allclose(result.r, expected.r, atol=1e-10)
+
+
+def test_blocked_threshold_without_top_k():
+    values = _values(1)
+    matrix = pd.DataFrame(values).corr().to_numpy()
+    rows, cols = np.triu_indices(matrix.shape[0], k=1)
+    expected = {(i, j) for i, j in zip(rows, cols) if abs(matrix[i, j]) >= 0.2}
+
+    result = blocked_top_pairs(values, min_abs_correlation=0.2, block_size=5)
+
+    assert set(zip(result.rows.tolist(), result.cols.tolist())) == expected
+    assert np.all(np.diff(np.abs(result.r)) <= 0)
+    assert 20 not in result.rows and 20 not in result.cols  # 常数列没有相关系数
+
+
+def test_blocked_empty_result():
+    result = blocked_top_pairs(np.ones((10, 3)), top_k=5)
+    assert result.r.size == 0 and result.rows.size == 0
+